@@ -1,5 +1,5 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
 import logging
 from .glassfish_service import GlassfishService
@@ -12,31 +12,13 @@ class GlassfishCog(commands.Cog):
         self.service = GlassfishService(bot)
         self.commands = GlassfishCommands(bot, self.service)
         
-        # Atribui o servicos_config ao bot para compatibilidade
+        # Atribui o servicos_config ao bot para compatibilidade; é o mesmo dicionário
+        # do registro de serviços, sempre atualizado, então não precisa ser reatribuído
         self.bot.servicos_config = self.service.load_services()
-        
-        # Inicia o loop de verificação
-        self.check_services_loop.start()
 
     def cog_unload(self):
-        """Para o loop quando o cog for descarregado"""
-        self.check_services_loop.cancel()
-
-    @tasks.loop(minutes=15)  # Usa o valor padrão, mas será atualizado dinamicamente
-    async def check_services_loop(self):
-        """Loop para verificação de timeout dos serviços"""
-        try:
-            await self.service.check_services()
-            # Atualiza o bot.servicos_config após verificação
-            self.bot.servicos_config = self.service.load_services()
-        except Exception as e:
-            logging.error(f"Erro no loop de verificação de serviços: {str(e)}")
-
-    @check_services_loop.before_loop
-    async def before_check_services_loop(self):
-        """Espera o bot estar pronto antes de iniciar o loop"""
-        await self.bot.wait_until_ready()
-        logging.info("Iniciando loop de verificação de serviços Glassfish")
+        """Para o agendador de timeout quando o cog for descarregado"""
+        self.service.stop_scheduler()
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -46,9 +28,9 @@ class GlassfishCog(commands.Cog):
         
         # Configura a mensagem persistente
         await self.service.setup_persistent_message()
-
-        # Atualiza o bot.servicos_config
-        self.bot.servicos_config = self.service.load_services()
+        
+        # Inicia o agendador de timeout (lembretes e liberações por prazo)
+        self.service.start_scheduler()
 
         # Sincroniza os comandos
         try:
@@ -60,8 +42,6 @@ class GlassfishCog(commands.Cog):
     async def refresh_persistent_message(self):
         """Atualiza a mensagem persistente - método público para compatibilidade"""
         await self.service._refresh_persistent_message()
-        # Atualiza também o bot.servicos_config
-        self.bot.servicos_config = self.service.load_services()
 
     # === COMANDOS SLASH ===
 
@@ -99,12 +79,6 @@ class GlassfishCog(commands.Cog):
         await self.commands.cmd_configurar_timeout_glassfish(
             interaction, horas, intervalo_verificacao, intervalo_lembrete, max_extensoes
         )
-        
-        # Se o intervalo de verificação foi alterado, reinicia o loop
-        if intervalo_verificacao is not None:
-            self.check_services_loop.cancel()
-            self.check_services_loop.change_interval(minutes=self.service.verificar_intervalo)
-            self.check_services_loop.restart()
 
     @app_commands.command(name="obter_timeout_glassfish", description="Mostra as configurações atuais de timeout dos serviços Glassfish")
     async def obter_timeout_glassfish(self, interaction: discord.Interaction):
@@ -174,6 +148,34 @@ class GlassfishCog(commands.Cog):
         """Testa o envio de lembrete diretamente"""
         await self.commands.cmd_testar_envio_lembrete_glassfish(interaction)
 
+    @app_commands.command(name="reservar_glassfish", description="Reserva um serviço Glassfish para um horário futuro")
+    @app_commands.describe(
+        servico_id="ID do serviço a reservar (ex: 97-1)",
+        inicio="Início da reserva (DD/MM/AAAA HH:MM)",
+        fim="Fim da reserva (DD/MM/AAAA HH:MM ou HH:MM no mesmo dia)",
+        descricao="Motivo da reserva (ex: homologação do cliente)"
+    )
+    async def reservar_glassfish(self, interaction: discord.Interaction, servico_id: str, inicio: str, fim: str,
+                                 descricao: str = None):
+        """Reserva um serviço para uma janela futura"""
+        await self.commands.cmd_reservar_glassfish(interaction, servico_id, inicio, fim, descricao)
+
+    @app_commands.command(name="reservas_glassfish", description="Lista as reservas atuais e futuras dos serviços Glassfish")
+    @app_commands.describe(
+        servico_id="ID do serviço (opcional; sem ele lista todas as reservas)"
+    )
+    async def reservas_glassfish(self, interaction: discord.Interaction, servico_id: str = None):
+        """Lista as reservas atuais e futuras"""
+        await self.commands.cmd_reservas_glassfish(interaction, servico_id)
+
+    @app_commands.command(name="cancelar_reserva_glassfish", description="Cancela uma reserva de serviço Glassfish")
+    @app_commands.describe(
+        reserva_id="ID da reserva (mostrado em /reservas_glassfish)"
+    )
+    async def cancelar_reserva_glassfish(self, interaction: discord.Interaction, reserva_id: str):
+        """Cancela uma reserva"""
+        await self.commands.cmd_cancelar_reserva_glassfish(interaction, reserva_id)
+
 async def setup(bot):
     """Configuração do cog"""
     await bot.add_cog(GlassfishCog(bot))
@@ -3,6 +3,7 @@ import json
 import logging
 from typing import Dict, Any, List
 from .glassfish_config import CARGO_TI_ID, LOGS_CHANNEL_ID
+from .glassfish_registry import get_service_registry
 
 
 class GlassfishAddModal(discord.ui.Modal, title='Adicionar Serviço Glassfish'):
@@ -124,8 +125,7 @@ class GlassfishEditModal(discord.ui.Modal, title='Editar Serviço Glassfish'):
             self.servicos_config[self.servico_id]['nome'] = servico_nome
             
             # Salva a configuração atualizada
-            with open("services.json", "w", encoding="utf-8") as file:
-                json.dump(self.servicos_config, file, indent=4)
+            await get_service_registry().commit(self.servicos_config, changed=self.servico_id)
                 
             # Atualiza a mensagem persistente
             glassfish_cog = interaction.client.get_cog("GlassfishCog")
@@ -226,8 +226,7 @@ class GlassfishSelect(discord.ui.Select):
                     del self.servicos_config[servico_id]
                     
                     # Salva a configuração atualizada
-                    with open("services.json", "w", encoding="utf-8") as file:
-                        json.dump(self.servicos_config, file, indent=4)
+                    await get_service_registry().commit(self.servicos_config, changed=servico_id)
                         
                     # Atualiza a mensagem persistente
                     glassfish_cog = interaction.client.get_cog("GlassfishCog")
@@ -284,8 +283,7 @@ class ConfirmRemoveView(discord.ui.View):
             del self.servicos_config[self.servico_id]
             
             # Salva a configuração atualizada
-            with open("services.json", "w", encoding="utf-8") as file:
-                json.dump(self.servicos_config, file, indent=4)
+            await get_service_registry().commit(self.servicos_config, changed=self.servico_id)
                 
             # Atualiza a mensagem persistente
             glassfish_cog = interaction.client.get_cog("GlassfishCog")
@@ -348,14 +346,9 @@ class RolePermissionView(discord.ui.View):
             return
             
         try:
-            # Carregar configuração existente
-            services_file = "services.json"
-            
-            try:
-                with open(services_file, "r", encoding="utf-8") as f:
-                    services = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                services = {}
+            # Carregar configuração existente do registro em memória
+            registry = get_service_registry()
+            services = registry.get_all()
                 
             # Adicionar dados do serviço
             services[self.serv_id] = {
@@ -366,8 +359,7 @@ class RolePermissionView(discord.ui.View):
             }
             
             # Salvar configuração atualizada
-            with open(services_file, "w", encoding="utf-8") as f:
-                json.dump(services, f, ensure_ascii=False, indent=4)
+            await registry.commit(services, changed=self.serv_id)
                 
             # Atualizar a mensagem persistente
             if self.bot:
@@ -746,8 +738,7 @@ class TestarLembreteSelect(discord.ui.Select):
                 }
             
             # Salva as alterações
-            with open("services.json", "w", encoding="utf-8") as file:
-                json.dump(self.servicos_config, file, indent=4)
+            await get_service_registry().commit(self.servicos_config, changed=servico_id)
             
             await interaction.response.send_message(
                 f"✅ Tempo simulado para o serviço **{config['nome']}**.\n" +
@@ -6,7 +6,8 @@ import json
 import datetime
 from typing import Dict, Any, Optional
 from .glassfish_config import CARGO_TI_ID, LOGS_CHANNEL_ID, DEVELOPMENT_MODE
-from .glassfish_ui import ServiceDropdown
+from .glassfish_users import get_user_resolver
+from .glassfish_ui import ServicePicker
 from .glassfish_admin_ui import (
     GlassfishAddModal, 
     GlassfishSelectView,
@@ -40,15 +41,9 @@ class GlassfishCommands:
             
             servicos_config = self.service.load_services()
             
-            # Verificar permissões para cada serviço
-            servicos_permitidos = {}
-            for key, config in servicos_config.items():
-                grupos_permitidos = [int(x) for x in config["grupos_permitidos"]]
-                logging.info(f"Serviço {key} - Grupos permitidos: {grupos_permitidos}")
-                
-                if any(role in grupos_permitidos for role in user_roles):
-                    servicos_permitidos[key] = config
-                    logging.info(f"Usuário tem permissão para o serviço {key}")
+            # Serviços permitidos pelo índice cargo -> serviços do registro
+            servicos_permitidos = self.service.registry.permitted_services(user_roles)
+            logging.info(f"Usuário {interaction.user.name} tem permissão para {len(servicos_permitidos)} serviços")
             
             if not servicos_permitidos:
                 await interaction.response.send_message(
@@ -58,9 +53,10 @@ class GlassfishCommands:
                 logging.info(f"{interaction.user.name} tentou acessar serviços sem permissão")
                 return
             
-            view = ServiceDropdown(user_roles, servicos_config)
+            # Seletor paginado: suporta mais de 25 serviços, filtros e busca por nome
+            view = ServicePicker(user_roles, interaction.user, servicos_config)
             await interaction.response.send_message(
-                "**Serviços disponíveis:** Selecione uma opção abaixo:", 
+                view.header(),
                 view=view,
                 ephemeral=True
             )
@@ -333,6 +329,36 @@ class GlassfishCommands:
             resposta.append(f"• Serviços disponíveis: {disponiveis} ({int(disponiveis/total_servicos*100)}%)")
             resposta.append(f"• Serviços em uso: {len(em_uso)} ({int(len(em_uso)/total_servicos*100)}%)")
             
+            # Histórico: métricas lidas dos agregados, sem reler o log de eventos
+            historico = self.service.history
+            desde = historico.since()
+            if desde:
+                def formatar_duracao(segundos: float) -> str:
+                    return f"{int(segundos // 3600)}h{int(segundos % 3600 // 60):02d}m"
+
+                resposta.append(f"\n**📚 Histórico (desde {desde.strftime('%d/%m/%Y')}):**")
+                por_utilizacao = sorted(historico.service_stats().items(),
+                                        key=lambda item: item[1]["utilizacao"], reverse=True)
+                for servico_id, stats in por_utilizacao[:10]:
+                    nome = servicos_config.get(servico_id, {}).get("nome", servico_id)
+                    resposta.append(
+                        f"• **{nome}** - Utilização: {stats['utilizacao']:.0%} | {stats['usos']} usos | " +
+                        f"Sessão média: {formatar_duracao(stats['sessao_media'])} | " +
+                        f"Timeouts: {stats['taxa_timeout']:.0%}"
+                    )
+
+                usuarios = sorted(historico.user_stats().values(), key=lambda stats: stats["segundos"], reverse=True)
+                if usuarios:
+                    resposta.append("**👥 Quem mais usou:** " + ", ".join(
+                        f"{stats.get('usuario', '?')} ({formatar_duracao(stats['segundos'])}, {stats['timeouts']} timeouts)"
+                        for stats in usuarios[:5]
+                    ))
+
+                pico = sorted(historico.hour_stats().items(), key=lambda item: item[1]["segundos"], reverse=True)
+                pico = [f"{hora:02d}h" for hora, contador in pico[:3] if contador["segundos"]]
+                if pico:
+                    resposta.append(f"**🕐 Horários de pico:** {', '.join(pico)}")
+
             # Envia o relatório
             await interaction.followup.send("\n".join(resposta), ephemeral=True)
             
@@ -453,25 +479,11 @@ class GlassfishCommands:
                 )
                 return
             
-            # Libera cada serviço em uso
+            # Libera cada serviço em uso (quem estiver na fila recebe o serviço na sequência)
             for servico in servicos_em_uso:
-                servico_id = servico["id"]
-                config = servicos_config[servico_id]
-                
-                # Remove dados de uso
-                if "usage_data" in config:
-                    del config["usage_data"]
-                
-                # Limpa a flag de notificação de timeout
-                if "notificacao_timeout" in config:
-                    del config["notificacao_timeout"]
-                
-                config["status"] = "disponível"
-                config["usuario"] = None
-                servicos_liberados += 1
-            
-            # Salva as alterações
-            self.service.save_services(servicos_config)
+                sucesso, _ = self.service.registry.release(servico["id"], force=True, causa="todos")
+                if sucesso:
+                    servicos_liberados += 1
             
             # Atualiza a mensagem persistente
             await self.service._refresh_persistent_message()
@@ -871,7 +883,7 @@ class GlassfishCommands:
                 agora = datetime.datetime.now()
                 extension_count = usage_data.get("extension_count", 0)
                 
-                user = await self.bot.fetch_user(int(user_id))
+                user = await get_user_resolver(self.bot).get_user(user_id)
                 
                 # Calcula tempo formatado
                 usage_data_dict = config["usage_data"]
@@ -890,7 +902,7 @@ class GlassfishCommands:
                 
                 # Importa o CheckView
                 from .glassfish_ui import CheckView
-                view = CheckView(servico_id, servicos_config)
+                view = CheckView(servico_id, config.get("geracao_uso"))
                 
                 # Envia mensagem de teste
                 await user.send(
@@ -925,4 +937,150 @@ class GlassfishCommands:
                     ephemeral=True
                 )
             except:
-                pass 
\ No newline at end of file
+                pass
+
+    @staticmethod
+    def _parse_data_reserva(texto: str, base: Optional[datetime.datetime] = None) -> datetime.datetime:
+        """Converte 'DD/MM/AAAA HH:MM' (ou só 'HH:MM', no mesmo dia de base) para datetime"""
+        texto = texto.strip()
+        if base is not None and len(texto) <= 5:
+            hora = datetime.datetime.strptime(texto, '%H:%M')
+            return base.replace(hour=hora.hour, minute=hora.minute, second=0, microsecond=0)
+        return datetime.datetime.strptime(texto, '%d/%m/%Y %H:%M')
+
+    async def cmd_reservar_glassfish(self, interaction: discord.Interaction, servico_id: str,
+                                     inicio: str, fim: str, descricao: Optional[str] = None):
+        """Reserva um serviço para uma janela futura"""
+        try:
+            registry = self.service.registry
+            config = registry.get(servico_id)
+            if config is None:
+                await interaction.response.send_message(
+                    f"❌ Serviço '{servico_id}' não encontrado.",
+                    ephemeral=True
+                )
+                return
+
+            user_roles = [role.id for role in interaction.user.roles]
+            if not self._tem_permissao_ti(interaction.user) and not registry.has_permission(servico_id, user_roles):
+                await interaction.response.send_message(
+                    "❌ Você não tem permissão para reservar este serviço.",
+                    ephemeral=True
+                )
+                return
+
+            try:
+                data_inicio = self._parse_data_reserva(inicio)
+                data_fim = self._parse_data_reserva(fim, base=data_inicio)
+            except ValueError:
+                await interaction.response.send_message(
+                    "❌ Formato de data inválido. Use `DD/MM/AAAA HH:MM` no início e `DD/MM/AAAA HH:MM` ou `HH:MM` no fim.",
+                    ephemeral=True
+                )
+                return
+
+            sucesso, motivo, reserva = registry.add_reservation(
+                servico_id, interaction.user.id, interaction.user.name, data_inicio, data_fim, descricao or ""
+            )
+            if not sucesso:
+                if motivo == "conflito":
+                    conflito_inicio = datetime.datetime.fromisoformat(reserva["inicio"]).strftime('%d/%m/%Y %H:%M')
+                    conflito_fim = datetime.datetime.fromisoformat(reserva["fim"]).strftime('%d/%m/%Y %H:%M')
+                    mensagem = (f"❌ Conflito com a reserva de **{reserva['usuario']}** "
+                                f"({conflito_inicio} até {conflito_fim}).")
+                elif motivo == "intervalo":
+                    mensagem = "❌ O fim da reserva deve ser depois do início."
+                elif motivo == "passado":
+                    mensagem = "❌ Não é possível reservar um horário que já passou."
+                else:
+                    mensagem = f"❌ Serviço '{servico_id}' não encontrado."
+                await interaction.response.send_message(mensagem, ephemeral=True)
+                return
+
+            await interaction.response.send_message(
+                f"🗓️ Serviço **{config['nome']}** reservado de **{data_inicio.strftime('%d/%m/%Y %H:%M')}** "
+                f"até **{data_fim.strftime('%d/%m/%Y %H:%M')}** (reserva `{reserva['id']}`).\n"
+                f"O serviço será assumido automaticamente no início e liberado no fim da reserva.",
+                ephemeral=True
+            )
+
+            channel = self.bot.get_channel(LOGS_CHANNEL_ID)
+            if channel:
+                await channel.send(
+                    f"🗓️ **Reserva**: <@{interaction.user.id}> reservou o serviço **{config['nome']}** de "
+                    f"{data_inicio.strftime('%d/%m/%Y %H:%M')} até {data_fim.strftime('%d/%m/%Y %H:%M')}" +
+                    (f" ({descricao})." if descricao else ".")
+                )
+            logging.info(f"{interaction.user.name} reservou o serviço {servico_id} de {data_inicio} até {data_fim}")
+
+        except Exception as e:
+            logging.error(f"Erro ao reservar serviço: {str(e)}")
+            await interaction.response.send_message(
+                f"❌ Erro ao reservar serviço: {str(e)}",
+                ephemeral=True
+            )
+
+    async def cmd_reservas_glassfish(self, interaction: discord.Interaction, servico_id: Optional[str] = None):
+        """Lista as reservas atuais e futuras"""
+        try:
+            registry = self.service.registry
+            if servico_id is not None and registry.get(servico_id) is None:
+                await interaction.response.send_message(
+                    f"❌ Serviço '{servico_id}' não encontrado.",
+                    ephemeral=True
+                )
+                return
+
+            reservas = registry.upcoming_reservations([servico_id] if servico_id else None, limite=20)
+            if not reservas:
+                await interaction.response.send_message("ℹ️ Não há reservas agendadas.", ephemeral=True)
+                return
+
+            servicos_config = registry.get_all()
+            linhas = ["🗓️ **Reservas do Glassfish**"]
+            for id_servico, reserva in reservas:
+                inicio = datetime.datetime.fromisoformat(reserva["inicio"]).strftime('%d/%m/%Y %H:%M')
+                fim = datetime.datetime.fromisoformat(reserva["fim"]).strftime('%d/%m/%Y %H:%M')
+                linha = (f"• `{reserva['id']}` **{servicos_config[id_servico]['nome']}**: {inicio} até {fim} "
+                         f"- {reserva['usuario']}")
+                if reserva.get("descricao"):
+                    linha += f" ({reserva['descricao']})"
+                if reserva.get("iniciada"):
+                    linha += " 🟢"
+                linhas.append(linha)
+
+            await interaction.response.send_message("\n".join(linhas), ephemeral=True)
+
+        except Exception as e:
+            logging.error(f"Erro ao listar reservas: {str(e)}")
+            await interaction.response.send_message(
+                f"❌ Erro ao listar reservas: {str(e)}",
+                ephemeral=True
+            )
+
+    async def cmd_cancelar_reserva_glassfish(self, interaction: discord.Interaction, reserva_id: str):
+        """Cancela uma reserva (de quem reservou ou, para a TI, qualquer uma)"""
+        try:
+            sucesso, motivo, servico_id, reserva = self.service.registry.cancel_reservation(
+                reserva_id.strip(), interaction.user.id, force=self._tem_permissao_ti(interaction.user)
+            )
+            if not sucesso:
+                mensagem = ("❌ Apenas quem fez a reserva ou a TI pode cancelá-la."
+                            if motivo == "outro_usuario" else f"❌ Reserva `{reserva_id}` não encontrada.")
+                await interaction.response.send_message(mensagem, ephemeral=True)
+                return
+
+            config = self.service.registry.get(servico_id)
+            inicio = datetime.datetime.fromisoformat(reserva["inicio"]).strftime('%d/%m/%Y %H:%M')
+            await interaction.response.send_message(
+                f"✅ Reserva `{reserva_id}` do serviço **{config['nome']}** ({inicio}) cancelada.",
+                ephemeral=True
+            )
+            logging.info(f"{interaction.user.name} cancelou a reserva {reserva_id} do serviço {servico_id}")
+
+        except Exception as e:
+            logging.error(f"Erro ao cancelar reserva: {str(e)}")
+            await interaction.response.send_message(
+                f"❌ Erro ao cancelar reserva: {str(e)}",
+                ephemeral=True
+            )
@@ -63,13 +63,17 @@ DEFAULT_CONFIG = {
     },
     "canais": {
         "logs_id": DEFAULT_LOGS_CHANNEL_ID,
-        "persistent_id": DEFAULT_PERSISTENT_CHANNEL_ID
+        "persistent_id": DEFAULT_PERSISTENT_CHANNEL_ID,
+        "persistent_message_id": None
     },
     "timeout": {
         "tempo_maximo_uso": DEFAULT_TEMPO_MAXIMO_USO,
         "verificar_intervalo": DEFAULT_VERIFICAR_INTERVALO,
         "lembrete_intervalo": DEFAULT_LEMBRETE_INTERVALO,
         "max_extensoes": DEFAULT_MAX_EXTENSOES
+    },
+    "persistencia": {
+        "backend": "json"
     }
 }
 
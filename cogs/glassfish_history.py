@@ -0,0 +1,267 @@
+import os
+import asyncio
+import logging
+import datetime
+from typing import Any, Dict, List, Optional
+from . import persistence_codec as codec
+
+EVENTS_FILE = "glassfish_events.jsonl"
+ROLLUPS_FILE = "glassfish_rollups.json"
+# Janela (em segundos) em que eventos seguidos são agrupados em uma única gravação
+HISTORY_FLUSH_DELAY = 1.0
+# Eventos que encerram uma sessão de uso
+EVENTOS_FIM_USO = ("liberacao", "timeout")
+
+
+def _contadores() -> Dict[str, Any]:
+    return {"usos": 0, "encerrados": 0, "segundos": 0.0, "timeouts": 0, "confirmacoes": 0, "extensoes": 0}
+
+
+class UsageHistory:
+    """Histórico de uso dos serviços: log de eventos (JSONL) e agregados incrementais.
+
+    Cada uso, confirmação, extensão, liberação e timeout é acrescentado ao final
+    do glassfish_events.jsonl, uma linha compacta por evento, e aplicado na hora
+    aos agregados por serviço, por usuário e por hora do dia. O relatório lê
+    apenas os agregados; o log bruto só é relido na inicialização, e a partir da
+    posição gravada junto com os agregados (eventos gravados depois do último
+    salvamento dos agregados são reaplicados).
+    """
+
+    def __init__(self, events_file: str = EVENTS_FILE, rollups_file: str = ROLLUPS_FILE):
+        self.events_file = events_file
+        self.rollups_file = rollups_file
+        self.rollups = self._empty_rollups()
+        # Linhas ainda não gravadas e o escritor que as grava em lote
+        self._pending: List[bytes] = []
+        self._writer_task = None
+        self._write_lock = None
+        self._load()
+
+    @staticmethod
+    def _empty_rollups() -> Dict[str, Any]:
+        return {
+            "posicao": 0,
+            "eventos": 0,
+            "desde": None,
+            "servicos": {},
+            "usuarios": {},
+            "horas": {str(hora): {"usos": 0, "segundos": 0.0} for hora in range(24)}
+        }
+
+    def _load(self):
+        """Carrega os agregados e reaplica os eventos gravados depois deles"""
+        try:
+            with open(self.rollups_file, "rb") as f:
+                self.rollups = codec.loads(f.read())
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Erro ao carregar agregados do histórico: {str(e)}")
+            self.rollups = self._empty_rollups()
+
+        try:
+            tamanho = os.path.getsize(self.events_file)
+        except OSError:
+            tamanho = 0
+        if self.rollups.get("posicao", 0) > tamanho:
+            # O log foi truncado ou substituído: os agregados são refeitos do zero
+            logging.warning("Log de eventos menor que o registrado nos agregados; reconstruindo histórico")
+            self.rollups = self._empty_rollups()
+
+        reaplicados = 0
+        if tamanho > self.rollups["posicao"]:
+            try:
+                with open(self.events_file, "rb") as f:
+                    f.seek(self.rollups["posicao"])
+                    for linha in f:
+                        if not linha.strip():
+                            continue
+                        try:
+                            self._apply(codec.loads(linha))
+                            reaplicados += 1
+                        except (ValueError, KeyError, TypeError) as e:
+                            logging.error(f"Evento inválido no histórico ignorado: {str(e)}")
+                self.rollups["posicao"] = tamanho
+            except Exception as e:
+                logging.error(f"Erro ao ler o log de eventos: {str(e)}")
+        logging.info(f"Histórico de uso carregado: {self.rollups['eventos']} eventos ({reaplicados} reaplicados do log)")
+
+    def _distribute_hours(self, inicio: datetime.datetime, segundos: float):
+        """Soma a duração de uma sessão às horas do dia em que ela aconteceu"""
+        horas = self.rollups["horas"]
+        # Dias completos contam igualmente em todas as horas
+        dias, segundos = divmod(segundos, 86400)
+        if dias:
+            for contador in horas.values():
+                contador["segundos"] += dias * 3600
+        cursor = inicio
+        fim = inicio + datetime.timedelta(seconds=segundos)
+        while cursor < fim:
+            proxima_hora = cursor.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+            parte = min(proxima_hora, fim) - cursor
+            horas[str(cursor.hour)]["segundos"] += parte.total_seconds()
+            cursor = proxima_hora
+
+    def _apply(self, evento: Dict[str, Any]):
+        """Aplica um evento aos agregados"""
+        rollups = self.rollups
+        rollups["eventos"] += 1
+        if rollups["desde"] is None:
+            rollups["desde"] = evento["ts"]
+
+        alvos = [rollups["servicos"].setdefault(evento["servico"], _contadores())]
+        if evento.get("user_id"):
+            usuario = rollups["usuarios"].setdefault(str(evento["user_id"]), _contadores())
+            if evento.get("usuario"):
+                usuario["usuario"] = evento["usuario"]
+            alvos.append(usuario)
+
+        tipo = evento["tipo"]
+        if tipo == "uso":
+            for alvo in alvos:
+                alvo["usos"] += 1
+            hora = datetime.datetime.fromisoformat(evento["ts"]).hour
+            rollups["horas"][str(hora)]["usos"] += 1
+        elif tipo == "confirmacao":
+            for alvo in alvos:
+                alvo["confirmacoes"] += 1
+        elif tipo == "extensao":
+            for alvo in alvos:
+                alvo["extensoes"] += 1
+        elif tipo in EVENTOS_FIM_USO:
+            duracao = float(evento.get("duracao", 0))
+            for alvo in alvos:
+                alvo["encerrados"] += 1
+                alvo["segundos"] += duracao
+                if tipo == "timeout":
+                    alvo["timeouts"] += 1
+            if evento.get("inicio") and duracao > 0:
+                self._distribute_hours(datetime.datetime.fromisoformat(evento["inicio"]), duracao)
+                # Sessões iniciadas antes do primeiro evento ampliam o período de utilização
+                if evento["inicio"] < rollups["desde"]:
+                    rollups["desde"] = evento["inicio"]
+
+    def record(self, tipo: str, servico_id: str, **dados):
+        """Registra um evento: atualiza os agregados na hora e agenda a gravação no log"""
+        evento = {"ts": datetime.datetime.now().isoformat(timespec="seconds"), "tipo": tipo, "servico": servico_id}
+        evento.update({chave: valor for chave, valor in dados.items() if valor is not None})
+        try:
+            self._apply(evento)
+        except Exception as e:
+            logging.error(f"Erro ao atualizar agregados do histórico: {str(e)}")
+        self._pending.append(codec.dumps(evento) + b"\n")
+        self._schedule_flush()
+
+    def _write(self, linhas: List[bytes], rollups: bytes) -> bool:
+        """Acrescenta as linhas ao log e grava os agregados (temporário + rename atômico)"""
+        try:
+            with open(self.events_file, "ab") as f:
+                f.write(b"".join(linhas))
+            temp_file = f"{self.rollups_file}.tmp"
+            with open(temp_file, "wb") as f:
+                f.write(rollups)
+            os.replace(temp_file, self.rollups_file)
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao gravar histórico de uso: {str(e)}")
+            return False
+
+    def _take_batch(self):
+        """Separa as linhas pendentes e serializa os agregados correspondentes a elas"""
+        linhas, self._pending = self._pending, []
+        self.rollups["posicao"] += sum(len(linha) for linha in linhas)
+        return linhas, codec.dumps(self.rollups)
+
+    def _schedule_flush(self):
+        """Grava pelo escritor em lote dentro do event loop, ou diretamente fora dele"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(*self._take_batch())
+            return
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = loop.create_task(self._writer_loop())
+
+    def _get_write_lock(self):
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        return self._write_lock
+
+    async def _write_pending(self) -> bool:
+        """Grava um lote fora do event loop (chamado com a trava de gravação)"""
+        linhas, rollups = self._take_batch()
+        if not linhas:
+            return True
+        if not await asyncio.get_running_loop().run_in_executor(None, self._write, linhas, rollups):
+            # Mantém os eventos para a próxima tentativa
+            self.rollups["posicao"] -= sum(len(linha) for linha in linhas)
+            self._pending = linhas + self._pending
+            return False
+        return True
+
+    async def _writer_loop(self):
+        """Único escritor: grava os eventos acumulados a cada HISTORY_FLUSH_DELAY segundos"""
+        while self._pending:
+            await asyncio.sleep(HISTORY_FLUSH_DELAY)
+            async with self._get_write_lock():
+                if not await self._write_pending():
+                    return
+
+    async def flush(self) -> bool:
+        """Grava já os eventos pendentes e encerra o escritor (ex: no encerramento do bot)"""
+        async with self._get_write_lock():
+            # Com a trava, o escritor não está no meio de uma gravação e pode ser cancelado
+            if self._writer_task is not None and not self._writer_task.done():
+                self._writer_task.cancel()
+            self._writer_task = None
+            return await self._write_pending()
+
+    def _periodo_segundos(self, agora: Optional[datetime.datetime] = None) -> float:
+        if not self.rollups["desde"]:
+            return 0.0
+        agora = agora or datetime.datetime.now()
+        return max((agora - datetime.datetime.fromisoformat(self.rollups["desde"])).total_seconds(), 1.0)
+
+    @staticmethod
+    def _metricas(contadores: Dict[str, Any], periodo: float) -> Dict[str, Any]:
+        """Utilização, duração média das sessões e taxa de timeout a partir dos contadores"""
+        encerrados = contadores["encerrados"]
+        return {
+            **contadores,
+            "utilizacao": contadores["segundos"] / periodo if periodo else 0.0,
+            "sessao_media": contadores["segundos"] / encerrados if encerrados else 0.0,
+            "taxa_timeout": contadores["timeouts"] / encerrados if encerrados else 0.0
+        }
+
+    def service_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Métricas de cada serviço, calculadas a partir dos agregados"""
+        periodo = self._periodo_segundos()
+        return {servico_id: self._metricas(contadores, periodo)
+                for servico_id, contadores in self.rollups["servicos"].items()}
+
+    def user_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Métricas de cada usuário, calculadas a partir dos agregados"""
+        periodo = self._periodo_segundos()
+        return {user_id: self._metricas(contadores, periodo)
+                for user_id, contadores in self.rollups["usuarios"].items()}
+
+    def hour_stats(self) -> Dict[int, Dict[str, Any]]:
+        """Usos iniciados e horas de uso somadas em cada hora do dia"""
+        return {int(hora): dict(contador) for hora, contador in self.rollups["horas"].items()}
+
+    def since(self) -> Optional[datetime.datetime]:
+        """Data do primeiro evento registrado"""
+        return datetime.datetime.fromisoformat(self.rollups["desde"]) if self.rollups["desde"] else None
+
+
+# Singleton para acesso global ao histórico de uso
+_history_instance = None
+
+
+def get_usage_history() -> UsageHistory:
+    """Obtém a instância global do histórico de uso"""
+    global _history_instance
+    if _history_instance is None:
+        _history_instance = UsageHistory()
+    return _history_instance
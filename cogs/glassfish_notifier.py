@@ -0,0 +1,117 @@
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+from .glassfish_users import get_user_resolver
+
+# Quantos destinos (usuários/canais) são notificados ao mesmo tempo em um ciclo
+NOTIFICACOES_SIMULTANEAS = 5
+
+
+class NotificationBatch:
+    """Notificações de um ciclo de verificação, enviadas de uma vez ao final.
+
+    As mensagens são agrupadas por destino: cada usuário é resolvido uma única
+    vez (pelo cache de usuários) e recebe suas mensagens em ordem, enquanto
+    destinos diferentes são atendidos em paralelo, limitados por um semáforo.
+    Mensagens repetidas para o mesmo usuário (mesma chave) no ciclo são
+    descartadas. on_sent é chamado apenas quando a mensagem foi entregue, para
+    que o estado só mude após o envio.
+    """
+
+    def __init__(self, bot, limite: int = NOTIFICACOES_SIMULTANEAS):
+        self.bot = bot
+        self.limite = limite
+        self.users = get_user_resolver(bot)
+        # destino -> lista de (conteúdo, view, on_sent)
+        self._pendentes: Dict[tuple, List[tuple]] = {}
+        self._chaves = set()
+
+    def __len__(self):
+        return sum(len(mensagens) for mensagens in self._pendentes.values())
+
+    def add_dm(self, user_id: int, content: str, view=None,
+               on_sent: Optional[Callable[[], None]] = None, key: Any = None) -> bool:
+        """Agenda uma DM; retorna False se a mesma chave já foi agendada para o usuário"""
+        user_id = int(user_id)
+        if key is not None:
+            if (user_id, key) in self._chaves:
+                return False
+            self._chaves.add((user_id, key))
+        self._pendentes.setdefault(("usuario", user_id), []).append((content, view, on_sent))
+        return True
+
+    def add_channel(self, channel, content: str):
+        """Agenda uma mensagem em um canal (mantém a ordem dentro do canal)"""
+        self._pendentes.setdefault(("canal", channel), []).append((content, None, None))
+
+    async def _resolve(self, destino: tuple):
+        """Obtém o objeto para o qual as mensagens serão enviadas"""
+        tipo, alvo = destino
+        if tipo == "canal":
+            return alvo
+        return await self.users.get_dm_channel(alvo)
+
+    async def _send_to(self, semaforo: asyncio.Semaphore, destino: tuple, mensagens: List[tuple], stats: Dict[str, Any]):
+        """Envia as mensagens de um destino, em ordem, e registra a latência"""
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                alvo = await self._resolve(destino)
+            except Exception as e:
+                logging.error(f"Erro ao obter destinatário {destino[1]}: {str(e)}")
+                if destino[0] == "usuario":
+                    self.users.invalidate(destino[1])
+                stats["falhas"] += len(mensagens)
+                return
+            for content, view, on_sent in mensagens:
+                try:
+                    if view is not None:
+                        await alvo.send(content, view=view)
+                    else:
+                        await alvo.send(content)
+                except Exception as e:
+                    logging.error(f"Erro ao enviar notificação para {destino[1]}: {str(e)}")
+                    stats["falhas"] += 1
+                    if destino[0] == "usuario":
+                        # O canal de DM em cache pode ter se tornado inválido
+                        self.users.invalidate(destino[1])
+                    continue
+                stats["enviadas"] += 1
+                if on_sent:
+                    try:
+                        on_sent()
+                        stats["confirmadas"] += 1
+                    except Exception as e:
+                        logging.error(f"Erro ao registrar envio de notificação: {str(e)}")
+            latencia = (time.perf_counter() - inicio) * 1000
+            stats["mais_lenta_ms"] = max(stats["mais_lenta_ms"], latencia)
+
+    async def dispatch(self) -> Dict[str, Any]:
+        """Envia todas as notificações do ciclo e retorna as estatísticas de envio"""
+        stats = {
+            "destinos": len(self._pendentes),
+            "enviadas": 0,
+            "falhas": 0,
+            "confirmadas": 0,
+            "duracao_ms": 0.0,
+            "mais_lenta_ms": 0.0
+        }
+        if not self._pendentes:
+            return stats
+
+        pendentes, self._pendentes = self._pendentes, {}
+        self._chaves = set()
+        semaforo = asyncio.Semaphore(self.limite)
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            self._send_to(semaforo, destino, mensagens, stats)
+            for destino, mensagens in pendentes.items()
+        ))
+        stats["duracao_ms"] = (time.perf_counter() - inicio) * 1000
+        logging.info(
+            f"Notificações do ciclo: {stats['enviadas']} enviadas, {stats['falhas']} falhas, "
+            f"{stats['destinos']} destinos em {stats['duracao_ms']:.0f} ms "
+            f"(mais lenta: {stats['mais_lenta_ms']:.0f} ms)"
+        )
+        return stats
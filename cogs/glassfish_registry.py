@@ -0,0 +1,796 @@
+import os
+import uuid
+import heapq
+import bisect
+import asyncio
+import logging
+import datetime
+import unicodedata
+from typing import Dict, Any, FrozenSet, Iterable, List, Optional, Set, Tuple
+from . import persistence_codec as codec
+from .glassfish_models import UsageData
+from .glassfish_reservations import ReservationCalendar
+
+SERVICES_FILE = "services.json"
+# Janela (em segundos) em que commits seguidos são agrupados em uma única gravação
+COMMIT_BATCH_DELAY = 0.005
+# Minutos que o próximo da fila tem para assumir um serviço repassado a ele
+PRAZO_REPASSE_MINUTOS = 10
+
+
+class ServiceRegistry:
+    """Mantém os serviços do services.json em memória.
+
+    As leituras são servidas do dicionário em memória; a cada acesso apenas o
+    mtime/tamanho do arquivo é consultado para detectar edições externas. O
+    dicionário retornado por get_all é sempre o mesmo objeto: recargas atualizam
+    o conteúdo no lugar, então views e comandos que guardam a referência enxergam
+    os dados atuais. Alterações devem ser gravadas com commit (ou save).
+
+    As gravações passam por uma fila com um único escritor: commits feitos em
+    poucos milissegundos viram uma só gravação, serializada no event loop (estado
+    consistente) e escrita fora dele com arquivo temporário + rename atômico.
+    """
+
+    def __init__(self, services_file: str = SERVICES_FILE, compact: bool = False):
+        self.services_file = services_file
+        self.compact = compact
+        self._services: Dict[str, Any] = {}
+        self._signature = None
+        self._loaded = False
+        # Fila de commits: alterações pendentes, o futuro do próximo lote e o escritor
+        self._dirty = False
+        self._writing = False
+        self._commit_future = None
+        self._writer_task = None
+        # Funções chamadas com o ID do serviço alterado (ou None para "todos")
+        self._listeners = []
+        # Funções chamadas quando um serviço liberado é repassado ao próximo da fila
+        self._handoff_listeners = []
+        self.handoff_minutes = PRAZO_REPASSE_MINUTOS
+        # Funções chamadas a cada evento de uso (histórico): callback(tipo, servico_id, **dados)
+        self._event_listeners = []
+        # Índice invertido de permissões: cargo -> serviços e serviço -> cargos,
+        # além da posição de cada serviço para manter a ordem do services.json
+        self._role_index: Dict[int, Set[str]] = {}
+        self._service_roles: Dict[str, FrozenSet[int]] = {}
+        self._order: Dict[str, int] = {}
+        # Índice de prefixos dos nomes: lista ordenada de (termo, ID) para busca com bisect
+        self._name_index: List[Tuple[str, str]] = []
+        self._service_terms: Dict[str, Tuple[str, ...]] = {}
+        # Versão de cada serviço, incrementada a cada alteração (compare-and-set)
+        self._versions: Dict[str, int] = {}
+        # Calendário de reservas futuras de cada serviço (sobre config["reservas"])
+        self._calendars: Dict[str, ReservationCalendar] = {}
+
+    def _file_signature(self):
+        """Retorna (mtime, tamanho) do arquivo, sem lê-lo"""
+        try:
+            stat = os.stat(self.services_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _replace_contents(target: Dict[str, Any], source: Dict[str, Any]):
+        """Atualiza target no lugar, preservando também os dicionários de cada serviço"""
+        for key in list(target.keys()):
+            if key not in source:
+                del target[key]
+        for key, value in source.items():
+            current = target.get(key)
+            if isinstance(current, dict) and isinstance(value, dict) and current is not value:
+                current.clear()
+                current.update(value)
+            else:
+                target[key] = value
+
+    def add_listener(self, callback):
+        """Registra uma função chamada a cada alteração: callback(servico_id ou None)"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    @staticmethod
+    def _parse_roles(servico_id: str, config: Dict[str, Any]) -> FrozenSet[int]:
+        """Converte os grupos_permitidos de um serviço para IDs de cargo inteiros"""
+        roles = set()
+        for grupo in config.get("grupos_permitidos", []):
+            try:
+                roles.add(int(grupo))
+            except (ValueError, TypeError):
+                logging.error(f"ID de grupo inválido em {servico_id}: {grupo}")
+        return frozenset(roles)
+
+    def _index_service(self, servico_id: str):
+        """Atualiza o índice de permissões de um único serviço"""
+        config = self._services.get(servico_id)
+        new_roles = self._parse_roles(servico_id, config) if isinstance(config, dict) else frozenset()
+        old_roles = self._service_roles.get(servico_id, frozenset())
+        if new_roles == old_roles and (config is None) == (servico_id not in self._service_roles):
+            return
+        for role in old_roles - new_roles:
+            servicos = self._role_index.get(role)
+            if servicos is not None:
+                servicos.discard(servico_id)
+                if not servicos:
+                    del self._role_index[role]
+        for role in new_roles - old_roles:
+            self._role_index.setdefault(role, set()).add(servico_id)
+        if config is None:
+            self._service_roles.pop(servico_id, None)
+        else:
+            self._service_roles[servico_id] = new_roles
+
+    def _rebuild_role_index(self):
+        """Reconstrói o índice de permissões a partir de todos os serviços"""
+        role_index: Dict[int, Set[str]] = {}
+        service_roles: Dict[str, FrozenSet[int]] = {}
+        for servico_id, config in self._services.items():
+            if not isinstance(config, dict):
+                continue
+            roles = self._parse_roles(servico_id, config)
+            service_roles[servico_id] = roles
+            for role in roles:
+                role_index.setdefault(role, set()).add(servico_id)
+        self._role_index = role_index
+        self._service_roles = service_roles
+
+    def permitted_services(self, role_ids: Iterable[int]) -> Dict[str, Any]:
+        """Retorna os serviços permitidos para os cargos informados, na ordem do services.json.
+
+        Usa o índice invertido: o custo depende da quantidade de cargos do usuário
+        e de serviços permitidos, não do total de serviços e grupos.
+        """
+        services = self.get_all()
+        permitted: Set[str] = set()
+        for role in role_ids:
+            permitted.update(self._role_index.get(role, ()))
+        ordered = sorted(permitted, key=lambda servico_id: self._order.get(servico_id, 0))
+        return {servico_id: services[servico_id] for servico_id in ordered if servico_id in services}
+
+    def has_permission(self, servico_id: str, role_ids: Iterable[int]) -> bool:
+        """Verifica se algum dos cargos tem permissão para o serviço"""
+        self.get_all()
+        roles = self._service_roles.get(servico_id, frozenset())
+        return any(role in roles for role in role_ids)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """Minúsculas e sem acentos, para comparar nomes e buscas"""
+        text = unicodedata.normalize("NFKD", str(text).lower())
+        return "".join(char for char in text if not unicodedata.combining(char))
+
+    @classmethod
+    def _name_terms(cls, config: Dict[str, Any]) -> Tuple[str, ...]:
+        """Termos indexados de um serviço: o nome completo e cada palavra dele"""
+        name = cls._normalize(config.get("nome", ""))
+        words = "".join(char if char.isalnum() else " " for char in name).split()
+        return tuple(sorted({name.strip(), *words} - {""}))
+
+    def _index_name(self, servico_id: str):
+        """Atualiza o índice de nomes de um único serviço"""
+        config = self._services.get(servico_id)
+        new_terms = self._name_terms(config) if isinstance(config, dict) else ()
+        old_terms = self._service_terms.get(servico_id, ())
+        if new_terms == old_terms:
+            return
+        for term in old_terms:
+            position = bisect.bisect_left(self._name_index, (term, servico_id))
+            if position < len(self._name_index) and self._name_index[position] == (term, servico_id):
+                del self._name_index[position]
+        for term in new_terms:
+            bisect.insort(self._name_index, (term, servico_id))
+        if new_terms:
+            self._service_terms[servico_id] = new_terms
+        else:
+            self._service_terms.pop(servico_id, None)
+
+    def _rebuild_name_index(self):
+        """Reconstrói o índice de nomes a partir de todos os serviços"""
+        service_terms = {
+            servico_id: self._name_terms(config)
+            for servico_id, config in self._services.items() if isinstance(config, dict)
+        }
+        self._name_index = sorted(
+            (term, servico_id) for servico_id, terms in service_terms.items() for term in terms
+        )
+        self._service_terms = service_terms
+
+    def search_services(self, query: str) -> Set[str]:
+        """Retorna os IDs dos serviços cujo nome tem palavras começando com cada termo da busca"""
+        self.get_all()
+        words = self._normalize(query).split()
+        if not words:
+            return set(self._service_terms)
+        result: Optional[Set[str]] = None
+        for word in words:
+            start = bisect.bisect_left(self._name_index, (word, ""))
+            end = bisect.bisect_left(self._name_index, (word + "\uffff", ""))
+            found = {servico_id for _, servico_id in self._name_index[start:end]}
+            result = found if result is None else result & found
+            if not result:
+                break
+        return result or set()
+
+    def add_handoff_listener(self, callback):
+        """Registra uma função chamada a cada repasse: callback(servico_id, entrada_da_fila)"""
+        if callback not in self._handoff_listeners:
+            self._handoff_listeners.append(callback)
+
+    def _notify_handoff(self, servico_id: str, entry: Dict[str, Any]):
+        """Avisa os interessados que o serviço foi repassado ao próximo da fila"""
+        for callback in self._handoff_listeners:
+            try:
+                callback(servico_id, entry)
+            except Exception as e:
+                logging.error(f"Erro ao notificar repasse do serviço {servico_id}: {str(e)}")
+
+    def add_event_listener(self, callback):
+        """Registra uma função chamada a cada evento de uso (uso, confirmação, extensão, liberação...)"""
+        if callback not in self._event_listeners:
+            self._event_listeners.append(callback)
+
+    def _record(self, tipo: str, servico_id: str, **dados):
+        """Repassa um evento de uso aos interessados (ex: histórico)"""
+        for callback in self._event_listeners:
+            try:
+                callback(tipo, servico_id, **dados)
+            except Exception as e:
+                logging.error(f"Erro ao registrar evento {tipo} do serviço {servico_id}: {str(e)}")
+
+    def _notify(self, changed: Optional[str] = None):
+        """Atualiza os índices e avisa os interessados sobre uma alteração"""
+        if changed is None or changed not in self._order:
+            self._rebuild_role_index()
+            self._rebuild_name_index()
+            self._order = {servico_id: i for i, servico_id in enumerate(self._services)}
+        else:
+            self._index_service(changed)
+            self._index_name(changed)
+            if changed not in self._services:
+                # Serviço removido
+                self._order.pop(changed, None)
+                self._calendars.pop(changed, None)
+        for servico_id in (self._services if changed is None else (changed,)):
+            self._versions[servico_id] = self._versions.get(servico_id, 0) + 1
+        for callback in self._listeners:
+            try:
+                callback(changed)
+            except Exception as e:
+                logging.error(f"Erro ao notificar alteração de serviços: {str(e)}")
+
+    def _load(self):
+        """Lê o arquivo e atualiza os serviços em memória"""
+        signature = self._file_signature()
+        try:
+            with open(self.services_file, "rb") as f:
+                services = codec.loads(f.read())
+        except FileNotFoundError:
+            logging.warning("Arquivo services.json não encontrado. Criando um novo.")
+            services = {}
+        except ValueError as e:
+            # Um arquivo inválido não apaga os serviços já carregados
+            logging.error(f"Erro ao decodificar JSON do arquivo services.json: {str(e)}")
+            self._signature = signature
+            return
+        except Exception as e:
+            logging.error(f"Erro ao carregar serviços: {str(e)}")
+            return
+
+        self._replace_contents(self._services, services)
+        self._signature = signature
+        if self._loaded:
+            logging.info("services.json alterado externamente, serviços recarregados")
+        self._loaded = True
+        self._notify()
+
+    def get_all(self) -> Dict[str, Any]:
+        """Retorna todos os serviços, recarregando apenas se o arquivo mudou"""
+        # Com gravações pendentes a memória é mais nova que o arquivo
+        pending = self._dirty or self._writing
+        if not self._loaded or (not pending and self._file_signature() != self._signature):
+            self._load()
+        return self._services
+
+    def get(self, servico_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna a configuração de um serviço"""
+        return self.get_all().get(servico_id)
+
+    def version(self, servico_id: str) -> int:
+        """Retorna a versão atual do serviço (muda a cada alteração)"""
+        self.get_all()
+        return self._versions.get(servico_id, 0)
+
+    @staticmethod
+    def _is_holder(config: Dict[str, Any], user_id: Optional[int], usuario: Optional[str]) -> bool:
+        """Verifica se o usuário informado é quem está usando o serviço"""
+        holder_id = config.get("usage_data", {}).get("user_id")
+        if holder_id and user_id:
+            return str(holder_id) == str(user_id)
+        return usuario is not None and config.get("usuario") == usuario
+
+    def claim(self, servico_id: str, usuario: str, user_id: int,
+              expected_version: Optional[int] = None) -> Tuple[bool, str]:
+        """Reserva o serviço para o usuário com compare-and-set sobre o estado em memória.
+
+        A verificação e a alteração acontecem sem nenhum await entre elas, então
+        cliques simultâneos são resolvidos no event loop: apenas o primeiro vence.
+        A gravação do arquivo é enfileirada depois.
+
+        Returns:
+            (sucesso, motivo): motivo é "ok", "nao_encontrado", "versao" ou "em_uso"
+        """
+        config = self.get_all().get(servico_id)
+        if config is None:
+            return False, "nao_encontrado"
+        if expected_version is not None and self._versions.get(servico_id, 0) != expected_version:
+            return False, "versao"
+        if config.get("status") == "em uso":
+            return False, "em_uso"
+
+        self._assign(config, usuario, user_id)
+        self.save(changed=servico_id)
+        self._record("uso", servico_id, user_id=user_id, usuario=usuario, origem="manual")
+        return True, "ok"
+
+    @staticmethod
+    def _assign(config: Dict[str, Any], usuario: str, user_id: int):
+        """Marca o serviço como em uso pelo usuário, iniciando uma nova geração de uso"""
+        config["status"] = "em uso"
+        config["usuario"] = usuario
+        config["usage_data"] = UsageData(usuario, user_id).to_dict()
+        # Geração do uso: identifica esta reserva para os lembretes enviados durante ela
+        config["geracao_uso"] = int(config.get("geracao_uso", 0)) + 1
+        # Limpa a flag de notificação de timeout para permitir novas notificações
+        config.pop("notificacao_timeout", None)
+        config.pop("repasse_ate", None)
+        config.pop("reserva_ativa", None)
+
+    def _handoff(self, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Repassa o serviço recém-liberado ao primeiro da fila, com prazo para assumir"""
+        fila = config.get("fila") or []
+        if not fila:
+            config.pop("fila", None)
+            return None
+        entry = fila.pop(0)
+        if not fila:
+            config.pop("fila", None)
+        self._assign(config, entry["usuario"], entry["user_id"])
+        if entry.get("reserva"):
+            # Quem reservou o horário (fila gravada por versões anteriores) assume na hora,
+            # sem prazo para clicar em Assumir
+            config["reserva_ativa"] = entry["reserva"]
+            return entry
+        config["repasse_ate"] = (datetime.datetime.now() + datetime.timedelta(minutes=self.handoff_minutes)).isoformat()
+        return entry
+
+    def waitlist(self, servico_id: str) -> List[Dict[str, Any]]:
+        """Retorna a fila de espera do serviço (na ordem de atendimento)"""
+        config = self.get_all().get(servico_id) or {}
+        return list(config.get("fila") or [])
+
+    def join_waitlist(self, servico_id: str, user_id: int, usuario: str) -> Tuple[bool, str, int]:
+        """Coloca o usuário no fim da fila de espera de um serviço em uso.
+
+        Returns:
+            (sucesso, motivo, posição): motivo é "ok", "nao_encontrado", "disponivel",
+            "eh_o_usuario" ou "ja_na_fila"
+        """
+        config = self.get_all().get(servico_id)
+        if config is None:
+            return False, "nao_encontrado", 0
+        if config.get("status") != "em uso":
+            return False, "disponivel", 0
+        if self._is_holder(config, user_id, usuario):
+            return False, "eh_o_usuario", 0
+        fila = config.setdefault("fila", [])
+        for posicao, entry in enumerate(fila, start=1):
+            if str(entry.get("user_id")) == str(user_id):
+                return False, "ja_na_fila", posicao
+        fila.append({"user_id": user_id, "usuario": usuario, "entrada": datetime.datetime.now().isoformat()})
+        self.save(changed=servico_id)
+        return True, "ok", len(fila)
+
+    def leave_waitlist(self, servico_id: str, user_id: int) -> bool:
+        """Remove o usuário da fila de espera do serviço"""
+        config = self.get_all().get(servico_id)
+        fila = (config or {}).get("fila") or []
+        restante = [entry for entry in fila if str(entry.get("user_id")) != str(user_id)]
+        if len(restante) == len(fila):
+            return False
+        if restante:
+            config["fila"] = restante
+        else:
+            config.pop("fila", None)
+        self.save(changed=servico_id)
+        return True
+
+    def accept_handoff(self, servico_id: str, user_id: int, usuario: str,
+                       expected_generation: Optional[int] = None) -> Tuple[bool, str]:
+        """Confirma que o usuário assumiu o serviço repassado a ele pela fila.
+
+        Returns:
+            (sucesso, motivo): motivo é "ok", "nao_encontrado", "outro_usuario",
+            "geracao" ou "ja_assumido"
+        """
+        config = self.get_all().get(servico_id)
+        if config is None:
+            return False, "nao_encontrado"
+        if config.get("status") != "em uso" or not self._is_holder(config, user_id, usuario):
+            return False, "outro_usuario"
+        if expected_generation is not None and config.get("geracao_uso") != expected_generation:
+            return False, "geracao"
+        if "repasse_ate" not in config:
+            return False, "ja_assumido"
+        config.pop("repasse_ate", None)
+        # O tempo de uso começa a contar quando o serviço é assumido
+        config["usage_data"] = UsageData(usuario, user_id).to_dict()
+        self.save(changed=servico_id)
+        self._record("uso", servico_id, user_id=user_id, usuario=usuario, origem="fila")
+        return True, "ok"
+
+    def usage_generation(self, servico_id: str) -> Optional[int]:
+        """Retorna a geração do uso atual do serviço (None se disponível ou sem geração)"""
+        config = self.get_all().get(servico_id)
+        if not config or config.get("status") != "em uso":
+            return None
+        return config.get("geracao_uso")
+
+    def release(self, servico_id: str, user_id: Optional[int] = None, usuario: Optional[str] = None,
+                force: bool = False, expected_version: Optional[int] = None,
+                expected_generation: Optional[int] = None, causa: str = "manual") -> Tuple[bool, str]:
+        """Libera o serviço com compare-and-set: só quem o está usando (ou force) pode liberar.
+
+        Se houver fila de espera, o serviço é repassado na hora ao primeiro dela,
+        que tem handoff_minutes para assumi-lo. causa vai para o histórico
+        ("manual", "timeout", "repasse", "todos" ou "reserva").
+
+        Returns:
+            (sucesso, motivo): motivo é "ok", "nao_encontrado", "versao", "disponivel",
+            "geracao" (o uso do lembrete já terminou) ou "outro_usuario"
+        """
+        config = self.get_all().get(servico_id)
+        if config is None:
+            return False, "nao_encontrado"
+        if expected_version is not None and self._versions.get(servico_id, 0) != expected_version:
+            return False, "versao"
+        if config.get("status") != "em uso":
+            return False, "disponivel"
+        if expected_generation is not None and config.get("geracao_uso") != expected_generation:
+            return False, "geracao"
+        if not force and not self._is_holder(config, user_id, usuario):
+            return False, "outro_usuario"
+
+        self._record_end(servico_id, config, causa)
+        config["status"] = "disponível"
+        config["usuario"] = None
+        config.pop("usage_data", None)
+        config.pop("notificacao_timeout", None)
+        config.pop("repasse_ate", None)
+        config.pop("reserva_ativa", None)
+        # Repassa imediatamente ao próximo da fila, se houver
+        entry = self._handoff(config)
+        self.save(changed=servico_id)
+        if entry is not None:
+            if entry.get("reserva"):
+                self._record("uso", servico_id, user_id=entry["user_id"], usuario=entry["usuario"], origem="reserva")
+            self._notify_handoff(servico_id, entry)
+        return True, "ok"
+
+    def _record_end(self, servico_id: str, config: Dict[str, Any], causa: str):
+        """Registra o fim do uso atual no histórico, com a duração da sessão"""
+        usage_data = config.get("usage_data") or {}
+        dados = {"user_id": usage_data.get("user_id"), "usuario": config.get("usuario"), "causa": causa}
+        if "repasse_ate" in config:
+            # Repasse não assumido: não houve sessão de uso
+            self._record("repasse", servico_id, **dados)
+            return
+        try:
+            inicio = datetime.datetime.fromisoformat(usage_data["timestamp"])
+            dados["inicio"] = inicio.isoformat(timespec="seconds")
+            dados["duracao"] = max(round((datetime.datetime.now() - inicio).total_seconds()), 0)
+        except (KeyError, ValueError, TypeError):
+            pass
+        self._record("timeout" if causa == "timeout" else "liberacao", servico_id, **dados)
+
+    def confirm_use(self, servico_id: str, user_id: int, usuario: str, expected_generation: Optional[int] = None,
+                    tempo_maximo: Optional[float] = None, max_extensoes: Optional[int] = None) -> Tuple[bool, str, int]:
+        """Registra que o usuário confirmou o uso, contando extensões, sobre o estado atual.
+
+        Uma confirmação feita após tempo_maximo horas desde a anterior conta como
+        extensão. Assim como claim/release, a verificação e a alteração acontecem
+        sem await entre elas.
+
+        Returns:
+            (sucesso, motivo, extensões): motivo é "ok", "extensao", "limite",
+            "nao_encontrado", "geracao" ou "outro_usuario"
+        """
+        config = self.get_all().get(servico_id)
+        if config is None:
+            return False, "nao_encontrado", 0
+        if config.get("status") != "em uso" or not self._is_holder(config, user_id, usuario):
+            return False, "outro_usuario", 0
+        if expected_generation is not None and config.get("geracao_uso") != expected_generation:
+            return False, "geracao", 0
+
+        try:
+            usage_data = UsageData.from_dict(config["usage_data"])
+        except (KeyError, ValueError, TypeError) as e:
+            logging.error(f"Erro ao atualizar dados de uso: {str(e)}")
+            # Cria novo objeto de uso se os dados estiverem ausentes ou inválidos
+            usage_data = UsageData(usuario, user_id)
+
+        motivo = "ok"
+        if usage_data.last_check and tempo_maximo is not None:
+            horas_desde_verificacao = (datetime.datetime.now() - usage_data.last_check).total_seconds() / 3600
+            # Confirmar depois do prazo conta como uma extensão
+            if horas_desde_verificacao > tempo_maximo:
+                count = usage_data.increment_extension()
+                if max_extensoes is not None and count > max_extensoes:
+                    return False, "limite", count - 1
+                motivo = "extensao"
+
+        usage_data.update_check()
+        config["usage_data"] = usage_data.to_dict()
+        self.save(changed=servico_id)
+        self._record("extensao" if motivo == "extensao" else "confirmacao", servico_id, user_id=user_id,
+                     usuario=usuario, extensoes=usage_data.extension_count)
+        return True, motivo, usage_data.extension_count
+
+    def reservations(self, servico_id: str) -> Optional[ReservationCalendar]:
+        """Retorna o calendário de reservas do serviço, reconstruído só se a lista mudou externamente"""
+        config = self.get_all().get(servico_id)
+        if config is None:
+            self._calendars.pop(servico_id, None)
+            return None
+        reservas = config.get("reservas")
+        calendario = self._calendars.get(servico_id)
+        if calendario is None or not calendario.tracks(reservas):
+            calendario = ReservationCalendar(reservas if reservas else None)
+            self._calendars[servico_id] = calendario
+        return calendario
+
+    def upcoming_reservations(self, servico_ids: Optional[Iterable[str]] = None,
+                              limite: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Reservas atuais e futuras dos serviços informados (ou de todos), em ordem de início"""
+        agora = datetime.datetime.now()
+        por_servico = []
+        for servico_id in (servico_ids if servico_ids is not None else list(self.get_all().keys())):
+            calendario = self.reservations(servico_id)
+            if calendario:
+                por_servico.append([(reserva["inicio"], servico_id, reserva)
+                                    for reserva in calendario.upcoming(agora, limite)])
+        ordenadas = heapq.merge(*por_servico, key=lambda item: datetime.datetime.fromisoformat(item[0]))
+        resultado = [(servico_id, reserva) for _, servico_id, reserva in ordenadas]
+        return resultado if limite is None else resultado[:limite]
+
+    def add_reservation(self, servico_id: str, user_id: int, usuario: str, inicio: datetime.datetime,
+                        fim: datetime.datetime, descricao: str = "") -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """Reserva o serviço para uma janela futura [inicio, fim), recusando sobreposições.
+
+        Returns:
+            (sucesso, motivo, reserva): motivo é "ok", "nao_encontrado", "intervalo",
+            "passado" ou "conflito" (reserva é então a reserva conflitante)
+        """
+        calendario = self.reservations(servico_id)
+        if calendario is None:
+            return False, "nao_encontrado", None
+        if fim <= inicio:
+            return False, "intervalo", None
+        if fim <= datetime.datetime.now():
+            return False, "passado", None
+        conflitante = calendario.conflict(inicio, fim)
+        if conflitante is not None:
+            return False, "conflito", conflitante
+
+        reserva = {
+            "id": uuid.uuid4().hex[:8],
+            "user_id": user_id,
+            "usuario": usuario,
+            "inicio": inicio.isoformat(),
+            "fim": fim.isoformat(),
+            "descricao": descricao,
+            "criada": datetime.datetime.now().isoformat()
+        }
+        calendario.insert(reserva)
+        self._services[servico_id]["reservas"] = calendario.reservas
+        self.save(changed=servico_id)
+        return True, "ok", reserva
+
+    def _drop_reservation(self, servico_id: str, reserva_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a reserva do calendário e quem aguardava por ela na fila (sem gravar)"""
+        config = self._services[servico_id]
+        reserva = self.reservations(servico_id).remove(reserva_id)
+        if not config.get("reservas"):
+            config.pop("reservas", None)
+        fila = config.get("fila") or []
+        restante = [entry for entry in fila if entry.get("reserva") != reserva_id]
+        if len(restante) != len(fila):
+            if restante:
+                config["fila"] = restante
+            else:
+                config.pop("fila", None)
+        return reserva
+
+    def cancel_reservation(self, reserva_id: str, user_id: Optional[int] = None,
+                           force: bool = False) -> Tuple[bool, str, Optional[str], Optional[Dict[str, Any]]]:
+        """Cancela uma reserva: só quem reservou (ou force) pode cancelar.
+
+        Se a reserva já estiver em andamento, o usuário continua com o serviço,
+        agora sujeito aos lembretes e ao timeout normais.
+
+        Returns:
+            (sucesso, motivo, servico_id, reserva): motivo é "ok", "nao_encontrada" ou "outro_usuario"
+        """
+        for servico_id, config in self.get_all().items():
+            if not isinstance(config, dict) or not config.get("reservas"):
+                continue
+            reserva = self.reservations(servico_id).find(reserva_id)
+            if reserva is None:
+                continue
+            if not force and str(reserva.get("user_id")) != str(user_id):
+                return False, "outro_usuario", servico_id, reserva
+            self._drop_reservation(servico_id, reserva_id)
+            if config.get("reserva_ativa") == reserva_id:
+                config.pop("reserva_ativa", None)
+            self.save(changed=servico_id)
+            return True, "ok", servico_id, reserva
+        return False, "nao_encontrada", None, None
+
+    def start_reservation(self, servico_id: str, reserva_id: str) -> Tuple[bool, str]:
+        """Inicia uma reserva: o serviço é assumido por quem reservou.
+
+        A reserva tem prioridade: se o serviço estiver em uso por outra pessoa, o uso
+        dela é encerrado e ela volta para a frente da fila, recebendo o serviço de
+        volta (pelo repasse normal) quando a reserva terminar.
+
+        Returns:
+            (sucesso, motivo): motivo é "ok", "eh_o_usuario", "preempcao" ou "nao_encontrada"
+        """
+        calendario = self.reservations(servico_id)
+        reserva = calendario.find(reserva_id) if calendario else None
+        if reserva is None:
+            return False, "nao_encontrada"
+        config = self._services[servico_id]
+        reserva["iniciada"] = True
+
+        if config.get("status") == "em uso" and self._is_holder(config, reserva["user_id"], reserva["usuario"]):
+            config["reserva_ativa"] = reserva_id
+            self.save(changed=servico_id)
+            return True, "eh_o_usuario"
+
+        motivo = "ok"
+        fila = [entry for entry in config.get("fila") or [] if str(entry.get("user_id")) != str(reserva["user_id"])]
+        if config.get("status") == "em uso":
+            motivo = "preempcao"
+            holder_id = config.get("usage_data", {}).get("user_id")
+            self._record_end(servico_id, config, "reserva")
+            if holder_id:
+                fila = [entry for entry in fila if str(entry.get("user_id")) != str(holder_id)]
+                fila.insert(0, {
+                    "user_id": holder_id,
+                    "usuario": config.get("usuario"),
+                    "entrada": datetime.datetime.now().isoformat()
+                })
+        if fila:
+            config["fila"] = fila
+        else:
+            config.pop("fila", None)
+
+        self._assign(config, reserva["usuario"], reserva["user_id"])
+        config["reserva_ativa"] = reserva_id
+        self.save(changed=servico_id)
+        self._record("uso", servico_id, user_id=reserva["user_id"], usuario=reserva["usuario"], origem="reserva")
+        return True, motivo
+
+    def end_reservation(self, servico_id: str, reserva_id: str) -> Tuple[bool, str]:
+        """Encerra uma reserva no fim da janela, liberando o serviço se ela estiver em andamento.
+
+        Returns:
+            (sucesso, motivo): motivo é "liberado", "encerrada" ou "nao_encontrada"
+        """
+        calendario = self.reservations(servico_id)
+        if calendario is None or calendario.find(reserva_id) is None:
+            return False, "nao_encontrada"
+        config = self._services[servico_id]
+        self._drop_reservation(servico_id, reserva_id)
+        if config.get("reserva_ativa") == reserva_id and config.get("status") == "em uso":
+            # Libera e repassa ao próximo da fila, se houver
+            self.release(servico_id, force=True, causa="reserva")
+            return True, "liberado"
+        if config.get("reserva_ativa") == reserva_id:
+            config.pop("reserva_ativa", None)
+        self.save(changed=servico_id)
+        return True, "encerrada"
+
+    def invalidate(self):
+        """Força a releitura do arquivo no próximo acesso"""
+        self._signature = None
+
+    def _write_file(self, content: bytes) -> bool:
+        """Grava o conteúdo serializado (temporário + rename atômico)"""
+        try:
+            temp_file = f"{self.services_file}.tmp"
+            with open(temp_file, "wb") as f:
+                f.write(content)
+            os.replace(temp_file, self.services_file)
+            self._signature = self._file_signature()
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao salvar serviços: {str(e)}")
+            return False
+
+    async def _writer_loop(self):
+        """Único escritor: grava lotes enquanto houver alterações pendentes"""
+        loop = asyncio.get_running_loop()
+        while self._dirty:
+            # Aguarda alguns milissegundos para agrupar cliques em sequência
+            await asyncio.sleep(COMMIT_BATCH_DELAY)
+            future, self._commit_future = self._commit_future, None
+            self._dirty = False
+            self._writing = True
+            try:
+                content = codec.dumps(self._services, compact=self.compact)
+                ok = await loop.run_in_executor(None, self._write_file, content)
+            except Exception as e:
+                logging.error(f"Erro ao salvar serviços: {str(e)}")
+                ok = False
+            finally:
+                self._writing = False
+            if future is not None and not future.done():
+                future.set_result(ok)
+
+    def request_commit(self, services: Optional[Dict[str, Any]] = None,
+                       changed: Optional[str] = None) -> "asyncio.Future":
+        """Enfileira a gravação dos serviços e retorna um futuro com o resultado.
+
+        changed é o ID do serviço alterado, repassado aos interessados (None = todos).
+        """
+        if services is not None and services is not self._services:
+            self._replace_contents(self._services, services)
+        self._loaded = True
+        self._dirty = True
+        self._notify(changed)
+
+        loop = asyncio.get_running_loop()
+        if self._commit_future is None:
+            self._commit_future = loop.create_future()
+        future = self._commit_future
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = loop.create_task(self._writer_loop())
+        return future
+
+    async def commit(self, services: Optional[Dict[str, Any]] = None, changed: Optional[str] = None) -> bool:
+        """Grava os serviços pela fila de commits e aguarda a gravação do lote"""
+        return await self.request_commit(services, changed)
+
+    def save(self, services: Optional[Dict[str, Any]] = None, changed: Optional[str] = None) -> bool:
+        """Grava os serviços: pela fila de commits dentro do event loop, ou diretamente fora dele"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if services is not None and services is not self._services:
+                self._replace_contents(self._services, services)
+            self._loaded = True
+            self._notify(changed)
+            return self._write_file(codec.dumps(self._services, compact=self.compact))
+
+        self.request_commit(services, changed)
+        return True
+
+    async def flush(self):
+        """Aguarda a gravação de todos os commits pendentes"""
+        while self._writer_task is not None and not self._writer_task.done():
+            await asyncio.shield(self._writer_task)
+
+
+# Singleton para acesso global aos serviços
+_registry_instance = None
+
+
+def get_service_registry() -> ServiceRegistry:
+    """Obtém a instância global do registro de serviços"""
+    global _registry_instance
+    if _registry_instance is None:
+        _registry_instance = ServiceRegistry()
+    return _registry_instance
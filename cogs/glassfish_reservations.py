@@ -0,0 +1,116 @@
+import bisect
+import logging
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ReservationCalendar:
+    """Reservas futuras de um serviço, ordenadas pelo início.
+
+    Reservas conflitantes são recusadas, então os intervalos aceitos nunca se
+    sobrepõem e, ordenados pelo início, também ficam ordenados pelo fim. Com isso
+    a verificação de conflito só precisa olhar os vizinhos da posição de inserção,
+    encontrada por bisect em O(log n), sem manter uma árvore de intervalos.
+
+    A lista de reservas é a própria lista gravada no services.json (config["reservas"]),
+    mantida ordenada no lugar; os inícios e fins já convertidos ficam em listas paralelas.
+    """
+
+    def __init__(self, reservas: Optional[List[Dict[str, Any]]] = None):
+        self.reservas: List[Dict[str, Any]] = reservas if reservas is not None else []
+        self._inicios: List[datetime.datetime] = []
+        self._fins: List[datetime.datetime] = []
+        self._rebuild()
+
+    @staticmethod
+    def _parse(reserva: Dict[str, Any]) -> Tuple[datetime.datetime, datetime.datetime]:
+        return (datetime.datetime.fromisoformat(reserva["inicio"]),
+                datetime.datetime.fromisoformat(reserva["fim"]))
+
+    def _rebuild(self):
+        """Ordena a lista de reservas no lugar e reconstrói os índices de início e fim"""
+        validas = []
+        for reserva in self.reservas:
+            try:
+                inicio, fim = self._parse(reserva)
+            except (KeyError, ValueError, TypeError) as e:
+                logging.error(f"Reserva inválida descartada: {str(e)}")
+                continue
+            validas.append((inicio, fim, reserva))
+        validas.sort(key=lambda item: item[0])
+        self.reservas[:] = [reserva for _, _, reserva in validas]
+        self._inicios = [inicio for inicio, _, _ in validas]
+        self._fins = [fim for _, fim, _ in validas]
+
+    def tracks(self, reservas: Optional[List[Dict[str, Any]]]) -> bool:
+        """Verifica se o calendário ainda corresponde à lista gravada no serviço"""
+        if not reservas:
+            return not self.reservas
+        return reservas is self.reservas and len(reservas) == len(self._inicios)
+
+    def __len__(self):
+        return len(self.reservas)
+
+    def conflict(self, inicio: datetime.datetime, fim: datetime.datetime) -> Optional[Dict[str, Any]]:
+        """Retorna a reserva que se sobrepõe ao intervalo [inicio, fim), ou None"""
+        posicao = bisect.bisect_left(self._inicios, inicio)
+        # A anterior termina depois do novo início?
+        if posicao > 0 and self._fins[posicao - 1] > inicio:
+            return self.reservas[posicao - 1]
+        # A seguinte começa antes do novo fim?
+        if posicao < len(self._inicios) and self._inicios[posicao] < fim:
+            return self.reservas[posicao]
+        return None
+
+    def insert(self, reserva: Dict[str, Any]) -> int:
+        """Insere uma reserva já verificada, mantendo a ordem; retorna a posição"""
+        inicio, fim = self._parse(reserva)
+        posicao = bisect.bisect_right(self._inicios, inicio)
+        self._inicios.insert(posicao, inicio)
+        self._fins.insert(posicao, fim)
+        self.reservas.insert(posicao, reserva)
+        return posicao
+
+    def find(self, reserva_id: str) -> Optional[Dict[str, Any]]:
+        """Busca uma reserva pelo ID"""
+        for reserva in self.reservas:
+            if reserva.get("id") == reserva_id:
+                return reserva
+        return None
+
+    def remove(self, reserva_id: str) -> Optional[Dict[str, Any]]:
+        """Remove uma reserva pelo ID e a retorna"""
+        for posicao, reserva in enumerate(self.reservas):
+            if reserva.get("id") == reserva_id:
+                del self._inicios[posicao]
+                del self._fins[posicao]
+                return self.reservas.pop(posicao)
+        return None
+
+    def next_event(self) -> Optional[datetime.datetime]:
+        """Próximo instante em que o agendador deve agir: início da primeira reserva ou, se já iniciada, o fim dela.
+
+        Reservas encerradas são removidas, então a primeira da lista é sempre a atual ou a próxima.
+        """
+        if not self.reservas:
+            return None
+        return self._fins[0] if self.reservas[0].get("iniciada") else self._inicios[0]
+
+    def due(self, agora: datetime.datetime) -> List[Tuple[str, Dict[str, Any]]]:
+        """Ações vencidas, em ordem: ("fim", reserva) para reservas encerradas e ("inicio", reserva) para a que começou"""
+        acoes = []
+        for posicao, reserva in enumerate(self.reservas):
+            if self._fins[posicao] <= agora:
+                acoes.append(("fim", reserva))
+            elif self._inicios[posicao] <= agora and not reserva.get("iniciada"):
+                acoes.append(("inicio", reserva))
+                break
+            else:
+                break
+        return acoes
+
+    def upcoming(self, agora: datetime.datetime, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Reservas que ainda não terminaram, a partir da atual"""
+        posicao = bisect.bisect_right(self._fins, agora)
+        fim = None if limite is None else posicao + limite
+        return self.reservas[posicao:fim]
@@ -0,0 +1,123 @@
+import heapq
+import asyncio
+import logging
+import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class DeadlineScheduler:
+    """Agenda execuções por prazo usando um min-heap de timestamps.
+
+    Cada chave (ex: ID do serviço) tem no máximo um prazo ativo. Reagendar apenas
+    insere uma nova entrada no heap; entradas antigas são descartadas ao chegar
+    ao topo (invalidação preguiçosa). O loop dorme até o próximo prazo, ou até
+    max_sleep segundos para uma ressincronização de segurança via on_idle.
+    """
+
+    def __init__(self, on_due: Callable[[List[Any]], Awaitable[None]],
+                 on_idle: Optional[Callable[[], None]] = None, max_sleep: Optional[float] = None):
+        self.on_due = on_due
+        self.on_idle = on_idle
+        self.max_sleep = max_sleep
+        self._heap: List[tuple] = []
+        self._deadlines: Dict[Any, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, key: Any, when: Optional[datetime.datetime]):
+        """Define (ou remove, com when=None) o prazo de uma chave"""
+        if when is None:
+            self.cancel(key)
+            return
+        deadline = when.timestamp()
+        if self._deadlines.get(key) == deadline:
+            return
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, str(key), key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            # Muitas entradas obsoletas: reconstrói o heap só com os prazos ativos
+            self._heap = [(value, str(item), item) for item, value in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        # Acorda o loop para recalcular o tempo de espera
+        self._wakeup.set()
+
+    def set_max_sleep(self, max_sleep: Optional[float]):
+        """Altera o intervalo máximo de espera e acorda o loop para aplicá-lo"""
+        if max_sleep != self.max_sleep:
+            self.max_sleep = max_sleep
+            self._wakeup.set()
+
+    def cancel(self, key: Any):
+        """Remove o prazo de uma chave"""
+        self._deadlines.pop(key, None)
+
+    def keys(self) -> List[Any]:
+        """Retorna as chaves com prazo ativo"""
+        return list(self._deadlines.keys())
+
+    def next_deadline(self) -> Optional[datetime.datetime]:
+        """Retorna o prazo mais próximo ainda válido"""
+        self._discard_stale()
+        if not self._heap:
+            return None
+        return datetime.datetime.fromtimestamp(self._heap[0][0])
+
+    def _discard_stale(self):
+        """Remove do topo do heap as entradas canceladas ou reagendadas"""
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            if self._deadlines.get(key) == deadline:
+                return
+            heapq.heappop(self._heap)
+
+    def _pop_due(self, now: float) -> List[Any]:
+        """Retira todas as chaves cujo prazo já venceu"""
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, _, key = heapq.heappop(self._heap)
+            del self._deadlines[key]
+            due.append(key)
+
+    async def _run(self):
+        """Dorme até o próximo prazo e dispara on_due com as chaves vencidas"""
+        while True:
+            self._discard_stale()
+            timeout = self.max_sleep
+            idle = True
+            if self._heap:
+                until_next = max(0.0, self._heap[0][0] - datetime.datetime.now().timestamp())
+                if timeout is None or until_next <= timeout:
+                    timeout = until_next
+                    idle = False
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                # Acordado por um reagendamento: recalcula o tempo de espera
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            due = self._pop_due(datetime.datetime.now().timestamp())
+            try:
+                if due:
+                    await self.on_due(due)
+                elif idle and self.on_idle:
+                    self.on_idle()
+            except Exception as e:
+                logging.error(f"Erro ao processar prazos agendados: {str(e)}")
+
+    def start(self):
+        """Inicia o loop do agendador (requer um event loop em execução)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    def stop(self):
+        """Interrompe o loop do agendador"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
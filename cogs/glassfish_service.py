@@ -18,6 +18,16 @@ from .glassfish_config import (
     reload_config
 )
 from .glassfish_ui import CheckView
+from . import persistence_codec as codec
+from .glassfish_registry import get_service_registry
+from .glassfish_scheduler import DeadlineScheduler
+from .glassfish_notifier import NotificationBatch
+from .glassfish_history import get_usage_history
+
+# Folga somada aos prazos para que, ao disparar, o limite já esteja ultrapassado
+PRAZO_FOLGA = datetime.timedelta(seconds=1)
+# Janela (em segundos) em que atualizações da mensagem persistente viram uma só edição
+REFRESH_DEBOUNCE = 2.0
 
 
 class GlassfishService:
@@ -28,7 +38,23 @@ class GlassfishService:
         self.lembrete_intervalo = LEMBRETE_INTERVALO
         self.max_extensoes = MAX_EXTENSOES
         self.services_file = "services.json"
+        # Serviços mantidos em memória; o arquivo só é relido se mudar externamente
+        self.registry = get_service_registry()
+        # Agendador por prazo: lembretes, liberação automática e fim de extensões
+        self.scheduler = DeadlineScheduler(self._on_deadlines, on_idle=self.reschedule_all)
+        # Prazos vencidos que falharam e foram adiados para uma nova tentativa
+        self._adiados: Dict[str, datetime.datetime] = {}
+        self.registry.add_listener(self._on_services_changed)
+        self.registry.add_handoff_listener(self._on_handoff)
+        # Histórico de uso: eventos em log JSONL e agregados para o relatório
+        self.history = get_usage_history()
+        self.registry.add_event_listener(self.history.record)
         self.persistent_message = None
+        # Atualização agrupada da mensagem persistente: hash da última edição e tarefa pendente
+        self._last_dropdown_hash = None
+        self._last_persistent_content = None
+        self._refresh_pending = False
+        self._refresh_task = None
         
         # Carrega as configurações salvas, se existirem
         self._load_config_from_file()
@@ -43,6 +69,15 @@ class GlassfishService:
                 self.verificar_intervalo = config["timeout"].get("verificar_intervalo", self.verificar_intervalo)
                 self.lembrete_intervalo = config["timeout"].get("lembrete_intervalo", self.lembrete_intervalo)
                 self.max_extensoes = config["timeout"].get("max_extensoes", self.max_extensoes)
+                self.registry.handoff_minutes = config["timeout"].get("prazo_repasse_fila", self.registry.handoff_minutes)
+            
+            # O intervalo de verificação passa a ser a ressincronização de segurança do agendador
+            self.scheduler.set_max_sleep(self.verificar_intervalo * 60)
+            
+            # services.json é editado à mão, então fica indentado salvo configuração em contrário
+            self.registry.compact = codec.is_compact(
+                config.get("persistencia", {}).get("codificacao_servicos", codec.ENCODING_READABLE)
+            )
                 
             logging.info("Configurações de serviço carregadas do arquivo config.json")
         except Exception as e:
@@ -50,34 +85,19 @@ class GlassfishService:
             logging.info("Usando valores padrão para as configurações de serviço")
 
     def load_services(self) -> Dict[str, Any]:
-        """Carrega os serviços do arquivo services.json"""
-        try:
-            with open(self.services_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            logging.warning("Arquivo services.json não encontrado. Criando um novo.")
-            return {}
-        except json.JSONDecodeError as e:
-            logging.error(f"Erro ao decodificar JSON do arquivo services.json: {str(e)}")
-            return {}
-        except Exception as e:
-            logging.error(f"Erro ao carregar serviços: {str(e)}")
-            return {}
+        """Retorna os serviços do registro em memória (services.json)"""
+        return self.registry.get_all()
 
     def save_services(self, services: Dict[str, Any]):
-        """Salva os serviços no arquivo services.json"""
-        try:
-            with open(self.services_file, "w", encoding="utf-8") as f:
-                json.dump(services, f, indent=4, ensure_ascii=False)
-            logging.info("Serviços salvos com sucesso em services.json")
-        except Exception as e:
-            logging.error(f"Erro ao salvar serviços: {str(e)}")
+        """Salva os serviços no registro, que grava o services.json"""
+        self.registry.save(services)
 
     def reload_config(self):
         """Recarrega as configurações do arquivo config.json"""
         try:
             config = reload_config()
             self._load_config_from_file()
+            self.reschedule_all()
             return config
         except Exception as e:
             logging.error(f"Erro ao recarregar configurações: {str(e)}")
@@ -91,6 +111,7 @@ class GlassfishService:
             
             if save_config(config):
                 self._load_config_from_file()
+                self.reschedule_all()
                 return True
             return False
         except Exception as e:
@@ -108,18 +129,156 @@ class GlassfishService:
             }
         }
 
-    async def check_services_loop(self):
-        """Loop principal para verificação de timeout dos serviços"""
-        while True:
+    def compute_deadline(self, config: Dict[str, Any]) -> Optional[datetime.datetime]:
+        """Calcula o próximo prazo de um serviço em uso.
+
+        O prazo é o menor entre o próximo lembrete, a liberação por falta de
+        resposta ao último lembrete e o fim do tempo máximo desde a última
+        confirmação (que também marca o fim de uma extensão). Retorna None se o
+        serviço não estiver em uso.
+        """
+        if config.get("status") != "em uso" or "usage_data" not in config:
+            return None
+        if config.get("repasse_ate"):
+            # Repasse da fila pendente: o único prazo é o limite para assumir
             try:
-                await self.check_services()
-                await asyncio.sleep(self.verificar_intervalo * 60)  # Converte minutos para segundos
-            except Exception as e:
-                logging.error(f"Erro no loop de verificação de serviços: {str(e)}")
-                await asyncio.sleep(60)  # Espera 1 minuto antes de tentar novamente
+                return datetime.datetime.fromisoformat(config["repasse_ate"]) + PRAZO_FOLGA
+            except (ValueError, TypeError) as e:
+                logging.error(f"Erro ao calcular prazo do repasse: {str(e)}")
+                return None
+        if config.get("reserva_ativa"):
+            # Uso reservado: sem lembretes, o prazo é o fim da reserva (calendário)
+            return None
+        usage_data_dict = config["usage_data"]
+        try:
+            inicio = datetime.datetime.fromisoformat(usage_data_dict["timestamp"])
+            ultima_verificacao = (datetime.datetime.fromisoformat(usage_data_dict["last_check"])
+                                  if usage_data_dict.get("last_check") else None)
+            ultimo_lembrete = (datetime.datetime.fromisoformat(usage_data_dict["last_reminder"])
+                               if usage_data_dict.get("last_reminder") else None)
+        except (KeyError, ValueError, TypeError) as e:
+            logging.error(f"Erro ao calcular prazo do serviço: {str(e)}")
+            return None
+        
+        # Liberação por tempo máximo sem confirmação (ou fim da extensão)
+        prazo = (ultima_verificacao or inicio) + datetime.timedelta(hours=self.tempo_maximo_uso)
+        
+        # Liberação por lembrete sem resposta
+        if ultimo_lembrete and (not ultima_verificacao or ultimo_lembrete > ultima_verificacao):
+            prazo = min(prazo, ultimo_lembrete + datetime.timedelta(hours=self.lembrete_intervalo))
+        
+        # Próximo lembrete (só há lembrete para quem recebe DM)
+        if usage_data_dict.get("user_id"):
+            lembrete = (ultimo_lembrete or inicio) + datetime.timedelta(hours=self.lembrete_intervalo)
+            prazo = min(prazo, lembrete)
+        
+        return prazo + PRAZO_FOLGA
+
+    def reschedule(self, servico_id: str, retry: bool = False):
+        """Recalcula o prazo de um serviço no agendador"""
+        config = self.registry.get_all().get(servico_id)
+        prazo = self.compute_deadline(config) if config else None
+        prazo_reserva = self._reservation_deadline(servico_id)
+        if prazo_reserva is not None and (prazo is None or prazo_reserva < prazo):
+            prazo = prazo_reserva
+        agora = datetime.datetime.now()
+        if prazo is None or prazo > agora:
+            self._adiados.pop(servico_id, None)
+        elif retry:
+            # O prazo venceu e não pôde ser tratado (ex: DM bloqueada): tenta de novo mais tarde
+            prazo = agora + datetime.timedelta(minutes=self.verificar_intervalo)
+            self._adiados[servico_id] = prazo
+        elif self._adiados.get(servico_id, agora) > agora:
+            prazo = self._adiados[servico_id]
+        self.scheduler.schedule(servico_id, prazo)
+
+    def _reservation_deadline(self, servico_id: str) -> Optional[datetime.datetime]:
+        """Próximo início ou fim de reserva do serviço"""
+        calendario = self.registry.reservations(servico_id)
+        evento = calendario.next_event() if calendario else None
+        return evento + PRAZO_FOLGA if evento else None
+
+    def reschedule_all(self):
+        """Recalcula os prazos de todos os serviços"""
+        servicos_config = self.registry.get_all()
+        for servico_id in self.scheduler.keys():
+            if servico_id not in servicos_config:
+                self.scheduler.cancel(servico_id)
+        for servico_id in list(servicos_config.keys()):
+            self.reschedule(servico_id)
+
+    def _on_services_changed(self, servico_id: Optional[str]):
+        """Reagenda quando um serviço é usado, liberado ou confirmado"""
+        if servico_id is None:
+            self.reschedule_all()
+        else:
+            self.reschedule(servico_id)
+
+    def start_scheduler(self):
+        """Agenda os prazos atuais e inicia o agendador (requer o event loop do bot)"""
+        self.reschedule_all()
+        self.scheduler.start()
+        proximo = self.scheduler.next_deadline()
+        logging.info(
+            "Agendador de timeout iniciado; próximo prazo: "
+            f"{proximo.strftime('%d/%m/%Y %H:%M:%S') if proximo else 'nenhum'}"
+        )
+
+    def stop_scheduler(self):
+        """Interrompe o agendador de timeout"""
+        self.scheduler.stop()
+
+    async def _process_services(self, servicos_config: Dict[str, Any], servico_ids) -> Dict[str, int]:
+        """Aplica a política de timeout aos serviços informados em um único ciclo.
+
+        As decisões são tomadas primeiro e as notificações do ciclo são enviadas
+        depois, em paralelo, de modo que uma DM lenta não atrasa os demais serviços.
+        """
+        agora = datetime.datetime.now()
+        notificacoes = NotificationBatch(self.bot)
+        resultado = {"verificados": 0, "liberados": 0}
+        alteracoes = False
+        
+        for servico_id in servico_ids:
+            config = servicos_config.get(servico_id)
+            if not config:
+                continue
+            
+            # Inicia e encerra as reservas cujo horário chegou (antes da política de timeout)
+            if config.get("reservas") and await self._process_reservations(servico_id, config, agora, notificacoes):
+                alteracoes = True
+            
+            # Pula serviços disponíveis ou sem dados de uso
+            if config.get("status") != "em uso" or "usage_data" not in config:
+                continue
+            
+            resultado["verificados"] += 1
+            alterado, liberado = await self._check_service(servico_id, config, agora, notificacoes)
+            alteracoes = alteracoes or alterado
+            if liberado:
+                resultado["liberados"] += 1
+        
+        # Envia as notificações do ciclo; lembretes só são registrados se entregues, e cada
+        # registro grava apenas o próprio serviço (liberações e reservas já gravam o seu)
+        await notificacoes.dispatch()
+        
+        # Atualiza a mensagem persistente se algum serviço foi liberado ou assumido
+        if alteracoes:
+            await self._refresh_persistent_message()
+        return resultado
+
+    async def _on_deadlines(self, servico_ids):
+        """Processa apenas os serviços cujo prazo venceu"""
+        try:
+            await self._process_services(self.load_services(), servico_ids)
+        except Exception as e:
+            logging.error(f"Erro ao processar prazos de timeout: {str(e)}")
+        finally:
+            for servico_id in servico_ids:
+                self.reschedule(servico_id, retry=True)
 
     async def check_services(self):
-        """Verifica o timeout dos serviços e envia lembretes/libera automaticamente"""
+        """Verifica o timeout de todos os serviços (verificação completa, ex: /verificacao_forcada)"""
         try:
             logging.info("Iniciando verificação de timeout de serviços Glassfish")
             
@@ -128,114 +287,239 @@ class GlassfishService:
                 logging.info("Nenhum serviço encontrado para verificar")
                 return
 
-            agora = datetime.datetime.now()
-            alteracoes = False
-            servicos_verificados = 0
-            servicos_liberados = 0
+            # Itera sobre uma cópia das chaves: o registro pode ser recarregado durante os awaits
+            resultado = await self._process_services(servicos_config, list(servicos_config.keys()))
             
-            # Verifica cada serviço
-            for servico_id, config in servicos_config.items():
-                # Pula serviços disponíveis ou sem dados de uso
-                if config.get("status") != "em uso" or "usage_data" not in config:
-                    continue
-                
-                servicos_verificados += 1
+            # Log do resultado da verificação
+            if resultado["verificados"] > 0:
+                logging.info(f"Verificação concluída: {resultado['verificados']} serviços verificados, {resultado['liberados']} liberados")
+            
+            self.reschedule_all()
                 
+        except Exception as e:
+            logging.error(f"Erro geral na verificação de timeout: {str(e)}")
+
+    async def _check_service(self, servico_id: str, config: Dict[str, Any], agora: datetime.datetime,
+                             notificacoes: NotificationBatch):
+        """Aplica a política de timeout a um serviço em uso; retorna (alterado, liberado)"""
+        try:
+            # Serviço repassado pela fila: aguarda o usuário assumir até o prazo
+            if config.get("repasse_ate"):
+                if agora < datetime.datetime.fromisoformat(config["repasse_ate"]):
+                    return False, False
+                await self._expirar_repasse(servico_id, config, notificacoes)
+                return True, True
+            
+            # Uso por reserva: liberado no fim da janela, sem lembretes nem timeout
+            if config.get("reserva_ativa"):
+                return False, False
+            
+            # Converte os dados de uso
+            usage_data_dict = config["usage_data"]
+            ultimo_uso = datetime.datetime.fromisoformat(usage_data_dict["timestamp"])
+            user_id = usage_data_dict.get("user_id")
+            
+            # Calcula o tempo em uso
+            horas_em_uso = (agora - ultimo_uso).total_seconds() / 3600
+            
+            # Verifica último check se existir
+            ultima_verificacao = None
+            horas_desde_verificacao = horas_em_uso
+            if usage_data_dict.get("last_check"):
                 try:
-                    # Converte os dados de uso
-                    usage_data_dict = config["usage_data"]
-                    ultimo_uso = datetime.datetime.fromisoformat(usage_data_dict["timestamp"])
-                    user_id = usage_data_dict.get("user_id")
-                    
-                    # Calcula o tempo em uso
-                    horas_em_uso = (agora - ultimo_uso).total_seconds() / 3600
-                    
-                    # Verifica último check se existir
-                    ultima_verificacao = None
-                    horas_desde_verificacao = horas_em_uso
-                    if usage_data_dict.get("last_check"):
-                        try:
-                            ultima_verificacao = datetime.datetime.fromisoformat(usage_data_dict["last_check"])
-                            horas_desde_verificacao = (agora - ultima_verificacao).total_seconds() / 3600
-                        except (ValueError, TypeError) as e:
-                            logging.error(f"Erro ao processar última verificação: {str(e)}")
-                            
-                    # Verifica último lembrete se existir
-                    ultimo_lembrete = None
-                    horas_desde_lembrete = horas_em_uso
-                    if usage_data_dict.get("last_reminder"):
-                        try:
-                            ultimo_lembrete = datetime.datetime.fromisoformat(usage_data_dict["last_reminder"])
-                            horas_desde_lembrete = (agora - ultimo_lembrete).total_seconds() / 3600
-                        except (ValueError, TypeError) as e:
-                            logging.error(f"Erro ao processar último lembrete: {str(e)}")
-                    
-                    # Verifica o número de extensões utilizadas
-                    extension_count = int(usage_data_dict.get("extension_count", 0))
-                    
-                    logging.info(f"Serviço {servico_id} em uso por {config['usuario']} há {horas_em_uso:.1f} horas")
+                    ultima_verificacao = datetime.datetime.fromisoformat(usage_data_dict["last_check"])
+                    horas_desde_verificacao = (agora - ultima_verificacao).total_seconds() / 3600
+                except (ValueError, TypeError) as e:
+                    logging.error(f"Erro ao processar última verificação: {str(e)}")
                     
-                    # Determina se deve liberar automaticamente
-                    deve_liberar = False
-                    motivo_liberacao = ""
+            # Verifica último lembrete se existir
+            ultimo_lembrete = None
+            horas_desde_lembrete = horas_em_uso
+            if usage_data_dict.get("last_reminder"):
+                try:
+                    ultimo_lembrete = datetime.datetime.fromisoformat(usage_data_dict["last_reminder"])
+                    horas_desde_lembrete = (agora - ultimo_lembrete).total_seconds() / 3600
+                except (ValueError, TypeError) as e:
+                    logging.error(f"Erro ao processar último lembrete: {str(e)}")
+            
+            # Verifica o número de extensões utilizadas
+            extension_count = int(usage_data_dict.get("extension_count", 0))
+            
+            logging.info(f"Serviço {servico_id} em uso por {config['usuario']} há {horas_em_uso:.1f} horas")
+            
+            # Determina se deve liberar automaticamente
+            deve_liberar = False
+            motivo_liberacao = ""
+            
+            if horas_desde_verificacao > self.tempo_maximo_uso:
+                segundos_verificacao = horas_desde_verificacao * 3600
+                verificacao_horas = int(segundos_verificacao / 3600)
+                verificacao_minutos = int((segundos_verificacao % 3600) / 60)
+                verificacao_formatado = f"{verificacao_horas} horas e {verificacao_minutos} minutos"
+                
+                deve_liberar = True
+                motivo_liberacao = f"após {verificacao_formatado} sem verificação"
+            elif ultimo_lembrete and not ultima_verificacao:
+                # Se há lembrete mas nunca houve verificação
+                if horas_desde_lembrete > self.lembrete_intervalo:
+                    segundos_lembrete = horas_desde_lembrete * 3600
+                    lembrete_horas = int(segundos_lembrete / 3600)
+                    lembrete_minutos = int((segundos_lembrete % 3600) / 60)
+                    lembrete_formatado = f"{lembrete_horas} horas e {lembrete_minutos} minutos"
                     
-                    if horas_desde_verificacao > self.tempo_maximo_uso:
-                        segundos_verificacao = horas_desde_verificacao * 3600
-                        verificacao_horas = int(segundos_verificacao / 3600)
-                        verificacao_minutos = int((segundos_verificacao % 3600) / 60)
-                        verificacao_formatado = f"{verificacao_horas} horas e {verificacao_minutos} minutos"
-                        
-                        deve_liberar = True
-                        motivo_liberacao = f"após {verificacao_formatado} sem verificação"
-                    elif ultimo_lembrete and not ultima_verificacao:
-                        # Se há lembrete mas nunca houve verificação
-                        if horas_desde_lembrete > self.lembrete_intervalo:
-                            segundos_lembrete = horas_desde_lembrete * 3600
-                            lembrete_horas = int(segundos_lembrete / 3600)
-                            lembrete_minutos = int((segundos_lembrete % 3600) / 60)
-                            lembrete_formatado = f"{lembrete_horas} horas e {lembrete_minutos} minutos"
-                            
-                            deve_liberar = True
-                            motivo_liberacao = f"após {lembrete_formatado} sem resposta ao lembrete"
-                    elif ultimo_lembrete and ultima_verificacao:
-                        # Se o último lembrete é mais recente que a última verificação
-                        if ultimo_lembrete > ultima_verificacao and horas_desde_lembrete > self.lembrete_intervalo:
-                            segundos_lembrete = horas_desde_lembrete * 3600
-                            lembrete_horas = int(segundos_lembrete / 3600)
-                            lembrete_minutos = int((segundos_lembrete % 3600) / 60)
-                            lembrete_formatado = f"{lembrete_horas} horas e {lembrete_minutos} minutos"
-                            
-                            deve_liberar = True
-                            motivo_liberacao = f"após {lembrete_formatado} sem resposta ao lembrete"
+                    deve_liberar = True
+                    motivo_liberacao = f"após {lembrete_formatado} sem resposta ao lembrete"
+            elif ultimo_lembrete and ultima_verificacao:
+                # Se o último lembrete é mais recente que a última verificação
+                if ultimo_lembrete > ultima_verificacao and horas_desde_lembrete > self.lembrete_intervalo:
+                    segundos_lembrete = horas_desde_lembrete * 3600
+                    lembrete_horas = int(segundos_lembrete / 3600)
+                    lembrete_minutos = int((segundos_lembrete % 3600) / 60)
+                    lembrete_formatado = f"{lembrete_horas} horas e {lembrete_minutos} minutos"
                     
-                    if deve_liberar:
-                        # Libera o serviço automaticamente
-                        await self._liberar_servico_automaticamente(servico_id, config, motivo_liberacao, user_id)
-                        alteracoes = True
-                        servicos_liberados += 1
-                    else:
-                        # Verifica se deve enviar lembrete
-                        if await self._verificar_enviar_lembrete(servico_id, config, agora, horas_desde_lembrete, user_id, extension_count):
-                            alteracoes = True
-                
-                except Exception as e:
-                    logging.error(f"Erro ao processar verificação para o serviço {servico_id}: {str(e)}")
+                    deve_liberar = True
+                    motivo_liberacao = f"após {lembrete_formatado} sem resposta ao lembrete"
             
-            # Log do resultado da verificação
-            if servicos_verificados > 0:
-                logging.info(f"Verificação concluída: {servicos_verificados} serviços verificados, {servicos_liberados} liberados")
+            if deve_liberar:
+                # Libera o serviço automaticamente
+                await self._liberar_servico_automaticamente(servico_id, config, motivo_liberacao, user_id, notificacoes)
+                return True, True
             
-            # Salva as alterações se houver mudanças
-            if alteracoes:
-                self.save_services(servicos_config)
-                # Atualiza a mensagem persistente
-                await self._refresh_persistent_message()
+            # Verifica se deve enviar lembrete (registrado apenas quando a DM for entregue)
+            await self._verificar_enviar_lembrete(servico_id, config, agora, horas_desde_lembrete, user_id,
+                                                  extension_count, notificacoes)
+            return False, False
+        
+        except Exception as e:
+            logging.error(f"Erro ao processar verificação para o serviço {servico_id}: {str(e)}")
+            return False, False
+
+    async def _process_reservations(self, servico_id: str, config: Dict[str, Any], agora: datetime.datetime,
+                                    notificacoes: NotificationBatch) -> bool:
+        """Inicia e encerra as reservas do serviço cujo horário chegou; retorna se houve alteração"""
+        calendario = self.registry.reservations(servico_id)
+        acoes = calendario.due(agora) if calendario else []
+        channel = self.bot.get_channel(LOGS_CHANNEL_ID)
+        
+        for acao, reserva in acoes:
+            try:
+                user_id = reserva["user_id"]
+                fim = datetime.datetime.fromisoformat(reserva["fim"]).strftime('%d/%m/%Y %H:%M')
+                
+                if acao == "fim":
+                    sucesso, motivo = self.registry.end_reservation(servico_id, reserva["id"])
+                    if motivo == "liberado":
+                        logging.info(f"Reserva {reserva['id']} de {reserva['usuario']} terminou; serviço {servico_id} liberado")
+                        notificacoes.add_dm(
+                            user_id,
+                            f"🗓️ **Reserva encerrada**\n" +
+                            f"Sua reserva do serviço **{config['nome']}** terminou e o serviço foi liberado.",
+                            key=("reserva_fim", servico_id)
+                        )
+                        if channel:
+                            notificacoes.add_channel(
+                                channel,
+                                f"🗓️ **Reserva**: A reserva de <@{user_id}> para o serviço **{config['nome']}** terminou; o serviço foi liberado."
+                            )
+                    continue
                 
+                holder_id = config.get("usage_data", {}).get("user_id")
+                holder = config.get("usuario")
+                sucesso, motivo = self.registry.start_reservation(servico_id, reserva["id"])
+                if not sucesso:
+                    continue
+                logging.info(f"Reserva {reserva['id']} iniciada: serviço {servico_id} com {reserva['usuario']} até {fim}")
+                notificacoes.add_dm(
+                    user_id,
+                    f"🗓️ **Sua reserva começou**\n" +
+                    f"O serviço **{config['nome']}** está com você até **{fim}**, quando será liberado automaticamente.",
+                    key=("reserva_inicio", servico_id)
+                )
+                if channel:
+                    notificacoes.add_channel(
+                        channel,
+                        f"🗓️ **Reserva**: O serviço **{config['nome']}** foi assumido por <@{user_id}> até {fim}."
+                    )
+                if motivo == "preempcao":
+                    logging.info(f"Uso do serviço {servico_id} por {holder} interrompido pela reserva {reserva['id']}")
+                    if holder_id:
+                        notificacoes.add_dm(
+                            holder_id,
+                            f"🗓️ **Serviço reservado**\n" +
+                            f"O serviço **{config['nome']}** está reservado para **{reserva['usuario']}** a partir de agora " +
+                            f"(até {fim}) e foi passado para a reserva. Você está na frente da fila e receberá o " +
+                            f"serviço de volta quando a reserva terminar.",
+                            key=("reserva_aviso", servico_id)
+                        )
+            except Exception as e:
+                logging.error(f"Erro ao processar reserva {reserva.get('id')} do serviço {servico_id}: {str(e)}")
+        
+        return bool(acoes)
+
+    async def _expirar_repasse(self, servico_id: str, config: Dict[str, Any], notificacoes: NotificationBatch):
+        """Libera um serviço repassado que não foi assumido no prazo (passa ao próximo da fila)"""
+        usuario = config.get("usuario")
+        logging.info(f"{usuario} não assumiu o serviço {servico_id} no prazo do repasse")
+        channel = self.bot.get_channel(LOGS_CHANNEL_ID)
+        if channel:
+            notificacoes.add_channel(
+                channel,
+                f"⏭️ **Fila**: **{usuario}** não assumiu o serviço **{config['nome']}** em "
+                f"{self.registry.handoff_minutes} minutos; o serviço foi liberado."
+            )
+        self.registry.release(servico_id, force=True, causa="repasse")
+
+    def _on_handoff(self, servico_id: str, entry: Dict[str, Any]):
+        """Agenda o aviso ao próximo da fila quando um serviço é repassado a ele"""
+        try:
+            asyncio.get_running_loop().create_task(self._notify_handoff(servico_id, entry))
+        except RuntimeError:
+            logging.warning(f"Repasse do serviço {servico_id} sem event loop; {entry.get('usuario')} não foi avisado")
+
+    async def _notify_handoff(self, servico_id: str, entry: Dict[str, Any]):
+        """Avisa o próximo da fila por DM, com botões para assumir ou liberar o serviço"""
+        try:
+            # Importa aqui para evitar import circular
+            from .glassfish_ui import HandoffView
+            
+            config = self.registry.get(servico_id)
+            if not config:
+                return
+            notificacoes = NotificationBatch(self.bot)
+            if entry.get("reserva"):
+                # Reserva que aguardava na fila: o serviço já foi assumido, sem prazo para assumir
+                notificacoes.add_dm(
+                    entry["user_id"],
+                    f"🗓️ **Sua reserva começou**\n" +
+                    f"O serviço **{config['nome']}** foi liberado e já está com você até o fim da reserva.",
+                    key=("reserva_inicio", servico_id)
+                )
+                await notificacoes.dispatch()
+                await self._refresh_persistent_message()
+                return
+            notificacoes.add_dm(
+                entry["user_id"],
+                f"🔔 **Sua vez na fila do Glassfish**\n" +
+                f"O serviço **{config['nome']}** foi liberado e está reservado para você por "
+                f"{self.registry.handoff_minutes} minutos.\n" +
+                f"Clique em **Assumir** para começar a usar ou libere-o para o próximo da fila.",
+                view=HandoffView(servico_id, config.get("geracao_uso")),
+                key=("repasse", servico_id)
+            )
+            channel = self.bot.get_channel(LOGS_CHANNEL_ID)
+            if channel:
+                notificacoes.add_channel(
+                    channel,
+                    f"⏭️ **Fila**: O serviço **{config['nome']}** foi repassado para <@{entry['user_id']}>."
+                )
+            await notificacoes.dispatch()
+            await self._refresh_persistent_message()
         except Exception as e:
-            logging.error(f"Erro geral na verificação de timeout: {str(e)}")
+            logging.error(f"Erro ao avisar repasse do serviço {servico_id}: {str(e)}")
 
-    async def _liberar_servico_automaticamente(self, servico_id: str, config: Dict[str, Any], motivo: str, user_id: Optional[int]):
-        """Libera um serviço automaticamente e notifica o usuário"""
+    async def _liberar_servico_automaticamente(self, servico_id: str, config: Dict[str, Any], motivo: str,
+                                               user_id: Optional[int], notificacoes: NotificationBatch):
+        """Libera um serviço automaticamente e agenda as notificações do usuário e do canal de logs"""
         try:
             logging.warning(f"Timeout automático para o serviço {servico_id} - {config['nome']} {motivo}")
             
@@ -253,7 +537,8 @@ class GlassfishService:
             # Notifica no canal de logs
             channel = self.bot.get_channel(LOGS_CHANNEL_ID)
             if channel:
-                await channel.send(
+                notificacoes.add_channel(
+                    channel,
                     f"⏰ **Timeout Automático**: O serviço **{config['nome']}** foi liberado automaticamente {motivo}. " +
                     f"Estava sendo usado por **{config['usuario']}** por {tempo_uso}."
                 )
@@ -261,122 +546,167 @@ class GlassfishService:
             # Verifica se o usuário já foi notificado
             ja_notificado = config.get("notificacao_timeout", False)
             
-            # Tenta notificar o usuário por DM sobre a desconexão somente se ele ainda não foi notificado
+            # Notifica o usuário por DM sobre a desconexão somente se ele ainda não foi notificado
             if not ja_notificado and user_id:
-                try:
-                    user = await self.bot.fetch_user(int(user_id))
-                    await user.send(
-                        f"⚠️ **Aviso de Desconexão do Glassfish**\n" +
-                        f"Você foi desconectado automaticamente do serviço **{config['nome']}** {motivo}.\n" +
-                        f"Se ainda precisar usar este serviço, por favor solicite-o novamente."
-                    )
-                    # Marca como notificado
-                    config["notificacao_timeout"] = True
-                except Exception as dm_error:
-                    logging.error(f"Erro ao enviar DM para o usuário {user_id}: {str(dm_error)}")
-            
-            # Limpa completamente os dados do usuário e de uso
-            config["status"] = "disponível"
-            config["usuario"] = None
-            if "usage_data" in config:
-                del config["usage_data"]
+                geracao_liberada = config.get("geracao_uso")
+                
+                def marcar_notificado():
+                    # Se o serviço já foi repassado a outro usuário da fila, a flag não é dele
+                    if config.get("geracao_uso") == geracao_liberada:
+                        config["notificacao_timeout"] = True
+                        self.registry.save(changed=servico_id)
+                
+                notificacoes.add_dm(
+                    user_id,
+                    f"⚠️ **Aviso de Desconexão do Glassfish**\n" +
+                    f"Você foi desconectado automaticamente do serviço **{config['nome']}** {motivo}.\n" +
+                    f"Se ainda precisar usar este serviço, por favor solicite-o novamente.",
+                    on_sent=marcar_notificado,
+                    key=("timeout", servico_id)
+                )
+            
+            # Limpa os dados do usuário e de uso e repassa ao próximo da fila, se houver
+            self.registry.release(servico_id, force=True, causa="timeout")
                 
         except Exception as e:
             logging.error(f"Erro ao liberar serviço automaticamente {servico_id}: {str(e)}")
 
     async def _verificar_enviar_lembrete(self, servico_id: str, config: Dict[str, Any], agora: datetime.datetime, 
-                                       horas_desde_lembrete: float, user_id: Optional[int], extension_count: int) -> bool:
-        """Verifica se deve enviar lembrete e o envia se necessário"""
+                                       horas_desde_lembrete: float, user_id: Optional[int], extension_count: int,
+                                       notificacoes: NotificationBatch) -> bool:
+        """Verifica se deve enviar lembrete e o agenda no ciclo de notificações"""
         try:
             # Envia lembretes para verificação a cada lembrete_intervalo horas
-            if horas_desde_lembrete >= self.lembrete_intervalo and user_id:
-                # Evita enviar lembretes em cascata - só envia se o tempo desde o último lembrete
-                # está dentro de uma janela de 15 minutos após completar o intervalo exato
-                janela_lembrete = horas_desde_lembrete - self.lembrete_intervalo
-                
-                # Só envia se estiver dentro da primeira janela de 15 minutos após o intervalo
-                if janela_lembrete < 0.25:  # 15 minutos em horas
-                    try:
-                        user = await self.bot.fetch_user(int(user_id))
-                        
-                        # Calcula tempo em horas e minutos para exibição mais precisa ANTES de atualizar os dados
-                        usage_data_dict = config["usage_data"]  # Assegura que a variável existe
-                        logging.info(f"Processando lembrete - usage_data_dict carregado: {usage_data_dict.get('timestamp', 'N/A')}")
-                        
-                        ultimo_uso = datetime.datetime.fromisoformat(usage_data_dict["timestamp"])
-                        segundos_em_uso = (agora - ultimo_uso).total_seconds()
-                        horas_formatadas = int(segundos_em_uso / 3600)
-                        minutos_formatados = int((segundos_em_uso % 3600) / 60)
-                        tempo_formatado = f"{horas_formatadas} horas e {minutos_formatados} minutos"
-                        
-                        logging.info(f"Tempo formatado calculado: {tempo_formatado}")
-                        
-                        # Atualiza o timestamp do último lembrete ANTES de criar o CheckView
-                        usage_data = UsageData.from_dict(usage_data_dict)
-                        usage_data.update_reminder()
-                        config["usage_data"] = usage_data.to_dict()
-                        
-                        logging.info(f"Timestamp de lembrete atualizado para {config['usuario']} (ID: {user_id}) sobre o serviço {servico_id}")
-                        
-                        # Carrega serviços atualizados para o CheckView
-                        servicos_config = self.load_services()
-                        view = CheckView(servico_id, servicos_config)
-                        
-                        # Verifica se o usuário atingiu o limite de extensões
-                        info_extensoes = ""
-                        if extension_count >= self.max_extensoes:
-                            info_extensoes = f"\n⚠️ **Atenção**: Você já utilizou todas as {extension_count}/{self.max_extensoes} extensões permitidas."
-                        else:
-                            info_extensoes = f"\n📝 Você já utilizou {extension_count}/{self.max_extensoes} extensões de tempo."
-                        
-                        # Envia mensagem para o usuário
-                        await user.send(
-                            f"⚠️ **Lembrete de uso do Glassfish**\n" +
-                            f"Você está usando o serviço **{config['nome']}** há {tempo_formatado}.\n" +
-                            f"Por favor, confirme se ainda está utilizando este serviço ou libere-o se não estiver mais usando." +
-                            info_extensoes,
-                            view=view
-                        )
-                        
-                        logging.info(f"Lembrete enviado para {config['usuario']} (ID: {user_id}) sobre o serviço {servico_id}")
-                        
-                        return True
-                        
-                    except Exception as e:
-                        logging.error(f"Erro ao enviar lembrete para o usuário {user_id}: {str(e)}")
+            # Não há janela de envio: o agendador acorda no prazo exato do lembrete e
+            # last_reminder é atualizado a cada envio, o que evita lembretes em cascata
+            if horas_desde_lembrete < self.lembrete_intervalo or not user_id:
+                return False
             
-            return False
+            # Calcula tempo em horas e minutos para exibição
+            usage_data_dict = config["usage_data"]
+            ultimo_uso = datetime.datetime.fromisoformat(usage_data_dict["timestamp"])
+            segundos_em_uso = (agora - ultimo_uso).total_seconds()
+            horas_formatadas = int(segundos_em_uso / 3600)
+            minutos_formatados = int((segundos_em_uso % 3600) / 60)
+            tempo_formatado = f"{horas_formatadas} horas e {minutos_formatados} minutos"
+            
+            # A view guarda só o ID e a geração do uso; o estado é lido do registro no clique
+            view = CheckView(servico_id, config.get("geracao_uso"))
+            
+            # Verifica se o usuário atingiu o limite de extensões
+            if extension_count >= self.max_extensoes:
+                info_extensoes = f"\n⚠️ **Atenção**: Você já utilizou todas as {extension_count}/{self.max_extensoes} extensões permitidas."
+            else:
+                info_extensoes = f"\n📝 Você já utilizou {extension_count}/{self.max_extensoes} extensões de tempo."
+            
+            def registrar_lembrete():
+                # O serviço pode ter sido liberado ou trocado de usuário enquanto a DM era enviada
+                if config.get("usage_data", {}).get("user_id") != user_id:
+                    return
+                usage_data = UsageData.from_dict(config["usage_data"])
+                usage_data.update_reminder()
+                config["usage_data"] = usage_data.to_dict()
+                self.registry.save(changed=servico_id)
+                logging.info(f"Lembrete enviado para {config['usuario']} (ID: {user_id}) sobre o serviço {servico_id}")
+            
+            return notificacoes.add_dm(
+                user_id,
+                f"⚠️ **Lembrete de uso do Glassfish**\n" +
+                f"Você está usando o serviço **{config['nome']}** há {tempo_formatado}.\n" +
+                f"Por favor, confirme se ainda está utilizando este serviço ou libere-o se não estiver mais usando." +
+                info_extensoes,
+                view=view,
+                on_sent=registrar_lembrete,
+                key=("lembrete", servico_id)
+            )
         except Exception as e:
             logging.error(f"Erro ao verificar envio de lembrete: {str(e)}")
             return False
 
+    def _dropdown_hash(self, servicos_config: Dict[str, Any]) -> int:
+        """Hash das opções renderizadas do dropdown persistente (apenas a primeira página)"""
+        # Importa aqui para evitar import circular
+        from .glassfish_ui import render_service_options, first_page
+        return hash(tuple(render_service_options(first_page(servicos_config))))
+
     async def _refresh_persistent_message(self):
-        """Atualiza a mensagem persistente se existir"""
-        try:
-            # Importa aqui para evitar import circular
-            from .glassfish_ui import ServiceDropdown
-            
-            channel = self.bot.get_channel(PERSISTENT_CHANNEL_ID)
-            if not channel:
-                logging.error(f"Canal {PERSISTENT_CHANNEL_ID} não encontrado")
-                return
+        """Agenda a atualização da mensagem persistente.
+
+        Chamadas em sequência são agrupadas em uma única edição a cada
+        REFRESH_DEBOUNCE segundos, e a edição é ignorada se as opções
+        renderizadas não mudaram desde a última.
+        """
+        self._refresh_pending = True
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._apply_persistent_refresh())
+
+    async def _apply_persistent_refresh(self):
+        """Aplica as atualizações pendentes da mensagem persistente"""
+        while self._refresh_pending:
+            await asyncio.sleep(REFRESH_DEBOUNCE)
+            self._refresh_pending = False
+            try:
+                # Importa aqui para evitar import circular
+                from .glassfish_ui import ServiceDropdown
+                
+                if not self.persistent_message:
+                    continue
 
-            if self.persistent_message:
                 servicos_config = self.load_services()
+                dropdown_hash = self._dropdown_hash(servicos_config)
+                if dropdown_hash == self._last_dropdown_hash:
+                    logging.debug("Mensagem persistente do Glassfish inalterada, edição ignorada")
+                    continue
+
                 view = ServiceDropdown(None, servicos_config, check_permissions=False)
                 try:
                     await self.persistent_message.edit(view=view)
+                    self._last_dropdown_hash = dropdown_hash
                     logging.info("Mensagem persistente do Glassfish atualizada")
                 except discord.NotFound:
                     logging.warning("Mensagem persistente não encontrada, será recriada")
                     self.persistent_message = None
+                    self._last_dropdown_hash = None
+                    self._last_persistent_content = None
                 except Exception as e:
                     logging.error(f"Erro ao atualizar mensagem persistente: {str(e)}")
+            except Exception as e:
+                logging.error(f"Erro ao atualizar mensagem persistente: {str(e)}")
+
+    def _stored_persistent_message_id(self) -> Optional[int]:
+        """Retorna o ID da mensagem persistente salvo em config.json"""
+        try:
+            message_id = load_config().get("canais", {}).get("persistent_message_id")
+            return int(message_id) if message_id else None
+        except (ValueError, TypeError) as e:
+            logging.error(f"ID da mensagem persistente inválido: {str(e)}")
+            return None
+
+    def _store_persistent_message_id(self, message_id: Optional[int]):
+        """Salva o ID da mensagem persistente em config.json, se tiver mudado"""
+        try:
+            config = load_config()
+            canais = config.setdefault("canais", {})
+            if canais.get("persistent_message_id") != message_id:
+                canais["persistent_message_id"] = message_id
+                save_config(config)
         except Exception as e:
-            logging.error(f"Erro ao atualizar mensagem persistente: {str(e)}")
+            logging.error(f"Erro ao salvar ID da mensagem persistente: {str(e)}")
+
+    async def _find_persistent_message(self, channel):
+        """Procura a mensagem persistente no histórico do canal (fallback sem ID salvo)"""
+        async for message in channel.history(limit=100):
+            if message.author == self.bot.user and "**Serviços Glassfish**" in message.content:
+                return message
+        return None
 
     async def setup_persistent_message(self):
-        """Configura ou atualiza a mensagem persistente no canal específico"""
+        """Configura ou atualiza a mensagem persistente no canal específico.
+
+        A mensagem é localizada pelo ID salvo em config.json (canais.persistent_message_id),
+        sem buscar o histórico; a varredura do histórico só é usada se o ID não
+        existir ou a mensagem tiver sido apagada.
+        """
         try:
             # Importa aqui para evitar import circular
             from .glassfish_ui import ServiceDropdown
@@ -386,25 +716,45 @@ class GlassfishService:
                 logging.error(f"Canal {PERSISTENT_CHANNEL_ID} não encontrado")
                 return
 
-            # Procura por mensagem existente do bot
-            async for message in channel.history(limit=100):
-                if message.author == self.bot.user and "**Serviços Glassfish**" in message.content:
-                    self.persistent_message = message
-                    break
-
             servicos_config = self.load_services()
-            view = ServiceDropdown(None, servicos_config, check_permissions=False)
             message_content = (
                 "**Serviços Glassfish**\n"
                 "Selecione um serviço abaixo para gerenciá-lo.\n"
                 "🟢 = Disponível | 🔴 = Em uso\n"
                 f"⚠️ Serviços em uso por mais de {self.tempo_maximo_uso} horas sem confirmação serão liberados automaticamente."
             )
+            dropdown_hash = self._dropdown_hash(servicos_config)
+
+            # Reconexão: a mensagem já está configurada e nada mudou
+            if (self.persistent_message and dropdown_hash == self._last_dropdown_hash
+                    and message_content == self._last_persistent_content):
+                logging.info("Mensagem persistente do Glassfish já configurada")
+                return
+
+            # Usa o ID salvo sem nenhuma requisição (mensagem parcial)
+            if not self.persistent_message:
+                message_id = self._stored_persistent_message_id()
+                if message_id:
+                    self.persistent_message = channel.get_partial_message(message_id)
 
+            view = ServiceDropdown(None, servicos_config, check_permissions=False)
             if self.persistent_message:
-                await self.persistent_message.edit(content=message_content, view=view)
-            else:
-                self.persistent_message = await channel.send(message_content, view=view)
+                try:
+                    self.persistent_message = await self.persistent_message.edit(content=message_content, view=view)
+                except discord.NotFound:
+                    logging.warning("Mensagem persistente salva não encontrada, procurando no histórico do canal")
+                    self.persistent_message = None
+
+            if not self.persistent_message:
+                message = await self._find_persistent_message(channel)
+                if message:
+                    self.persistent_message = await message.edit(content=message_content, view=view)
+                else:
+                    self.persistent_message = await channel.send(message_content, view=view)
+
+            self._last_dropdown_hash = dropdown_hash
+            self._last_persistent_content = message_content
+            self._store_persistent_message_id(self.persistent_message.id)
             
             logging.info("Mensagem persistente do Glassfish configurada/atualizada")
         except Exception as e:
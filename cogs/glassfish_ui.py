@@ -2,9 +2,11 @@ import discord
 import json
 import logging
 import datetime
+import uuid
+import itertools
 from typing import Dict, Any, Optional, List
-from .glassfish_models import UsageData
 from .glassfish_config import CARGO_TI_ID, LOGS_CHANNEL_ID, MAX_EXTENSOES
+from .glassfish_registry import get_service_registry
 
 
 class ProblemReportModal(discord.ui.Modal, title="Reportar Problema"):
@@ -49,46 +51,73 @@ class ProblemReportModal(discord.ui.Modal, title="Reportar Problema"):
             )
 
 
+# Limite de opções de um Select do Discord
+SERVICOS_POR_PAGINA = 25
+# Filtros do seletor de serviços: chave -> rótulo do botão
+FILTROS_SERVICOS = {
+    "todos": "Todos",
+    "disponiveis": "Disponíveis",
+    "em_uso": "Em uso",
+    "meus": "Meus"
+}
+
+
+def render_service_options(servicos: Dict[str, Any]) -> List[tuple]:
+    """Calcula as opções do dropdown como tuplas (valor, rótulo, descrição, emoji)"""
+    return [
+        (
+            key,
+            config["nome"],
+            (f"Em uso por: {config['usuario']}" + (f" · fila: {len(config['fila'])}" if config.get("fila") else ""))
+            if config["status"] == "em uso" else "Disponível",
+            "🔴" if config["status"] == "em uso" else "🟢"
+        )
+        for key, config in servicos.items()
+    ]
+
+
+def first_page(servicos: Dict[str, Any]) -> Dict[str, Any]:
+    """Retorna apenas os serviços que cabem na primeira página do dropdown"""
+    return dict(itertools.islice(servicos.items(), SERVICOS_POR_PAGINA))
+
+
 class ServiceDropdown(discord.ui.View):
+    """Dropdown com a primeira página de serviços e um botão para o seletor completo"""
+
     def __init__(self, user_roles: Optional[List[int]], servicos_config: Dict[str, Any], check_permissions: bool = True):
         super().__init__(timeout=None)
+        self.servicos_config = servicos_config
         self.add_item(ServiceSelect(user_roles, servicos_config, check_permissions))
+        button = discord.ui.Button(
+            label="Buscar serviços", emoji="🔎", style=discord.ButtonStyle.secondary, custom_id="gfpicker_abrir"
+        )
+        button.callback = self.abrir_seletor
+        self.add_item(button)
+
+    async def abrir_seletor(self, interaction: discord.Interaction):
+        """Abre, só para quem clicou, o seletor paginado com filtros e busca"""
+        user_roles = [role.id for role in getattr(interaction.user, "roles", [])]
+        picker = ServicePicker(user_roles, interaction.user, self.servicos_config)
+        await interaction.response.send_message(picker.header(), view=picker, ephemeral=True)
 
 
 class ServiceSelect(discord.ui.Select):
-    def __init__(self, user_roles: Optional[List[int]], servicos_config: Dict[str, Any], check_permissions: bool = True):
+    def __init__(self, user_roles: Optional[List[int]], servicos_config: Dict[str, Any], check_permissions: bool = True,
+                 servico_ids: Optional[List[str]] = None, row: Optional[int] = None):
         self.servicos_config = servicos_config
         
-        if check_permissions and user_roles:
-            servicos_permitidos = {}
-            for key, config in servicos_config.items():
-                # Converter grupos_permitidos para inteiros
-                grupos_permitidos = []
-                for grupo in config["grupos_permitidos"]:
-                    try:
-                        grupos_permitidos.append(int(grupo))
-                    except (ValueError, TypeError):
-                        logging.error(f"ID de grupo inválido em {key}: {grupo}")
-                
-                # Verificar se o usuário tem algum dos cargos permitidos
-                for role in user_roles:
-                    if role in grupos_permitidos:
-                        servicos_permitidos[key] = config
-                        logging.info(f"Usuário tem permissão para o serviço {key} pelo cargo {role}")
-                        break
-                    else:
-                        logging.debug(f"Cargo {role} não tem permissão para {key}. Grupos permitidos: {grupos_permitidos}")
+        if servico_ids is not None:
+            # Página já calculada pelo seletor paginado
+            servicos_pagina = {key: servicos_config[key] for key in servico_ids if key in servicos_config}
+        elif check_permissions and user_roles:
+            # Índice cargo -> serviços do registro: custo proporcional aos cargos do usuário
+            servicos_pagina = first_page(get_service_registry().permitted_services(user_roles))
         else:
-            servicos_permitidos = servicos_config
+            servicos_pagina = first_page(servicos_config)
         
         options = [
-            discord.SelectOption(
-                label=config["nome"],
-                value=key,
-                description=(f"Em uso por: {config['usuario']}" if config["status"] == "em uso" else "Disponível"),
-                emoji="🔴" if config["status"] == "em uso" else "🟢"
-            )
-            for key, config in servicos_permitidos.items()
+            discord.SelectOption(label=label, value=value, description=description, emoji=emoji)
+            for value, label, description, emoji in render_service_options(servicos_pagina)
         ]
         
         if not options:
@@ -99,6 +128,7 @@ class ServiceSelect(discord.ui.Select):
             min_values=1,
             max_values=1,
             options=options,
+            row=row,
         )
     
     async def callback(self, interaction: discord.Interaction):
@@ -110,12 +140,11 @@ class ServiceSelect(discord.ui.Select):
         servico_selecionado = self.values[0]
         config = self.servicos_config[servico_selecionado]
         
-        # Verifica permissões - Corrigido para usar inteiros diretamente
-        grupos_permitidos = [int(x) for x in config["grupos_permitidos"]]
-        tem_permissao = any(role in grupos_permitidos for role in user_roles)
+        # Verifica permissões pelo índice de cargos do registro
+        tem_permissao = get_service_registry().has_permission(servico_selecionado, user_roles)
         
         if not tem_permissao:
-            logging.warning(f"Usuário {interaction.user.name} (cargos: {user_roles}) tentou acessar {servico_selecionado} sem permissão. Grupos permitidos: {grupos_permitidos}")
+            logging.warning(f"Usuário {interaction.user.name} (cargos: {user_roles}) tentou acessar {servico_selecionado} sem permissão. Grupos permitidos: {config.get('grupos_permitidos', [])}")
             await interaction.response.send_message(
                 "Você não tem permissão para acessar este serviço.",
                 ephemeral=True
@@ -149,6 +178,142 @@ class ServiceSelect(discord.ui.Select):
         )
 
 
+class ServiceSearchModal(discord.ui.Modal, title="Buscar Serviço"):
+    def __init__(self, picker: "ServicePicker"):
+        super().__init__()
+        self.picker = picker
+        
+        self.busca = discord.ui.TextInput(
+            label="Nome do serviço",
+            placeholder="Digite o início do nome (ex: homolog)",
+            default=picker.busca or None,
+            required=False,
+            max_length=100
+        )
+        self.add_item(self.busca)
+    
+    async def on_submit(self, interaction: discord.Interaction):
+        self.picker.busca = self.busca.value.strip()
+        self.picker.pagina = 0
+        await self.picker.atualizar(interaction, refiltrar=True)
+
+
+class ServicePicker(discord.ui.View):
+    """Seletor paginado de serviços com filtros e busca por prefixo do nome.
+
+    A lista filtrada é calculada apenas quando o filtro ou a busca mudam (a busca
+    usa o índice de prefixos do registro); trocar de página só monta as opções
+    da página atual.
+    """
+
+    def __init__(self, user_roles: List[int], user, servicos_config: Dict[str, Any]):
+        super().__init__(timeout=300)
+        self.user_roles = user_roles
+        self.user_id = user.id
+        self.user_name = user.name
+        self.servicos_config = servicos_config
+        self.registry = get_service_registry()
+        self.filtro = "todos"
+        self.busca = ""
+        self.pagina = 0
+        self.servico_ids: List[str] = []
+        # Identifica os botões deste seletor: cada usuário tem o seu, com estado próprio,
+        # e custom_ids repetidos fariam um seletor receber os cliques de outro
+        self.nonce = uuid.uuid4().hex[:12]
+        self._filtrar()
+        self._montar()
+
+    @property
+    def total_paginas(self) -> int:
+        return max(1, -(-len(self.servico_ids) // SERVICOS_POR_PAGINA))
+
+    def _pertence_ao_usuario(self, config: Dict[str, Any]) -> bool:
+        """Verifica se o serviço está em uso pelo usuário do seletor"""
+        if config.get("status") != "em uso":
+            return False
+        user_id = config.get("usage_data", {}).get("user_id")
+        if user_id:
+            return str(user_id) == str(self.user_id)
+        return config.get("usuario") == self.user_name
+
+    def _filtrar(self):
+        """Recalcula a lista de serviços conforme permissões, busca e filtro"""
+        servicos = self.registry.permitted_services(self.user_roles)
+        if self.busca:
+            encontrados = self.registry.search_services(self.busca)
+            servicos = {key: config for key, config in servicos.items() if key in encontrados}
+        if self.filtro == "disponiveis":
+            servicos = {key: config for key, config in servicos.items() if config.get("status") != "em uso"}
+        elif self.filtro == "em_uso":
+            servicos = {key: config for key, config in servicos.items() if config.get("status") == "em uso"}
+        elif self.filtro == "meus":
+            servicos = {key: config for key, config in servicos.items() if self._pertence_ao_usuario(config)}
+        self.servico_ids = list(servicos.keys())
+        self.pagina = min(self.pagina, self.total_paginas - 1)
+
+    def _criar_botao(self, label: str, acao: str, row: int, emoji: Optional[str] = None,
+                     style: discord.ButtonStyle = discord.ButtonStyle.secondary, disabled: bool = False):
+        custom_id = f"gfpicker_{self.nonce}_{acao}"
+        button = discord.ui.Button(label=label, emoji=emoji, style=style, custom_id=custom_id, row=row, disabled=disabled)
+        button.callback = self.handle_callback
+        return button
+
+    def _montar(self):
+        """Monta os componentes da página atual"""
+        self.clear_items()
+        inicio = self.pagina * SERVICOS_POR_PAGINA
+        pagina_ids = self.servico_ids[inicio:inicio + SERVICOS_POR_PAGINA]
+        self.add_item(ServiceSelect(None, self.servicos_config, servico_ids=pagina_ids, row=0))
+        
+        self.add_item(self._criar_botao("Anterior", "anterior", 1, emoji="◀️", disabled=self.pagina == 0))
+        self.add_item(self._criar_botao(f"{self.pagina + 1}/{self.total_paginas}", "pagina", 1, disabled=True))
+        self.add_item(self._criar_botao("Próxima", "proxima", 1, emoji="▶️",
+                                        disabled=self.pagina >= self.total_paginas - 1))
+        self.add_item(self._criar_botao("Buscar", "buscar", 1, emoji="🔎", style=discord.ButtonStyle.primary))
+        if self.busca:
+            self.add_item(self._criar_botao("Limpar busca", "limpar", 1, emoji="✖️"))
+        
+        for filtro, label in FILTROS_SERVICOS.items():
+            style = discord.ButtonStyle.success if filtro == self.filtro else discord.ButtonStyle.secondary
+            self.add_item(self._criar_botao(label, f"filtro_{filtro}", 2, style=style))
+
+    def header(self) -> str:
+        """Texto da mensagem do seletor"""
+        busca = f' contendo "{self.busca}"' if self.busca else ""
+        return (
+            f"**Serviços Glassfish** ({FILTROS_SERVICOS[self.filtro]}{busca}): "
+            f"{len(self.servico_ids)} serviço(s), página {self.pagina + 1}/{self.total_paginas}"
+        )
+
+    async def atualizar(self, interaction: discord.Interaction, refiltrar: bool = False):
+        """Recalcula (se necessário) e reapresenta o seletor na mesma mensagem"""
+        if refiltrar:
+            self._filtrar()
+        self._montar()
+        await interaction.response.edit_message(content=self.header(), view=self)
+
+    async def handle_callback(self, interaction: discord.Interaction):
+        # custom_id: gfpicker_{nonce}_{ação}
+        action = interaction.data["custom_id"].split("_", 2)[2]
+        
+        if action == "anterior":
+            self.pagina = max(0, self.pagina - 1)
+            await self.atualizar(interaction)
+        elif action == "proxima":
+            self.pagina = min(self.total_paginas - 1, self.pagina + 1)
+            await self.atualizar(interaction)
+        elif action == "buscar":
+            await interaction.response.send_modal(ServiceSearchModal(self))
+        elif action == "limpar":
+            self.busca = ""
+            self.pagina = 0
+            await self.atualizar(interaction, refiltrar=True)
+        elif action.startswith("filtro_"):
+            self.filtro = action[len("filtro_"):]
+            self.pagina = 0
+            await self.atualizar(interaction, refiltrar=True)
+
+
 class ActionButtons(discord.ui.View):
     def __init__(self, servico: str, servicos_config: Dict[str, Any]):
         super().__init__(timeout=None)
@@ -185,28 +350,25 @@ class ActionButtons(discord.ui.View):
     async def usar(self, interaction: discord.Interaction):
         from .glassfish_config import TEMPO_MAXIMO_USO, LEMBRETE_INTERVALO
         
-        config = self.servicos_config[self.servico]
-        if config["status"] == "em uso":
+        # Compare-and-set sobre o estado em memória: entre cliques simultâneos só um vence
+        registry = get_service_registry()
+        sucesso, motivo = registry.claim(self.servico, interaction.user.name, interaction.user.id)
+        config = registry.get(self.servico)
+        if not sucesso:
+            if motivo == "nao_encontrado":
+                await interaction.response.send_message("Este serviço não existe mais.", ephemeral=True)
+                return False
+            fila = len(config.get("fila") or [])
             await interaction.response.send_message(
-                f"O serviço **{config['nome']}** já está em uso por {config['usuario']}.",
+                f"O serviço **{config['nome']}** já está em uso por {config['usuario']}." +
+                (f" Há {fila} pessoa(s) na fila." if fila else "") +
+                "\nEntre na fila para recebê-lo assim que for liberado.",
+                view=WaitlistView(self.servico),
                 ephemeral=True,
             )
             logging.info(f"{interaction.user.name} tentou usar {config['nome']}, mas já está em uso")
             return False
-            
-        config["status"] = "em uso"
-        config["usuario"] = interaction.user.name
-        
-        # Adiciona dados de uso
-        usage_data = UsageData(interaction.user.name, interaction.user.id)
-        config["usage_data"] = usage_data.to_dict()
-        
-        # Limpa a flag de notificação de timeout para permitir novas notificações
-        if "notificacao_timeout" in config:
-            del config["notificacao_timeout"]
-            logging.info(f"Flag de notificação de timeout removida para {config['nome']}")
         
-        self.salvar_em_json()
         channel = interaction.guild.get_channel(LOGS_CHANNEL_ID)
         if channel:
             await channel.send(
@@ -225,41 +387,39 @@ class ActionButtons(discord.ui.View):
         return True
 
     async def liberar(self, interaction: discord.Interaction):
-        config = self.servicos_config[self.servico]
-        if config["status"] == "disponível":
-            await interaction.response.send_message(
-                f"O serviço **{config['nome']}** já está disponível.",
-                ephemeral=True,
-            )
-            logging.info(f"{interaction.user.name} tentou liberar {config['nome']}, mas já está disponível")
+        registry = get_service_registry()
+        config = registry.get(self.servico)
+        if config is None:
+            await interaction.response.send_message("Este serviço não existe mais.", ephemeral=True)
             return False
-        elif config["usuario"] != interaction.user.name:
-            # Verificação para TI ou administradores
-            is_admin = any(role.id == CARGO_TI_ID for role in interaction.user.roles)
-            
-            if not is_admin:
+        
+        # TI ou administradores podem liberar o serviço de outro usuário
+        is_admin = any(role.id == CARGO_TI_ID for role in interaction.user.roles)
+        usuario_anterior = config["usuario"]
+        
+        # Compare-and-set: só libera se o serviço ainda estiver com quem clicou (ou for TI)
+        sucesso, motivo = registry.release(
+            self.servico, interaction.user.id, interaction.user.name, force=is_admin
+        )
+        if not sucesso:
+            if motivo == "disponivel":
+                await interaction.response.send_message(
+                    f"O serviço **{config['nome']}** já está disponível.",
+                    ephemeral=True,
+                )
+                logging.info(f"{interaction.user.name} tentou liberar {config['nome']}, mas já está disponível")
+            else:
                 await interaction.response.send_message(
                     f"Apenas {config['usuario']} pode liberar este serviço. Se precisar de ajuda, contate o setor de TI.",
                     ephemeral=True,
                 )
                 logging.warning(f"{interaction.user.name} tentou liberar {config['nome']}, mas não tem permissão")
-                return False
-            else:
-                # Administrador liberando o serviço de outro usuário
-                logging.info(f"Admin {interaction.user.name} está liberando o serviço {config['nome']} que estava sendo usado por {config['usuario']}")
+            return False
+        
+        if usuario_anterior != interaction.user.name:
+            # Administrador liberando o serviço de outro usuário
+            logging.info(f"Admin {interaction.user.name} liberou o serviço {config['nome']} que estava sendo usado por {usuario_anterior}")
         
-        # Remove dados de uso
-        if "usage_data" in config:
-            del config["usage_data"]
-            
-        # Limpa a flag de notificação de timeout
-        if "notificacao_timeout" in config:
-            del config["notificacao_timeout"]
-            logging.info(f"Flag de notificação de timeout removida para {config['nome']}")
-            
-        config["status"] = "disponível"
-        config["usuario"] = None
-        self.salvar_em_json()
         channel = interaction.guild.get_channel(LOGS_CHANNEL_ID)
         if channel:
             await channel.send(
@@ -276,38 +436,23 @@ class ActionButtons(discord.ui.View):
         modal = ProblemReportModal(self.servico, self.servicos_config)
         await interaction.response.send_modal(modal)
 
-    def salvar_em_json(self):
-        try:
-            with open("services.json", "w", encoding="utf-8") as file:
-                json.dump(self.servicos_config, file, indent=4)
-            logging.info("Configurações salvas com sucesso em services.json")
-        except Exception as e:
-            logging.error(f"Erro ao salvar em services.json: {str(e)}")
-
 
 # Botão e modal para verificar o uso
 class ConfirmUseButton(discord.ui.Button):
-    def __init__(self, servico: str, servicos_config: Dict[str, Any]):
+    """Confirma o uso a partir do lembrete; guarda só o ID e a geração do uso e lê o estado atual no clique"""
+
+    def __init__(self, servico: str, geracao: Optional[int] = None):
         super().__init__(
             label="Continuar usando o serviço",
             style=discord.ButtonStyle.primary,
             emoji="✅"
         )
         self.servico = servico
-        self.servicos_config = servicos_config
+        self.geracao = geracao
         
     async def callback(self, interaction: discord.Interaction):
         from .glassfish_config import TEMPO_MAXIMO_USO
         
-        config = self.servicos_config[self.servico]
-        
-        if config["status"] != "em uso" or config["usuario"] != interaction.user.name:
-            await interaction.response.send_message(
-                "Este serviço não está mais associado ao seu usuário.",
-                ephemeral=True
-            )
-            return
-        
         # Obtém o objeto de cog para acessar as configurações
         cog = interaction.client.get_cog("GlassfishCog")
         max_extensoes = MAX_EXTENSOES  # Valor padrão de segurança
@@ -317,84 +462,48 @@ class ConfirmUseButton(discord.ui.Button):
             max_extensoes = cog.service.max_extensoes
             tempo_maximo = cog.service.tempo_maximo_uso
         
-        # Atualiza os dados de uso
-        if "usage_data" in config:
-            try:
-                usage_data = UsageData.from_dict(config["usage_data"])
-                
-                # Verifica se já passou do tempo máximo desde a última verificação
-                ultima_verificacao = usage_data.last_check
-                agora = datetime.datetime.now()
-                
-                # Se não houver verificação anterior, ou se a última verificação for muito antiga,
-                # conta como uma extensão (exceto na primeira verificação)
-                if ultima_verificacao:
-                    horas_desde_verificacao = (agora - ultima_verificacao).total_seconds() / 3600
-                    
-                    # Se já passou do prazo, conta como uma extensão
-                    if horas_desde_verificacao > tempo_maximo:
-                        current_count = usage_data.increment_extension()
-                        
-                        # Verifica se excedeu o limite de extensões
-                        if current_count > max_extensoes:
-                            await interaction.response.send_message(
-                                f"❌ Você já utilizou {current_count-1}/{max_extensoes} extensões permitidas e não pode mais estender o tempo de uso.\n" +
-                                f"O serviço será liberado automaticamente em breve.\n" +
-                                f"Por favor, libere o serviço manualmente ou solicite uma exceção ao setor de TI.",
-                                ephemeral=True
-                            )
-                            return
-                        else:
-                            # Informa quantas extensões já foram usadas
-                            await interaction.response.send_message(
-                                f"✅ Tempo de uso estendido! Você utilizou {current_count}/{max_extensoes} extensões permitidas.\n" +
-                                f"O prazo para uso do serviço **{config['nome']}** foi renovado. Obrigado!",
-                                ephemeral=True
-                            )
-                    else:
-                        # Confirmação normal, sem contar como extensão
-                        await interaction.response.send_message(
-                            f"✅ Você confirmou que ainda está usando o serviço **{config['nome']}**. Obrigado!",
-                            ephemeral=True
-                        )
-                else:
-                    # Primeira verificação, não conta como extensão
-                    await interaction.response.send_message(
-                        f"✅ Você confirmou que ainda está usando o serviço **{config['nome']}**. Obrigado!",
-                        ephemeral=True
-                    )
-                
-                # Atualiza o timestamp de verificação em todos os casos
-                usage_data.update_check()
-                config["usage_data"] = usage_data.to_dict()
-                
-            except Exception as e:
-                logging.error(f"Erro ao atualizar dados de uso: {str(e)}")
-                # Cria novo objeto de uso se houver erro
-                usage_data = UsageData(interaction.user.name, interaction.user.id)
-                usage_data.update_check()
-                config["usage_data"] = usage_data.to_dict()
-                
-                await interaction.response.send_message(
-                    f"✅ Você confirmou que ainda está usando o serviço **{config['nome']}**. Obrigado!",
-                    ephemeral=True
-                )
+        # Confirma sobre o estado atual do registro; um lembrete de um uso já encerrado é recusado
+        registry = get_service_registry()
+        sucesso, motivo, extension_count = registry.confirm_use(
+            self.servico, interaction.user.id, interaction.user.name,
+            expected_generation=self.geracao, tempo_maximo=tempo_maximo, max_extensoes=max_extensoes
+        )
+        config = registry.get(self.servico)
+        
+        if motivo in ("nao_encontrado", "outro_usuario", "geracao"):
+            await interaction.response.send_message(
+                "Este serviço não está mais associado ao seu usuário.",
+                ephemeral=True
+            )
+            return
+        
+        if motivo == "limite":
+            await interaction.response.send_message(
+                f"❌ Você já utilizou {extension_count}/{max_extensoes} extensões permitidas e não pode mais estender o tempo de uso.\n" +
+                f"O serviço será liberado automaticamente em breve.\n" +
+                f"Por favor, libere o serviço manualmente ou solicite uma exceção ao setor de TI.",
+                ephemeral=True
+            )
+            return
+        
+        if motivo == "extensao":
+            # Informa quantas extensões já foram usadas
+            await interaction.response.send_message(
+                f"✅ Tempo de uso estendido! Você utilizou {extension_count}/{max_extensoes} extensões permitidas.\n" +
+                f"O prazo para uso do serviço **{config['nome']}** foi renovado. Obrigado!",
+                ephemeral=True
+            )
         else:
-            # Cria novo objeto de uso se não existir
-            usage_data = UsageData(interaction.user.name, interaction.user.id)
-            usage_data.update_check()
-            config["usage_data"] = usage_data.to_dict()
-            
             await interaction.response.send_message(
                 f"✅ Você confirmou que ainda está usando o serviço **{config['nome']}**. Obrigado!",
                 ephemeral=True
             )
+        logging.info(f"Uso confirmado para o serviço {self.servico} por {interaction.user.name}")
         
         # Notifica no canal de logs sobre a confirmação
         try:
             channel = interaction.guild.get_channel(LOGS_CHANNEL_ID)
-            if channel and "usage_data" in config:
-                extension_count = config["usage_data"].get("extension_count", 0)
+            if channel:
                 if extension_count > 0:
                     await channel.send(
                         f"🔄 **Extensão de Uso**: <@{interaction.user.id}> confirmou o uso do serviço **{config['nome']}** " +
@@ -406,62 +515,45 @@ class ConfirmUseButton(discord.ui.Button):
                     )
         except Exception as e:
             logging.error(f"Erro ao enviar mensagem para o canal de logs: {str(e)}")
-        
-        # Salva as alterações
-        try:
-            with open("services.json", "w", encoding="utf-8") as file:
-                json.dump(self.servicos_config, file, indent=4)
-            logging.info(f"Uso confirmado para o serviço {self.servico} por {interaction.user.name}")
-        except Exception as e:
-            logging.error(f"Erro ao salvar serviços: {str(e)}")
 
 
 class LiberarButton(discord.ui.Button):
-    def __init__(self, servico: str, servicos_config: Dict[str, Any]):
+    """Libera o serviço a partir do lembrete; guarda só o ID e a geração do uso"""
+
+    def __init__(self, servico: str, geracao: Optional[int] = None):
         super().__init__(
             label="Liberar o serviço",
             style=discord.ButtonStyle.danger,
             emoji="🔄"
         )
         self.servico = servico
-        self.servicos_config = servicos_config
+        self.geracao = geracao
         
     async def callback(self, interaction: discord.Interaction):
-        config = self.servicos_config[self.servico]
-        
-        if config["status"] != "em uso":
-            await interaction.response.send_message(
-                "Este serviço já está disponível.",
-                ephemeral=True
-            )
+        registry = get_service_registry()
+        config = registry.get(self.servico)
+        if config is None:
+            await interaction.response.send_message("Este serviço não existe mais.", ephemeral=True)
             return
-            
-        if config["usuario"] != interaction.user.name:
-            await interaction.response.send_message(
-                f"Apenas {config['usuario']} pode liberar este serviço.",
-                ephemeral=True
-            )
+        
+        # Compare-and-set: só libera se o serviço ainda estiver com quem clicou, no mesmo uso do lembrete
+        sucesso, motivo = registry.release(
+            self.servico, interaction.user.id, interaction.user.name, expected_generation=self.geracao
+        )
+        if not sucesso:
+            if motivo in ("disponivel", "geracao"):
+                await interaction.response.send_message(
+                    "Este serviço já está disponível.",
+                    ephemeral=True
+                )
+            else:
+                await interaction.response.send_message(
+                    f"Apenas {config['usuario']} pode liberar este serviço.",
+                    ephemeral=True
+                )
             return
         
-        # Remove dados de uso
-        if "usage_data" in config:
-            del config["usage_data"]
-            
-        # Limpa a flag de notificação de timeout
-        if "notificacao_timeout" in config:
-            del config["notificacao_timeout"]
-            logging.info(f"Flag de notificação de timeout removida para {config['nome']} durante reset")
-            
-        config["status"] = "disponível"
-        config["usuario"] = None
-        
-        # Salva as alterações
-        try:
-            with open("services.json", "w", encoding="utf-8") as file:
-                json.dump(self.servicos_config, file, indent=4)
-            logging.info(f"Serviço {self.servico} liberado por {interaction.user.name}")
-        except Exception as e:
-            logging.error(f"Erro ao salvar serviços: {str(e)}")
+        logging.info(f"Serviço {self.servico} liberado por {interaction.user.name}")
         
         # Notifica no canal de logs
         try:
@@ -480,7 +572,113 @@ class LiberarButton(discord.ui.Button):
 
 
 class CheckView(discord.ui.View):
-    def __init__(self, servico: str, servicos_config: Dict[str, Any]):
+    """Botões do lembrete de uso.
+
+    O lembrete pode ser clicado horas depois de enviado, então a view não guarda
+    o dicionário de serviços: só o ID e a geração do uso, e o estado é lido do
+    registro no momento do clique.
+    """
+
+    def __init__(self, servico: str, geracao: Optional[int] = None):
+        super().__init__(timeout=None)
+        self.add_item(ConfirmUseButton(servico, geracao))
+        self.add_item(LiberarButton(servico, geracao))
+
+
+class WaitlistView(discord.ui.View):
+    """Botões para entrar ou sair da fila de espera de um serviço em uso"""
+
+    def __init__(self, servico: str):
+        super().__init__(timeout=300)
+        self.servico = servico
+        self.add_item(self.create_button("Entrar na fila", "⏳", discord.ButtonStyle.primary, f"fila_entrar_{servico}"))
+        self.add_item(self.create_button("Sair da fila", "🚪", discord.ButtonStyle.secondary, f"fila_sair_{servico}"))
+
+    def create_button(self, label: str, emoji: str, style: discord.ButtonStyle, custom_id: str):
+        button = discord.ui.Button(label=label, emoji=emoji, style=style, custom_id=custom_id)
+        button.callback = self.handle_callback
+        return button
+
+    async def handle_callback(self, interaction: discord.Interaction):
+        action_type = interaction.data["custom_id"].split("_")[1]
+        registry = get_service_registry()
+        config = registry.get(self.servico)
+        if config is None:
+            await interaction.response.send_message("Este serviço não existe mais.", ephemeral=True)
+            return
+        
+        if action_type == "sair":
+            if registry.leave_waitlist(self.servico, interaction.user.id):
+                await interaction.response.send_message(
+                    f"Você saiu da fila do serviço **{config['nome']}**.", ephemeral=True
+                )
+                logging.info(f"{interaction.user.name} saiu da fila do serviço {config['nome']}")
+            else:
+                await interaction.response.send_message("Você não está na fila deste serviço.", ephemeral=True)
+            return
+        
+        sucesso, motivo, posicao = registry.join_waitlist(self.servico, interaction.user.id, interaction.user.name)
+        if sucesso:
+            await interaction.response.send_message(
+                f"⏳ Você entrou na fila do serviço **{config['nome']}** (posição {posicao}). "
+                f"Você receberá uma DM quando for a sua vez.",
+                ephemeral=True
+            )
+            logging.info(f"{interaction.user.name} entrou na fila do serviço {config['nome']} (posição {posicao})")
+        elif motivo == "ja_na_fila":
+            await interaction.response.send_message(
+                f"Você já está na fila do serviço **{config['nome']}** (posição {posicao}).", ephemeral=True
+            )
+        elif motivo == "eh_o_usuario":
+            await interaction.response.send_message(
+                f"Você já está usando o serviço **{config['nome']}**.", ephemeral=True
+            )
+        else:
+            await interaction.response.send_message(
+                f"O serviço **{config['nome']}** está disponível. Selecione-o novamente e clique em Usar.",
+                ephemeral=True
+            )
+
+
+class AssumirButton(discord.ui.Button):
+    """Assume o serviço repassado pela fila; guarda só o ID e a geração do uso"""
+
+    def __init__(self, servico: str, geracao: Optional[int] = None):
+        super().__init__(
+            label="Assumir o serviço",
+            style=discord.ButtonStyle.success,
+            emoji="✅"
+        )
+        self.servico = servico
+        self.geracao = geracao
+
+    async def callback(self, interaction: discord.Interaction):
+        registry = get_service_registry()
+        sucesso, motivo = registry.accept_handoff(
+            self.servico, interaction.user.id, interaction.user.name, expected_generation=self.geracao
+        )
+        config = registry.get(self.servico)
+        if sucesso:
+            await interaction.response.send_message(
+                f"✅ Você assumiu o serviço **{config['nome']}**. Por favor, libere-o quando terminar.",
+                ephemeral=True
+            )
+            logging.info(f"{interaction.user.name} assumiu o serviço {self.servico} pela fila")
+        elif motivo == "ja_assumido":
+            await interaction.response.send_message(
+                f"Você já assumiu o serviço **{config['nome']}**.", ephemeral=True
+            )
+        else:
+            await interaction.response.send_message(
+                "O prazo para assumir este serviço terminou e ele foi repassado ou liberado.",
+                ephemeral=True
+            )
+
+
+class HandoffView(discord.ui.View):
+    """Botões do aviso de vez na fila: assumir o serviço ou liberá-lo para o próximo"""
+
+    def __init__(self, servico: str, geracao: Optional[int] = None):
         super().__init__(timeout=None)
-        self.add_item(ConfirmUseButton(servico, servicos_config))
-        self.add_item(LiberarButton(servico, servicos_config)) 
\ No newline at end of file
+        self.add_item(AssumirButton(servico, geracao))
+        self.add_item(LiberarButton(servico, geracao))
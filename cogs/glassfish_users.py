@@ -0,0 +1,108 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Quantos usuários/canais de DM manter em cache e por quanto tempo (segundos)
+USER_CACHE_SIZE = 512
+USER_CACHE_TTL = 3600
+
+
+class TTLCache:
+    """Cache LRU com expiração por tempo"""
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def get(self, key):
+        """Retorna o valor em cache ou None se não existir ou tiver expirado"""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        """Armazena um valor, descartando o menos usado se o cache estiver cheio"""
+        self._items[key] = (value, time.monotonic() + self.ttl)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key):
+        self._items.pop(key, None)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class UserResolver:
+    """Resolve usuários e canais de DM evitando chamadas REST.
+
+    A ordem de busca é: cache do gateway (bot.get_user), cache LRU local com
+    expiração e, só então, fetch_user via HTTP. Os canais de DM também ficam em
+    cache, evitando o create_dm a cada mensagem enviada.
+    """
+
+    def __init__(self, bot, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.bot = bot
+        self._users = TTLCache(max_size, ttl)
+        self._dm_channels = TTLCache(max_size, ttl)
+        self.stats: Dict[str, int] = {"gateway": 0, "cache": 0, "http": 0}
+
+    async def get_user(self, user_id: int):
+        """Obtém o usuário pelo ID (cache do gateway, cache local e por último HTTP)"""
+        user_id = int(user_id)
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            self.stats["gateway"] += 1
+            return user
+
+        user = self._users.get(user_id)
+        if user is not None:
+            self.stats["cache"] += 1
+            return user
+
+        user = await self.bot.fetch_user(user_id)
+        self.stats["http"] += 1
+        self._users.set(user_id, user)
+        return user
+
+    async def get_dm_channel(self, user_id: int):
+        """Obtém o canal de DM do usuário, criando-o apenas se não estiver em cache"""
+        user_id = int(user_id)
+        channel = self._dm_channels.get(user_id)
+        if channel is not None:
+            return channel
+
+        user = await self.get_user(user_id)
+        channel = user.dm_channel
+        if channel is None:
+            channel = await user.create_dm()
+        self._dm_channels.set(user_id, channel)
+        return channel
+
+    def invalidate(self, user_id: int):
+        """Remove o usuário e seu canal de DM do cache (ex: após erro de envio)"""
+        user_id = int(user_id)
+        self._users.pop(user_id)
+        self._dm_channels.pop(user_id)
+
+
+# Singleton para acesso global ao resolvedor de usuários
+_resolver_instance = None
+
+
+def get_user_resolver(bot) -> UserResolver:
+    """Obtém a instância global do resolvedor de usuários"""
+    global _resolver_instance
+    if _resolver_instance is None or _resolver_instance.bot is not bot:
+        _resolver_instance = UserResolver(bot)
+        logging.info("Resolvedor de usuários inicializado")
+    return _resolver_instance
@@ -59,7 +59,10 @@ class HelpCog(commands.Cog):
                               "• `/verificacao_forcada_glassfish` - Força verificação de timeout (apenas TI)\n"
                               "• `/configurar_timeout_glassfish` - Configura tempo máximo de uso (apenas TI)\n"
                               "• `/obter_timeout_glassfish` - Exibe configurações atuais de timeout\n"
-                              "• `/liberar_todos_glassfish` - Libera todos os serviços em uso (apenas TI)",
+                              "• `/liberar_todos_glassfish` - Libera todos os serviços em uso (apenas TI)\n"
+                              "• `/reservar_glassfish` - Reserva um serviço para um horário futuro\n"
+                              "• `/reservas_glassfish` - Lista as reservas agendadas\n"
+                              "• `/cancelar_reserva_glassfish` - Cancela uma reserva",
                         inline=False
                     )
 
@@ -20,7 +20,8 @@ try:
         DeleteButton,
         CustomView,
         ConfirmarAgendamentoButton,
-        PularButton
+        PularButton,
+        view_id_from_custom_id
     )
     CLASSES_IMPORTADAS = True
     logging.info("Classes de schedule_update.py carregadas com sucesso")
@@ -53,6 +54,15 @@ async def handle_button_interactions(interaction: discord.Interaction, bot):
         # FASE 2: Recuperação de dados da persistência
         persistence = get_instance_persistence(bot)
         message_data = await persistence.get_message_data(message_id)
+        if message_data is None:
+            # Mensagens finalizadas ou antigas saem do conjunto ativo, mas continuam no arquivo morto
+            message_data = await persistence.get_archived_message(message_id)
+        
+        # Reutiliza o view_id do botão clicado para que a view recriada mantenha os
+        # mesmos custom_ids, e o registra para a restauração sob demanda
+        view_id = view_id_from_custom_id(button_id)
+        if message_data and view_id:
+            persistence.set_view_id(message_id, view_id)
         
         # Identifica o tipo de visualização com base no conteúdo da mensagem
         view_type = None
@@ -228,7 +238,8 @@ async def handle_button_interactions(interaction: discord.Interaction, bot):
                     view = CustomView(
                         modal_type=view_type, 
                         original_data=original_data, 
-                        author_id=int(author_id) if author_id else interaction.user.id
+                        author_id=int(author_id) if author_id else interaction.user.id,
+                        view_id=view_id
                     )
                     
                     # Processa as linhas de conteúdo
@@ -322,7 +333,8 @@ async def handle_button_interactions(interaction: discord.Interaction, bot):
                 modal.view = CustomView(
                     modal_type=view_type, 
                     original_data=original_data, 
-                    author_id=int(author_id) if author_id else interaction.user.id
+                    author_id=int(author_id) if author_id else interaction.user.id,
+                    view_id=view_id
                 )
                 await interaction.response.send_modal(modal)
                 
@@ -369,7 +381,8 @@ async def handle_button_interactions(interaction: discord.Interaction, bot):
                     view = CustomView(
                         modal_type=view_type, 
                         original_data=original_data, 
-                        author_id=int(author_id) if author_id else interaction.user.id
+                        author_id=int(author_id) if author_id else interaction.user.id,
+                        view_id=view_id
                     )
                     
                     # Processa as linhas de conteúdo
@@ -425,6 +438,7 @@ async def handle_button_interactions(interaction: discord.Interaction, bot):
                     
                     # Atualiza a mensagem
                     await interaction.message.edit(content='\n'.join(new_lines), view=view)
+                    persistence.mark_status(message_id, "finalizado")
                     await interaction.response.send_message("Agendamento finalizado com sucesso!", ephemeral=True)
                 
                 except Exception as e:
@@ -452,7 +466,8 @@ async def handle_button_interactions(interaction: discord.Interaction, bot):
                     view = CustomView(
                         modal_type=view_type, 
                         original_data=original_data, 
-                        author_id=int(author_id) if author_id else interaction.user.id
+                        author_id=int(author_id) if author_id else interaction.user.id,
+                        view_id=view_id
                     )
                     
                     # Processa as linhas de conteúdo
@@ -484,6 +499,7 @@ async def handle_button_interactions(interaction: discord.Interaction, bot):
                     
                     # Atualiza a mensagem
                     await interaction.message.edit(content='\n'.join(new_lines), view=view)
+                    persistence.mark_status(message_id, "concluido")
                     await interaction.response.send_message("Atualização concluída com sucesso!", ephemeral=True)
                 
                 except Exception as e:
@@ -1,56 +1,170 @@
 import os
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import discord
 import re
+import time
+import asyncio
+import gzip
+from cogs.persistence_snapshots import SnapshotManager
+from cogs import persistence_codec as codec
+
+# Versão atual do esquema do arquivo de snapshot: {"schema_version": N, "messages": {...}}
+# (a versão 1 é o formato antigo, um dicionário simples de mensagens sem cabeçalho)
+SCHEMA_VERSION = 2
+# Quantidade de registros no journal que dispara uma compactação imediata
+JOURNAL_COMPACT_THRESHOLD = 500
+# Intervalo (em segundos) da compactação periódica em segundo plano
+JOURNAL_COMPACT_INTERVAL = 600
+# Tempo (em segundos) que um ID ausente fica no cache negativo
+NEGATIVE_CACHE_TTL = 300
+# Quantidade máxima de IDs ausentes mantidos no cache negativo
+NEGATIVE_CACHE_MAX_SIZE = 10000
+# Intervalo (em segundos) entre as gravações em segundo plano das alterações pendentes
+FLUSH_INTERVAL = 2
+# Quantidade de alterações pendentes que antecipa a gravação
+FLUSH_BATCH_SIZE = 50
+# Quantidade de canais restaurados em paralelo na inicialização
+RESTORE_WORKERS = 5
+# Tempo máximo (em segundos) da restauração de views na inicialização
+RESTORE_TIME_BUDGET = 30
+# A cada quantas mensagens processadas o progresso da restauração é registrado
+RESTORE_PROGRESS_EVERY = 25
+# Status que encerram o ciclo de vida de uma mensagem e a enviam para o arquivo
+ARCHIVE_STATUSES = ("finalizado", "concluido")
+# Idade (em dias) a partir da qual mensagens ainda abertas também são arquivadas
+ARCHIVE_MAX_AGE_DAYS = 90
+# Intervalo (em segundos) entre as execuções da política de arquivamento
+ARCHIVE_INTERVAL = 3600
+# Modo de restauração das views: "completa" (busca e edita cada mensagem) ou
+# "sob_demanda" (apenas registra as views em memória, sem chamadas HTTP)
+DEFAULT_RESTORE_MODE = "completa"
+# Backend usado quando config.json não define "persistencia.backend" ("json" ou "sqlite")
+DEFAULT_BACKEND = "json"
+
+def _migrate_v1(messages):
+    """v1 -> v2: garante os campos view_type e original_data em todas as entradas"""
+    for value in messages.values():
+        if "view_type" not in value and "type" in value:
+            value["view_type"] = value["type"]
+        if "original_data" not in value:
+            value["original_data"] = {}
+    return messages
+
+# Migrações de esquema: versão de origem -> função que converte para a versão seguinte
+SCHEMA_MIGRATIONS = {
+    1: _migrate_v1,
+}
+
+def decode_document(content):
+    """Lê um snapshot e retorna (mensagens, versão do esquema)"""
+    document = codec.loads(content)
+    if isinstance(document, dict) and "schema_version" in document:
+        return document.get("messages", {}), document["schema_version"]
+    return document, 1
+
+def migrate_schema(messages, version):
+    """Aplica em sequência as migrações até a versão atual do esquema"""
+    while version < SCHEMA_VERSION:
+        messages = SCHEMA_MIGRATIONS[version](messages)
+        version += 1
+    return messages
 
 class Persistence:
-    def __init__(self, bot=None):
+    def __init__(self, bot=None, flush_interval=FLUSH_INTERVAL, flush_batch_size=FLUSH_BATCH_SIZE,
+                 restore_workers=RESTORE_WORKERS, restore_time_budget=RESTORE_TIME_BUDGET,
+                 restore_mode=DEFAULT_RESTORE_MODE, archive_max_age_days=ARCHIVE_MAX_AGE_DAYS,
+                 compact_encoding=True):
         self.bot = bot
         self.data_file = "data/mensagens_data.json"
+        # Journal append-only: cada register/remove vira uma linha JSON,
+        # e o snapshot (data_file) só é reescrito na compactação
+        self.journal_file = "data/mensagens_data.journal"
+        # JSON minificado (orjson, se instalado) ou indentado para edição manual
+        self.compact_encoding = compact_encoding
+        # Arquivo morto: mensagens finalizadas ou antigas, em JSON Lines comprimido,
+        # fora do conjunto carregado e restaurado na inicialização
+        self.archive_file = "data/mensagens_arquivo.jsonl.gz"
+        self.archive_max_age_days = archive_max_age_days
+        self._archive_task = None
+        # IDs presentes no arquivo morto (carregados na primeira consulta), para que
+        # um miss não precise descomprimir o arquivo inteiro
+        self._archived_ids = None
         self.data = {}  # Formato simples, sem o objeto messages aninhado
         self.views = {}  # Para armazenar as views em memória
+        self._journal_records = 0
+        self._compaction_task = None
+        # Contador de gerações das escritas e assinatura (mtime/tamanho) dos arquivos
+        # após a última escrita própria, usados para detectar alterações externas
+        self._generation = 0
+        self._storage_signature = None
+        # IDs de mensagens não rastreadas -> instante (monotônico) de expiração
+        self._negative_cache = {}
+        # Write-behind: alterações já aplicadas em memória aguardando gravação
+        # (message_id -> entrada, ou None para remoção)
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._pending = {}
+        self._flush_task = None
+        self._flush_event = None
+        self._flush_lock = None
+        # Gravações próprias em andamento no executor (contador: podem se sobrepor)
+        self._flushing = 0
+        # Restauração concorrente das views na inicialização
+        self.restore_workers = restore_workers
+        self.restore_time_budget = restore_time_budget
+        self.restore_mode = restore_mode
+        self._restoring = False
+        # Snapshots comprimidos e deduplicados (substituem os antigos backups *.bak horários)
+        self.snapshots = SnapshotManager(os.path.join(os.path.dirname(self.data_file), "snapshots"))
         self._ensure_data_directory()
+        self._import_legacy_backups()
+        
+        started = time.monotonic()
         self._load_data()
+        # Contadores da carga inicial, feita uma única vez por processo (ver setup_persistence)
+        self.startup_stats = {
+            "backend": type(self).__name__,
+            "mensagens": len(self.data),
+            "registros_reaplicados": self._journal_records,
+            "tempo_carga_ms": round((time.monotonic() - started) * 1000, 1),
+            "carregado_em": datetime.utcnow().isoformat()
+        }
         
     def _ensure_data_directory(self):
         """Garante que o diretório de dados existe"""
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
         
+    def _import_legacy_backups(self):
+        """Converte os backups horários do formato antigo em snapshots"""
+        try:
+            self.snapshots.import_legacy_backups(self.data_file)
+        except Exception as e:
+            logging.error(f"Erro ao importar backups antigos de persistência: {str(e)}")
+        
     def _load_data(self):
         """Carrega os dados de persistência do arquivo"""
         try:
             if os.path.exists(self.data_file):
                 try:
-                    with open(self.data_file, 'r', encoding='utf-8') as f:
+                    with open(self.data_file, 'rb') as f:
                         content = f.read().strip()
-                        # Verifica se o arquivo está vazio ou contém dados inválidos
-                        if not content:
-                            logging.warning(f"Arquivo {self.data_file} está vazio. Inicializando com dados vazios.")
-                            self.data = {}
+                    # Verifica se o arquivo está vazio ou contém dados inválidos
+                    if not content:
+                        logging.warning(f"Arquivo {self.data_file} está vazio. Inicializando com dados vazios.")
+                        self.data = {}
+                        self._save_data()
+                    else:
+                        self.data, version = decode_document(content)
+                        
+                        # Migrações de esquema rodam uma única vez e regravam o arquivo na versão atual
+                        if version < SCHEMA_VERSION:
+                            self.data = migrate_schema(self.data, version)
                             self._save_data()
-                        else:
-                            self.data = json.loads(content)
+                            logging.info(f"Persistência migrada do esquema v{version} para v{SCHEMA_VERSION}")
                             
-                            # Migração: verifica se precisamos atualizar a estrutura de dados
-                            updated = False
-                            for key, value in self.data.items():
-                                # Adiciona o campo view_type se não existir
-                                if "view_type" not in value and "type" in value:
-                                    value["view_type"] = value["type"]
-                                    updated = True
-                                
-                                # Adiciona original_data se não existir
-                                if "original_data" not in value:
-                                    value["original_data"] = {}
-                                    updated = True
-                                    
-                            if updated:
-                                self._save_data()
-                                logging.info("Estrutura de dados da persistência atualizada")
-                                
-                            logging.info(f"Carregadas {len(self.data)} mensagens interativas do arquivo")
+                        logging.info(f"Carregadas {len(self.data)} mensagens interativas do arquivo")
                 except json.JSONDecodeError as e:
                     logging.error(f"Arquivo de mensagens interativas corrompido: {self.data_file}")
                     # Cria backup do arquivo corrompido
@@ -69,31 +183,450 @@ class Persistence:
                 logging.info(f"Arquivo {self.data_file} não encontrado. Criando um novo.")
                 self.data = {}
                 self._save_data()
+            
+            # Reaplica as operações registradas no journal após o último snapshot
+            self._replay_journal()
+            self._refresh_storage_signature()
         except Exception as e:
             logging.error(f"Erro ao carregar dados de persistência: {e}")
             self.data = {}
     
-    def _save_data(self):
-        """Salva os dados de persistência no arquivo"""
+    def _replay_journal(self):
+        """Reaplica sobre o snapshot carregado os registros do journal"""
+        self._journal_records = 0
+        if not os.path.exists(self.journal_file):
+            return
+        
+        applied = 0
+        last_generation = None
+        with open(self.journal_file, 'rb') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = codec.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                if not isinstance(record, dict):
+                    # Uma linha truncada (queda durante a escrita) ou que não é um registro é descartada
+                    logging.warning(f"Registro inválido ignorado na linha {line_number} do journal {self.journal_file}")
+                    continue
+                
+                # Gerações fora de sequência indicam registros perdidos ou arquivo adulterado
+                generation = record.get("gen")
+                if isinstance(generation, int):
+                    if last_generation is not None and generation != last_generation + 1:
+                        logging.warning(
+                            f"Sequência do journal interrompida na linha {line_number} "
+                            f"(esperado {last_generation + 1}, encontrado {generation})"
+                        )
+                    last_generation = generation
+                    self._generation = max(self._generation, generation)
+                
+                message_id = record.get("id")
+                if record.get("op") == "set" and message_id:
+                    self.data[message_id] = record.get("value", {})
+                    applied += 1
+                elif record.get("op") == "del" and message_id:
+                    self.data.pop(message_id, None)
+                    applied += 1
+        
+        self._journal_records = applied
+        if applied:
+            logging.info(f"Reaplicados {applied} registros do journal de persistência")
+    
+    def _get_storage_signature(self):
+        """Retorna (mtime, tamanho) dos arquivos de dados, sem lê-los"""
+        signature = []
+        for path in (self.data_file, self.journal_file):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def _refresh_storage_signature(self):
+        """Registra a assinatura atual dos arquivos como estado conhecido"""
+        self._storage_signature = self._get_storage_signature()
+    
+    def _storage_changed(self):
+        """Indica se os arquivos foram alterados por outro processo desde a última escrita própria"""
+        # Durante uma gravação em segundo plano os arquivos mudam por escrita própria
+        if self._flushing:
+            return False
+        return self._storage_signature != self._get_storage_signature()
+    
+    def _reload(self):
+        """Recarrega do armazenamento, preservando as alterações ainda não gravadas"""
+        self._load_data()
+        for message_id_str, entry in self._pending.items():
+            if entry is None:
+                self.data.pop(message_id_str, None)
+            else:
+                self.data[message_id_str] = entry
+        self._negative_cache.clear()
+        self._archived_ids = None
+    
+    def _write_batch(self, ops):
+        """Acrescenta ao journal um lote de operações, sem reescrever o snapshot.
+        
+        Executado fora do event loop pelo flusher; as entradas são tratadas como
+        imutáveis (register_message sempre cria uma entrada nova).
+        
+        Args:
+            ops: Dicionário message_id -> entrada, ou None para remoção
+            
+        Returns:
+            bool: True se o lote foi gravado
+        """
         try:
-            # Garante que o diretório existe
             self._ensure_data_directory()
+            lines = []
+            for message_id_str, entry in ops.items():
+                self._generation += 1
+                if entry is None:
+                    record = {"op": "del", "id": message_id_str, "gen": self._generation}
+                else:
+                    record = {"op": "set", "id": message_id_str, "value": entry, "gen": self._generation}
+                lines.append(codec.dumps(record) + b"\n")
+            
+            with open(self.journal_file, 'ab') as f:
+                f.write(b"".join(lines))
+            self._journal_records += len(lines)
+            self._refresh_storage_signature()
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao gravar no journal de persistência: {e}")
+            return False
+    
+    def _queue_write(self, message_id_str, entry):
+        """Marca uma alteração já aplicada em memória para gravação (entry=None remove)"""
+        if self._flush_task is None or self._flush_task.done():
+            # Sem flusher em segundo plano (ex.: antes do event loop), grava de imediato
+            if not self._write_batch({message_id_str: entry}):
+                return False
+            if self._journal_records >= JOURNAL_COMPACT_THRESHOLD:
+                self.compact()
+            return True
+        
+        self._pending[message_id_str] = entry
+        if len(self._pending) >= self.flush_batch_size:
+            self._flush_event.set()
+        return True
+    
+    async def _run_off_loop(self, func, *args):
+        """Executa uma gravação bloqueante no executor, fora do event loop"""
+        self._flushing += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+        finally:
+            self._flushing -= 1
+    
+    def _get_flush_lock(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+    
+    async def flush(self):
+        """Grava as alterações pendentes, coalescidas em um único lote"""
+        if not self._pending:
+            return True
+        
+        async with self._get_flush_lock():
+            if not self._pending:
+                return True
+            ops, self._pending = self._pending, {}
+            if not await self._run_off_loop(self._write_batch, ops):
+                # Devolve à fila o que não foi substituído por alterações mais recentes
+                for message_id_str, entry in ops.items():
+                    self._pending.setdefault(message_id_str, entry)
+                return False
+        
+        # Compacta de imediato se o journal crescer demais entre duas compactações periódicas
+        if self._journal_records >= JOURNAL_COMPACT_THRESHOLD:
+            await self.compact_async()
+        return True
+    
+    async def _flush_loop(self):
+        """Grava as alterações pendentes a cada flush_interval ou ao atingir flush_batch_size"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Erro na gravação em segundo plano da persistência: {e}")
+    
+    def _lookup_missing(self, message_id_str):
+        """Busca no armazenamento uma mensagem que não está em memória"""
+        # Só recarrega do arquivo se ele foi alterado externamente; caso contrário
+        # a memória já reflete tudo o que está em disco
+        if not self._storage_changed():
+            return None
+        logging.info("Arquivos de persistência alterados externamente. Recarregando.")
+        self._reload()
+        return self.data.get(message_id_str)
+    
+    def _is_known_missing(self, message_id_str):
+        """Indica se o ID está no cache negativo, ainda válido e sem alteração nos arquivos"""
+        expires_at = self._negative_cache.get(message_id_str)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._negative_cache[message_id_str]
+            return False
+        if self._storage_changed():
+            self._negative_cache.clear()
+            return False
+        return True
+    
+    def _remember_missing(self, message_id_str):
+        """Adiciona um ID ausente ao cache negativo, descartando o mais antigo se estiver cheio"""
+        self._negative_cache.pop(message_id_str, None)
+        if len(self._negative_cache) >= NEGATIVE_CACHE_MAX_SIZE:
+            del self._negative_cache[next(iter(self._negative_cache))]
+        self._negative_cache[message_id_str] = time.monotonic() + NEGATIVE_CACHE_TTL
+    
+    def _matches(self, value, channel_id=None, view_type=None, author_id=None, since=None):
+        """Verifica se uma entrada atende aos filtros de consulta"""
+        if channel_id is not None and value.get("channel_id") != str(channel_id):
+            return False
+        if view_type is not None and value.get("view_type") != view_type:
+            return False
+        if author_id is not None and value.get("author_id") != str(author_id):
+            return False
+        if since is not None and value.get("timestamp", "") < since:
+            return False
+        return True
+    
+    def query_messages(self, channel_id=None, view_type=None, author_id=None, since=None):
+        """Lista as mensagens que atendem aos filtros informados.
+        
+        Args:
+            channel_id: ID do canal
+            view_type: Tipo da view (agendamento, atualizacao, beta99)
+            author_id: ID do autor
+            since: Timestamp ISO mínimo de registro
             
-            # Cria um backup antes de salvar (uma vez a cada hora)
+        Returns:
+            dict: Mensagens encontradas, indexadas pelo ID
+        """
+        result = {}
+        for message_id, value in self.data.items():
+            if self._matches(value, channel_id, view_type, author_id, since):
+                result[message_id] = value
+        return result
+    
+    def compact(self, data=None):
+        """Consolida o journal em um novo snapshot e o esvazia"""
+        if not self._save_data(data):
+            return False
+        try:
+            # O snapshot já contém todos os registros, então o journal pode ser truncado.
+            # Se o processo cair entre as duas etapas, a reaplicação é idempotente.
+            with open(self.journal_file, 'w', encoding='utf-8'):
+                pass
+            logging.info(f"Journal de persistência compactado ({self._journal_records} registros)")
+            self._journal_records = 0
+            self._refresh_storage_signature()
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao truncar o journal de persistência: {e}")
+            return False
+    
+    async def compact_async(self):
+        """Compacta fora do event loop, a partir de uma cópia dos dados em memória"""
+        await self.flush()
+        async with self._get_flush_lock():
+            return await self._run_off_loop(self.compact, dict(self.data))
+    
+    async def compaction_loop(self, interval=JOURNAL_COMPACT_INTERVAL):
+        """Compacta periodicamente o journal em segundo plano"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._journal_records > 0:
+                    await self.compact_async()
+            except Exception as e:
+                logging.error(f"Erro na compactação periódica da persistência: {e}")
+    
+    def mark_status(self, message_id, status):
+        """Registra o status do ciclo de vida de uma mensagem (ex: finalizado, concluido)"""
+        message_id_str = str(message_id)
+        entry = self.data.get(message_id_str)
+        if entry is None:
+            return False
+        
+        self.data[message_id_str] = dict(entry, status=status, status_timestamp=datetime.utcnow().isoformat())
+        logging.info(f"Mensagem {message_id} marcada como {status}")
+        return self._queue_write(message_id_str, self.data[message_id_str])
+    
+    def _select_for_archive(self, now=None):
+        """Seleciona as entradas finalizadas ou mais antigas que o limite de idade"""
+        now = now or datetime.utcnow()
+        cutoff = (now - timedelta(days=self.archive_max_age_days)).isoformat()
+        selected = {}
+        for message_id, value in self.data.items():
+            if value.get("status") in ARCHIVE_STATUSES or value.get("timestamp", "") < cutoff:
+                selected[message_id] = value
+        return selected
+    
+    def _append_archive(self, entries):
+        """Acrescenta as entradas ao arquivo morto (um novo membro gzip por lote)"""
+        archived_at = datetime.utcnow().isoformat()
+        try:
+            with gzip.open(self.archive_file, 'at', encoding='utf-8') as f:
+                for message_id, value in entries.items():
+                    f.write(json.dumps({"id": message_id, "arquivado_em": archived_at, "value": value},
+                                       ensure_ascii=False) + "\n")
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao gravar {len(entries)} mensagens no arquivo morto: {e}")
+            return False
+    
+    async def archive_async(self, now=None):
+        """Move as entradas finalizadas ou antigas do conjunto ativo para o arquivo morto"""
+        entries = self._select_for_archive(now)
+        if not entries:
+            return 0
+        # Serializado com flush/compactação: nenhuma gravação própria corre em paralelo
+        async with self._get_flush_lock():
+            if not await self._run_off_loop(self._append_archive, entries):
+                return 0
+        if self._archived_ids is not None:
+            self._archived_ids.update(entries)
+        
+        archived = 0
+        for message_id, value in entries.items():
+            # Só remove se a entrada não mudou enquanto o arquivo era gravado
+            if self.data.get(message_id) is value:
+                del self.data[message_id]
+                self.views.pop(message_id, None)
+                self._queue_write(message_id, None)
+                archived += 1
+        logging.info(f"Arquivadas {archived} mensagens interativas ({len(self.data)} ativas)")
+        return archived
+    
+    async def archive_loop(self, interval=ARCHIVE_INTERVAL):
+        """Aplica periodicamente a política de arquivamento"""
+        while True:
             try:
-                hour_mark = datetime.utcnow().strftime('%Y%m%d%H')
-                backup_file = f"{self.data_file}.{hour_mark}.bak"
-                if os.path.exists(self.data_file) and not os.path.exists(backup_file):
-                    import shutil
-                    shutil.copy2(self.data_file, backup_file)
-                    logging.debug(f"Backup horário criado: {backup_file}")
-            except Exception as bk_err:
-                logging.debug(f"Não foi possível criar backup horário: {str(bk_err)}")
+                await self.archive_async()
+            except Exception as e:
+                logging.error(f"Erro no arquivamento de mensagens interativas: {e}")
+            await asyncio.sleep(interval)
+    
+    def query_archive(self, message_id=None, channel_id=None, view_type=None, author_id=None, since=None):
+        """Consulta o arquivo morto com os mesmos filtros de query_messages"""
+        result = {}
+        if not os.path.exists(self.archive_file):
+            return result
+        try:
+            with gzip.open(self.archive_file, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if message_id is not None and record.get("id") != str(message_id):
+                        continue
+                    value = record.get("value") or {}
+                    if self._matches(value, channel_id, view_type, author_id, since):
+                        result[record["id"]] = value
+        except (EOFError, OSError) as e:
+            # Um lote interrompido no meio deixa o último membro gzip truncado
+            logging.warning(f"Arquivo morto lido parcialmente: {e}")
+        return result
+    
+    def _load_archived_ids(self):
+        """Lê uma única vez os IDs presentes no arquivo morto"""
+        return set(self.query_archive())
+    
+    async def get_archived_message(self, message_id):
+        """Busca uma mensagem no arquivo morto fora do event loop e a devolve ao conjunto ativo.
+        
+        IDs que não constam no índice do arquivo são respondidos sem acessar o disco.
+        A entrada encontrada volta para self.data, para que set_view_id e mark_status
+        chamados em seguida tenham efeito; se continuar finalizada, o próximo ciclo de
+        arquivamento a arquiva de novo com os dados atualizados.
+        """
+        message_id_str = str(message_id)
+        loop = asyncio.get_running_loop()
+        if self._archived_ids is None:
+            # Com a trava, nenhum lote de arquivamento é gravado durante a leitura do índice
+            async with self._get_flush_lock():
+                if self._archived_ids is None:
+                    self._archived_ids = await loop.run_in_executor(None, self._load_archived_ids)
+        if message_id_str not in self._archived_ids:
+            return None
+        
+        found = await loop.run_in_executor(None, lambda: self.query_archive(message_id=message_id_str))
+        value = found.get(message_id_str)
+        if value is None:
+            self._archived_ids.discard(message_id_str)
+            return None
+        if message_id_str not in self.data:
+            self._negative_cache.pop(message_id_str, None)
+            self.data[message_id_str] = value
+            self._queue_write(message_id_str, value)
+            logging.info(f"Mensagem {message_id} recuperada do arquivo morto para o conjunto ativo")
+        return self.data[message_id_str]
+    
+    def start_background_tasks(self):
+        """Inicia a gravação, a compactação e o arquivamento em segundo plano (requer um event loop em execução)"""
+        loop = asyncio.get_running_loop()
+        self._get_flush_lock()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_event = asyncio.Event()
+            self._flush_task = loop.create_task(self._flush_loop())
+        if self._compaction_task is None or self._compaction_task.done():
+            self._compaction_task = loop.create_task(self.compaction_loop())
+        if self._archive_task is None or self._archive_task.done():
+            self._archive_task = loop.create_task(self.archive_loop())
+        return self._flush_task
+    
+    async def shutdown(self):
+        """Interrompe as tarefas em segundo plano e grava tudo o que estiver pendente"""
+        for task in (self._flush_task, self._compaction_task, self._archive_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._flush_task = None
+        self._compaction_task = None
+        self._archive_task = None
+        
+        await self.flush()
+        if self._journal_records > 0:
+            await self.compact_async()
+        logging.info("Persistência gravada no encerramento")
+    
+    def _serialize_snapshot(self, data):
+        """Serializa os dados no formato do arquivo de snapshot, com o cabeçalho de versão"""
+        return codec.dumps({"schema_version": SCHEMA_VERSION, "messages": data}, compact=self.compact_encoding)
+    
+    def _take_snapshot(self, content, force=False):
+        """Registra um snapshot do conteúdo; ignorado se nada mudou desde o último"""
+        try:
+            return self.snapshots.take_snapshot(content, force=force)
+        except Exception as e:
+            logging.error(f"Erro ao criar snapshot de persistência: {str(e)}")
+            return None
+    
+    def _save_data(self, data=None):
+        """Salva os dados de persistência no arquivo"""
+        try:
+            # Garante que o diretório existe
+            self._ensure_data_directory()
+            content = self._serialize_snapshot(self.data if data is None else data)
             
             # Salva os dados em um arquivo temporário primeiro
             temp_file = f"{self.data_file}.tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=4)
+            with open(temp_file, 'wb') as f:
+                f.write(content)
             
             # Só depois renomeia para o arquivo final (operação atômica)
             if os.path.exists(temp_file):
@@ -102,29 +635,50 @@ class Persistence:
                     os.remove(self.data_file)
                 os.rename(temp_file, self.data_file)
             
+            # Snapshot no máximo uma vez por hora e só se o conteúdo mudou
+            self._take_snapshot(content)
             return True
         except Exception as e:
             logging.error(f"Erro ao salvar dados de persistência: {e}")
             return False
-            
-    def register_message(self, message_id, view_type, original_data, author_id, channel_id):
-        """Registra uma mensagem com dados para persistência."""
+    
+    def _replace_all(self, data):
+        """Substitui todo o conteúdo armazenado pelos dados informados"""
+        return self.compact(data)
+    
+    def restore_snapshot(self, snapshot_id):
+        """Restaura os dados de um snapshot (use com o bot parado).
+        
+        O estado atual é guardado em um novo snapshot antes, para que a restauração
+        possa ser desfeita.
+        """
         try:
-            # Verifica se o arquivo está corrompido antes de tentar salvar
-            if not os.path.exists(self.data_file) or os.path.getsize(self.data_file) == 0:
-                logging.warning(f"Arquivo {self.data_file} vazio ou inexistente. Reinicializando.")
-                self.data = {}
+            data = migrate_schema(*decode_document(self.snapshots.read_snapshot(snapshot_id)))
+        except Exception as e:
+            logging.error(f"Erro ao ler o snapshot {snapshot_id}: {str(e)}")
+            return False
+        
+        self._take_snapshot(self._serialize_snapshot(self.data), force=True)
+        self._pending.clear()
+        self._negative_cache.clear()
+        self.data = data
+        if not self._replace_all(data):
+            return False
+        logging.info(f"Snapshot {snapshot_id} restaurado com {len(data)} mensagens")
+        return True
             
-            # Verifica se pode ler os dados antes de modificar
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:  # Se não estiver vazio
-                        test_data = json.loads(content)
-                        # Se chegou aqui, o JSON é válido, podemos continuar
-            except Exception as verify_err:
-                logging.error(f"Verificação do arquivo falhou: {str(verify_err)}. Reinicializando dados.")
-                self.data = {}
+    def register_message(self, message_id, view_type, original_data, author_id, channel_id, view_id=None):
+        """Registra uma mensagem com dados para persistência.
+        
+        view_id é o identificador usado nos custom_ids dos botões da CustomView;
+        com ele a view pode ser religada à mensagem sem consultar o Discord.
+        """
+        try:
+            # Só recarrega se os arquivos mudaram (mtime/tamanho) desde a última escrita própria;
+            # o recarregamento trata arquivos vazios ou corrompidos
+            if self._storage_changed():
+                logging.warning(f"Arquivos de persistência alterados externamente. Recarregando antes de registrar.")
+                self._reload()
             
             # Valida os parâmetros essenciais
             if not view_type:
@@ -137,6 +691,7 @@ class Persistence:
             
             # Adiciona a nova mensagem
             message_id_str = str(message_id)
+            self._negative_cache.pop(message_id_str, None)
             self.data[message_id_str] = {
                 "view_type": view_type,
                 "original_data": original_data,
@@ -144,9 +699,11 @@ class Persistence:
                 "channel_id": str(channel_id),
                 "timestamp": datetime.utcnow().isoformat()
             }
+            if view_id:
+                self.data[message_id_str]["view_id"] = str(view_id)
             
-            # Salva os dados
-            if self._save_data():
+            # A memória já está atualizada; a gravação no journal fica a cargo do flusher
+            if self._queue_write(message_id_str, self.data[message_id_str]):
                 logging.info(f"Mensagem {message_id} registrada para persistência como tipo {view_type}")
                 return True
             return False
@@ -154,13 +711,25 @@ class Persistence:
             logging.error(f"Erro ao registrar mensagem {message_id}: {str(e)}")
             return False
     
+    def set_view_id(self, message_id, view_id):
+        """Atualiza o view_id de uma mensagem já registrada, se tiver mudado"""
+        message_id_str = str(message_id)
+        entry = self.data.get(message_id_str)
+        if entry is None or not view_id or entry.get("view_id") == str(view_id):
+            return False
+        
+        # As entradas não são alteradas no lugar: a compactação pode estar lendo uma cópia rasa
+        self.data[message_id_str] = dict(entry, view_id=str(view_id))
+        logging.debug(f"view_id da mensagem {message_id} atualizado para {view_id}")
+        return self._queue_write(message_id_str, self.data[message_id_str])
+    
     def remove_message(self, message_id):
         """Remove uma mensagem do armazenamento persistente."""
         try:
             message_id_str = str(message_id)
             if message_id_str in self.data:
                 del self.data[message_id_str]
-                self._save_data()
+                self._queue_write(message_id_str, None)
                 logging.info(f"Mensagem {message_id} removida da persistência")
                 return True
             else:
@@ -187,120 +756,244 @@ class Persistence:
                 logging.info(f"Dados recuperados para mensagem {message_id}")
                 return self.data[message_id_str]
                 
-            # Se não estiver na memória, tenta recarregar do arquivo
+            # Misses recentes são respondidos sem acessar o disco
+            if self._is_known_missing(message_id_str):
+                logging.debug(f"Mensagem {message_id} no cache negativo da persistência")
+                return None
+            
+            # Se não estiver na memória, busca diretamente no armazenamento
             # (pode ser útil em caso de alterações externas no arquivo)
-            self._load_data()
+            message_data = self._lookup_missing(message_id_str)
             
-            if message_id_str in self.data:
+            if message_data is not None:
                 logging.info(f"Dados recuperados após recarga para mensagem {message_id}")
-                return self.data[message_id_str]
+                return message_data
             
+            self._remember_missing(message_id_str)
             logging.warning(f"Dados não encontrados para mensagem {message_id}")
             return None
         except Exception as e:
             logging.error(f"Erro ao recuperar dados da mensagem {message_id}: {str(e)}")
             return None
     
+    async def _resolve_channel(self, bot, channel_id):
+        """Obtém o canal pelo cache ou, se necessário, pela API"""
+        channel = bot.get_channel(int(channel_id))
+        if channel:
+            return channel
+        try:
+            return await bot.fetch_channel(int(channel_id))
+        except Exception:
+            return None
+    
+    async def _restore_message(self, bot, CustomView, channel, message_id, data):
+        """Reconecta a view de uma única mensagem; retorna True se restaurada"""
+        author_id = data.get('author_id')
+        view_type = data.get('view_type', '')
+        original_data = data.get('original_data', {})
+        
+        if not author_id:
+            content = data.get("content", "")
+            if content:
+                # Tentar extrair autor_id do conteúdo
+                author_match = re.search(r"(?:<@!?|<@|<@&)(\d+)(?:>)", content)
+                if author_match:
+                    author_id = author_match.group(1)
+        
+        if not author_id:
+            logging.warning(f"Autor não encontrado para mensagem {message_id}")
+            author_id = bot.user.id  # Usa o ID do bot como padrão
+        
+        try:
+            message = await channel.fetch_message(int(message_id))
+            
+            # Cria uma CustomView
+            if not view_type:
+                # Tenta inferir o tipo da view pelo conteúdo
+                content = message.content
+                if "AGENDAMENTO" in content:
+                    view_type = "agendamento"
+                elif "ATUALIZAÇÃO" in content:
+                    view_type = "atualizacao"
+                elif "VERSÃO BETA 99" in content:
+                    view_type = "beta99"
+                else:
+                    view_type = "agendamento"  # Valor padrão
+                logging.info(f"Tipo de view inferido: {view_type}")
+            
+            # Reutiliza o view_id dos botões exibidos para que os custom_ids não mudem a cada reinício
+            from cogs.schedule_update import view_id_from_message
+            view_id = data.get("view_id") or view_id_from_message(message)
+            
+            # Cria a view correta com os dados
+            view = CustomView(
+                modal_type=view_type, 
+                original_data=original_data, 
+                author_id=int(author_id),
+                view_id=view_id
+            )
+            
+            # Registrar a view
+            self.register_view(message_id, view)
+            if not data.get("view_id"):
+                # Guarda o view_id para as próximas restaurações (inclusive sob demanda)
+                self.set_view_id(message_id, view.view_id)
+            
+            # Atualiza a mensagem com a nova view
+            await message.edit(view=view)
+            logging.debug(f"View restaurada com sucesso para a mensagem {message_id}")
+            return True
+            
+        except discord.NotFound:
+            logging.warning(f"Mensagem {message_id} não encontrada no canal {channel.id}")
+            self.remove_message(message_id)
+        except discord.Forbidden:
+            logging.warning(f"Sem permissão para acessar a mensagem {message_id}")
+        except discord.HTTPException as e:
+            logging.error(f"Erro HTTP ao acessar a mensagem {message_id}: {str(e)}")
+        return False
+    
+    async def _restore_channel(self, bot, CustomView, channel_id, messages, progress, deadline):
+        """Restaura em sequência as mensagens de um canal (mesmo bucket de rate limit)"""
+        channel = await self._resolve_channel(bot, channel_id)
+        if channel is None:
+            logging.warning(f"Canal {channel_id} não encontrado para {len(messages)} mensagens")
+            progress["processadas"] += len(messages)
+            return
+        
+        for message_id, data in messages:
+            if time.monotonic() >= deadline:
+                return
+            try:
+                if await self._restore_message(bot, CustomView, channel, message_id, data):
+                    progress["restauradas"] += 1
+            except Exception as e:
+                logging.error(f"Erro ao processar dados da mensagem {message_id}: {str(e)}")
+            
+            progress["processadas"] += 1
+            if progress["processadas"] % RESTORE_PROGRESS_EVERY == 0:
+                logging.info(
+                    f"Restauração de views: {progress['processadas']}/{progress['total']} processadas "
+                    f"({progress['restauradas']} restauradas)"
+                )
+    
+    def _attach_views(self, bot, CustomView):
+        """Religa as views às mensagens apenas em memória, sem buscar nem editar mensagens.
+        
+        Cada CustomView é recriada com o view_id salvo, reproduzindo os custom_ids dos
+        botões já exibidos, e vinculada à mensagem com add_view(message_id=...). Mensagens
+        apagadas só são percebidas quando alguém interage; entradas sem view_id continuam
+        sendo atendidas pelo handler global, que registra o view_id no primeiro clique.
+        """
+        started = time.monotonic()
+        attached = 0
+        without_view_id = 0
+        for message_id, data in list(self.data.items()):
+            view_id = data.get("view_id")
+            if not view_id:
+                without_view_id += 1
+                continue
+            try:
+                author_id = data.get("author_id") or bot.user.id
+                view = CustomView(
+                    modal_type=data.get("view_type") or "agendamento",
+                    original_data=data.get("original_data", {}),
+                    author_id=int(author_id),
+                    view_id=view_id
+                )
+                bot.add_view(view, message_id=int(message_id))
+                self.views[message_id] = view
+                attached += 1
+            except Exception as e:
+                logging.error(f"Erro ao religar a view da mensagem {message_id}: {str(e)}")
+        
+        elapsed = time.monotonic() - started
+        logging.info(
+            f"Religadas {attached} views sob demanda em {elapsed:.2f}s "
+            f"({without_view_id} mensagens sem view_id ficam com o handler global)"
+        )
+        return True
+    
     async def restore_views(self, bot):
-        """Restaura todas as views quando o bot inicia."""
+        """Restaura todas as views quando o bot inicia.
+        
+        As mensagens são agrupadas por canal: cada canal é processado em sequência,
+        pois edições no mesmo canal compartilham o bucket de rate limit do Discord,
+        enquanto até restore_workers canais são processados em paralelo. Ao estourar
+        restore_time_budget, as mensagens restantes ficam a cargo do handler global
+        de interações.
+        """
+        if self._restoring:
+            logging.info("Restauração de views já em andamento, ignorando nova solicitação")
+            return True
+        
         try:
             # Tenta importar as classes de schedule_update.py
             try:
                 from cogs.schedule_update import CustomView
-                has_custom_view = True
                 logging.info("Importado CustomView com sucesso de schedule_update.py")
             except ImportError:
-                has_custom_view = False
                 logging.error("Não foi possível importar CustomView de schedule_update.py")
                 return False
             
-            restored_count = 0
-            logging.info(f"Iniciando restauração de {len(self.data)} mensagens interativas")
+            if self.restore_mode == "sob_demanda":
+                return self._attach_views(bot, CustomView)
             
-            for message_id, data in self.data.items():
-                try:
-                    channel_id = data.get('channel_id')
-                    author_id = data.get('author_id')
-                    view_type = data.get('view_type', '')
-                    original_data = data.get('original_data', {})
-                    
-                    if not channel_id:
-                        logging.warning(f"Canal não encontrado para mensagem {message_id}")
-                        continue
-
-                    if not author_id:
-                        content = data.get("content", "")
-                        if content:
-                            # Tentar extrair autor_id do conteúdo
-                            author_match = re.search(r"(?:<@!?|<@|<@&)(\d+)(?:>)", content)
-                            if author_match:
-                                author_id = author_match.group(1)
-                    
-                    if not author_id:
-                        logging.warning(f"Autor não encontrado para mensagem {message_id}")
-                        author_id = bot.user.id  # Usa o ID do bot como padrão
-                    
-                    # Tentar obter o canal
+            self._restoring = True
+            started = time.monotonic()
+            deadline = started + self.restore_time_budget
+            
+            # Agrupa por canal a partir de uma cópia, pois mensagens removidas alteram self.data
+            by_channel = {}
+            for message_id, data in list(self.data.items()):
+                channel_id = data.get('channel_id')
+                if not channel_id:
+                    logging.warning(f"Canal não encontrado para mensagem {message_id}")
+                    continue
+                by_channel.setdefault(str(channel_id), []).append((message_id, data))
+            
+            total = sum(len(messages) for messages in by_channel.values())
+            progress = {"total": total, "processadas": 0, "restauradas": 0}
+            logging.info(
+                f"Iniciando restauração de {total} mensagens interativas em {len(by_channel)} canais "
+                f"({self.restore_workers} em paralelo)"
+            )
+            
+            queue = asyncio.Queue()
+            for channel_id, messages in by_channel.items():
+                queue.put_nowait((channel_id, messages))
+            
+            async def worker():
+                while time.monotonic() < deadline:
                     try:
-                        channel = bot.get_channel(int(channel_id))
-                        if not channel:
-                            # Tenta buscar o canal por ID diretamente
-                            try:
-                                channel = await bot.fetch_channel(int(channel_id))
-                            except:
-                                logging.warning(f"Canal {channel_id} não encontrado para a mensagem {message_id}")
-                                continue
-                        
-                        # Tenta obter a mensagem
-                        try:
-                            message = await channel.fetch_message(int(message_id))
-                            
-                            # Cria uma CustomView
-                            if not view_type:
-                                # Tenta inferir o tipo da view pelo conteúdo
-                                content = message.content
-                                if "AGENDAMENTO" in content:
-                                    view_type = "agendamento"
-                                elif "ATUALIZAÇÃO" in content:
-                                    view_type = "atualizacao"
-                                elif "VERSÃO BETA 99" in content:
-                                    view_type = "beta99"
-                                else:
-                                    view_type = "agendamento"  # Valor padrão
-                                logging.info(f"Tipo de view inferido: {view_type}")
-                            
-                            # Cria a view correta com os dados
-                            view = CustomView(
-                                modal_type=view_type, 
-                                original_data=original_data, 
-                                author_id=int(author_id)
-                            )
-                            
-                            # Registrar a view
-                            self.register_view(message_id, view)
-                            
-                            # Atualiza a mensagem com a nova view
-                            await message.edit(view=view)
-                            restored_count += 1
-                            logging.info(f"View restaurada com sucesso para a mensagem {message_id}")
-                            
-                        except discord.NotFound:
-                            logging.warning(f"Mensagem {message_id} não encontrada no canal {channel_id}")
-                            self.remove_message(message_id)
-                        except discord.Forbidden:
-                            logging.warning(f"Sem permissão para acessar a mensagem {message_id}")
-                        except discord.HTTPException as e:
-                            logging.error(f"Erro HTTP ao acessar a mensagem {message_id}: {str(e)}")
-                    except Exception as fetch_err:
-                        logging.error(f"Erro ao processar canal/mensagem {message_id}: {str(fetch_err)}")
-                except Exception as inner_e:
-                    logging.error(f"Erro ao processar dados da mensagem {message_id}: {str(inner_e)}")
-            
-            logging.info(f"Restauradas {restored_count} views com sucesso")
+                        channel_id, messages = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    try:
+                        await self._restore_channel(bot, CustomView, channel_id, messages, progress, deadline)
+                    except Exception as e:
+                        logging.error(f"Erro ao restaurar views do canal {channel_id}: {str(e)}")
+            
+            workers = [asyncio.create_task(worker()) for _ in range(max(1, self.restore_workers))]
+            done, pending = await asyncio.wait(workers, timeout=self.restore_time_budget)
+            for task in pending:
+                task.cancel()
+            
+            elapsed = time.monotonic() - started
+            if pending or progress["processadas"] < total:
+                logging.warning(
+                    f"Tempo limite de restauração ({self.restore_time_budget}s) atingido: "
+                    f"{total - progress['processadas']} mensagens serão tratadas sob demanda pelo handler global"
+                )
+            logging.info(
+                f"Restauradas {progress['restauradas']} de {total} views em {elapsed:.1f}s"
+            )
             return True
         except Exception as e:
             logging.error(f"Erro ao restaurar views: {str(e)}")
             return False
+        finally:
+            self._restoring = False
 
     def register_view(self, message_id, view):
         """Registra uma view para uma mensagem"""
@@ -321,18 +1014,57 @@ class Persistence:
 # Singleton para acesso global à persistência
 _persistence_instance = None
 
+def create_persistence(bot=None):
+    """Cria a persistência com o backend definido em config.json ("persistencia.backend")"""
+    settings = {}
+    try:
+        from cogs.glassfish_config import load_config
+        settings = load_config().get("persistencia", {})
+    except Exception as e:
+        logging.error(f"Erro ao ler as configurações de persistência: {e}")
+    
+    backend = settings.get("backend", DEFAULT_BACKEND)
+    options = {
+        "flush_interval": settings.get("flush_intervalo", FLUSH_INTERVAL),
+        "flush_batch_size": settings.get("flush_lote", FLUSH_BATCH_SIZE),
+        "restore_workers": settings.get("restauracao_paralela", RESTORE_WORKERS),
+        "restore_time_budget": settings.get("restauracao_tempo_limite", RESTORE_TIME_BUDGET),
+        "restore_mode": settings.get("restauracao", DEFAULT_RESTORE_MODE),
+        "archive_max_age_days": settings.get("arquivar_apos_dias", ARCHIVE_MAX_AGE_DAYS),
+        "compact_encoding": codec.is_compact(settings.get("codificacao", codec.ENCODING_COMPACT))
+    }
+    
+    if backend == "sqlite":
+        # Importa aqui para evitar import circular
+        from cogs.persistence_sqlite import SQLitePersistence
+        logging.info("Usando backend SQLite para a persistência")
+        return SQLitePersistence(bot, **options)
+    
+    if backend != "json":
+        logging.warning(f"Backend de persistência desconhecido '{backend}', usando 'json'")
+    return Persistence(bot, **options)
+
 def setup_persistence(bot=None):
-    """Configura a instância global de persistência"""
+    """Configura a instância global de persistência.
+    
+    A instância é criada uma única vez por processo; chamadas seguintes apenas
+    associam o bot, se ainda não houver, e retornam a mesma instância.
+    """
     global _persistence_instance
-    _persistence_instance = Persistence(bot)
+    if _persistence_instance is None:
+        _persistence_instance = create_persistence(bot)
+        stats = _persistence_instance.startup_stats
+        logging.info(
+            f"Persistência carregada ({stats['backend']}): {stats['mensagens']} mensagens, "
+            f"{stats['registros_reaplicados']} registros do journal reaplicados em {stats['tempo_carga_ms']}ms"
+        )
+    elif bot is not None and _persistence_instance.bot is None:
+        _persistence_instance.bot = bot
     return _persistence_instance
 
 def get_instance_persistence(bot=None):
     """Obtém a instância global de persistência"""
-    global _persistence_instance
-    if _persistence_instance is None:
-        _persistence_instance = Persistence(bot)
-    return _persistence_instance
+    return setup_persistence(bot)
 
 async def restore_views(bot):
     """
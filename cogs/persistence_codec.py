@@ -0,0 +1,115 @@
+import sys
+import json
+import time
+import random
+import argparse
+
+# orjson é opcional: quando instalado, serializa e lê JSON várias vezes mais rápido
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+# Codificações aceitas em config.json: "compacta" (JSON minificado) ou "legivel" (indentado)
+ENCODING_COMPACT = "compacta"
+ENCODING_READABLE = "legivel"
+
+
+def dumps(obj, compact=True):
+    """Serializa para bytes em UTF-8.
+
+    Args:
+        obj: Objeto a serializar
+        compact: JSON minificado (com orjson, se disponível) ou indentado para edição manual
+
+    Returns:
+        bytes: Conteúdo serializado
+    """
+    if not compact:
+        return json.dumps(obj, ensure_ascii=False, indent=4).encode("utf-8")
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # Chaves não textuais ou tipos não suportados pelo orjson
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(content):
+    """Lê JSON de bytes ou str, usando orjson quando disponível"""
+    if HAS_ORJSON:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def is_compact(encoding):
+    """Interpreta a opção de codificação do config.json"""
+    return encoding != ENCODING_READABLE
+
+
+def _sample_messages(count):
+    """Gera mensagens interativas sintéticas no formato da persistência"""
+    rng = random.Random(42)
+    messages = {}
+    for i in range(count):
+        message_id = str(1100000000000000000 + i)
+        messages[message_id] = {
+            "view_type": rng.choice(["agendamento", "atualizacao", "beta99"]),
+            "original_data": {
+                "cliente": f"Cliente {rng.randint(1, 500)}",
+                "chamado": str(rng.randint(100000, 999999)),
+                "data_agendamento": "21/02/2024 14:00",
+                "observacao": "Atualização da versão com migração de banco" * rng.randint(0, 2),
+            },
+            "author_id": str(rng.randint(10**17, 10**18)),
+            "channel_id": "997291234643148811",
+            "timestamp": "2024-02-21T13:00:00.000000",
+            "view_id": "20240221130000",
+        }
+    return messages
+
+
+def benchmark(count=5000, rounds=5):
+    """Compara tamanho e tempo de gravação/leitura das codificações disponíveis"""
+    document = {"schema_version": 2, "messages": _sample_messages(count)}
+    variants = [
+        ("json indentado (v1)", lambda: json.dumps(document, ensure_ascii=False, indent=4).encode("utf-8"), json.loads),
+        ("json minificado", lambda: json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), json.loads),
+    ]
+    if HAS_ORJSON:
+        variants.append(("orjson", lambda: orjson.dumps(document), orjson.loads))
+
+    results = []
+    for name, encode, decode in variants:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            content = encode()
+        dump_ms = (time.perf_counter() - started) * 1000 / rounds
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            decode(content)
+        load_ms = (time.perf_counter() - started) * 1000 / rounds
+        results.append((name, len(content), dump_ms, load_ms))
+    return results
+
+
+def main(argv=None):
+    """Benchmark das codificações: python -m cogs.persistence_codec [--mensagens N]"""
+    parser = argparse.ArgumentParser(description="Benchmark de codificação da persistência")
+    parser.add_argument("--mensagens", type=int, default=5000, help="Quantidade de mensagens sintéticas")
+    parser.add_argument("--rodadas", type=int, default=5, help="Repetições de cada medição")
+    args = parser.parse_args(argv)
+
+    print(f"{args.mensagens} mensagens, média de {args.rodadas} rodadas (orjson: {'sim' if HAS_ORJSON else 'não'})")
+    print(f"{'codificação':<22}{'tamanho':>12}{'gravação':>12}{'leitura':>12}")
+    for name, size, dump_ms, load_ms in benchmark(args.mensagens, args.rodadas):
+        print(f"{name:<22}{size / 1024:>9.1f} KB{dump_ms:>9.1f} ms{load_ms:>9.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
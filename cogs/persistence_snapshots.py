@@ -0,0 +1,225 @@
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+# Intervalo mínimo entre dois snapshots automáticos
+SNAPSHOT_MIN_INTERVAL = timedelta(hours=1)
+# Política de retenção: quantos snapshots manter em cada camada
+RETENCAO_HORARIA = 24
+RETENCAO_DIARIA = 7
+RETENCAO_SEMANAL = 4
+
+# Backups horários do formato antigo: mensagens_data.json.YYYYMMDDHH.bak
+LEGACY_BACKUP_PATTERN = re.compile(r"\.(\d{10})\.bak$")
+
+
+class SnapshotManager:
+    """Snapshots comprimidos e endereçados por conteúdo dos dados de persistência.
+
+    Cada conteúdo distinto é gravado uma única vez em objects/<sha256>.json.gz e o
+    índice (index.json) registra quando cada snapshot foi feito. Snapshots idênticos
+    ao anterior são ignorados e a retenção horária/diária/semanal mantém o uso de
+    disco limitado.
+    """
+
+    def __init__(self, snapshot_dir="data/snapshots", min_interval=SNAPSHOT_MIN_INTERVAL):
+        self.snapshot_dir = snapshot_dir
+        self.objects_dir = os.path.join(snapshot_dir, "objects")
+        self.index_file = os.path.join(snapshot_dir, "index.json")
+        self.min_interval = min_interval
+
+    def _load_index(self):
+        """Carrega o índice de snapshots, ordenado do mais antigo ao mais recente"""
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            # Índices gravados antes da importação ordenada podem ter backups antigos no fim
+            index.sort(key=lambda entry: datetime.fromisoformat(entry["timestamp"]))
+            return index
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            logging.error(f"Erro ao carregar índice de snapshots: {e}")
+            return []
+
+    def _save_index(self, index):
+        """Grava o índice de snapshots de forma atômica"""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(temp_file, self.index_file)
+
+    def _object_path(self, content_hash):
+        return os.path.join(self.objects_dir, f"{content_hash}.json.gz")
+
+    def _store_object(self, content, content_hash):
+        """Grava o conteúdo comprimido, se ainda não existir um objeto com o mesmo hash"""
+        path = self._object_path(content_hash)
+        if os.path.exists(path):
+            return
+        os.makedirs(self.objects_dir, exist_ok=True)
+        temp_file = f"{path}.tmp"
+        with gzip.open(temp_file, "wb") as f:
+            f.write(content)
+        os.replace(temp_file, path)
+
+    def take_snapshot(self, content, now=None, force=False):
+        """Registra um snapshot do conteúdo informado.
+
+        Args:
+            content: Conteúdo serializado (bytes)
+            now: Momento do snapshot (padrão: agora)
+            force: Ignora o intervalo mínimo entre snapshots
+
+        Returns:
+            dict: Entrada criada no índice ou None se nada mudou
+        """
+        now = now or datetime.utcnow()
+        content_hash = hashlib.sha256(content).hexdigest()
+        index = self._load_index()
+
+        # Posição pela data: backups antigos importados entram antes dos snapshots mais recentes
+        position = len(index)
+        while position > 0 and datetime.fromisoformat(index[position - 1]["timestamp"]) > now:
+            position -= 1
+
+        if position > 0:
+            previous = index[position - 1]
+            if previous["hash"] == content_hash:
+                return None
+            previous_time = datetime.fromisoformat(previous["timestamp"])
+            if not force and now - previous_time < self.min_interval:
+                return None
+
+        self._store_object(content, content_hash)
+        snapshot_id = now.strftime("%Y%m%d%H%M%S")
+        existing_ids = {entry["id"] for entry in index}
+        suffix = 1
+        while snapshot_id in existing_ids:
+            snapshot_id = f"{now.strftime('%Y%m%d%H%M%S')}-{suffix}"
+            suffix += 1
+        entry = {
+            "id": snapshot_id,
+            "timestamp": now.isoformat(),
+            "hash": content_hash,
+            "size": len(content)
+        }
+        index.insert(position, entry)
+        # A retenção conta a partir do snapshot mais recente, mesmo ao importar um antigo
+        index = self._apply_retention(index, max(now, datetime.fromisoformat(index[-1]["timestamp"])))
+        self._save_index(index)
+        logging.info(f"Snapshot de persistência {entry['id']} criado ({len(content)} bytes)")
+        return entry
+
+    def _apply_retention(self, index, now):
+        """Mantém o snapshot mais recente de cada hora, dia e semana dentro das camadas"""
+        keep = set()
+        tiers = (
+            (lambda t: t.strftime("%Y%m%d%H"), timedelta(hours=RETENCAO_HORARIA)),
+            (lambda t: t.strftime("%Y%m%d"), timedelta(days=RETENCAO_DIARIA)),
+            (lambda t: "%d-%02d" % t.isocalendar()[:2], timedelta(weeks=RETENCAO_SEMANAL)),
+        )
+        for bucket_of, window in tiers:
+            seen = set()
+            for entry in reversed(index):
+                timestamp = datetime.fromisoformat(entry["timestamp"])
+                if now - timestamp > window:
+                    continue
+                bucket = bucket_of(timestamp)
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(entry["id"])
+
+        # O snapshot mais recente é sempre mantido
+        if index:
+            keep.add(index[-1]["id"])
+
+        retained = [entry for entry in index if entry["id"] in keep]
+        if len(retained) != len(index):
+            self._prune_objects(retained)
+        return retained
+
+    def _prune_objects(self, index):
+        """Remove objetos que não são mais referenciados pelo índice"""
+        referenced = {entry["hash"] for entry in index}
+        if not os.path.isdir(self.objects_dir):
+            return
+        for filename in os.listdir(self.objects_dir):
+            content_hash = filename.split(".", 1)[0]
+            if filename.endswith(".json.gz") and content_hash not in referenced:
+                try:
+                    os.remove(os.path.join(self.objects_dir, filename))
+                except Exception as e:
+                    logging.error(f"Erro ao remover snapshot {filename}: {e}")
+
+    def list_snapshots(self):
+        """Lista os snapshots disponíveis, do mais antigo ao mais recente"""
+        return self._load_index()
+
+    def read_snapshot(self, snapshot_id):
+        """Retorna o conteúdo (bytes) de um snapshot pelo ID"""
+        for entry in self._load_index():
+            if entry["id"] == snapshot_id:
+                with gzip.open(self._object_path(entry["hash"]), "rb") as f:
+                    return f.read()
+        raise KeyError(f"Snapshot {snapshot_id} não encontrado")
+
+    def import_legacy_backups(self, data_file):
+        """Converte os backups horários antigos (*.YYYYMMDDHH.bak) em snapshots e os remove"""
+        directory = os.path.dirname(data_file) or "."
+        prefix = os.path.basename(data_file)
+        legacy = []
+        for filename in os.listdir(directory):
+            match = LEGACY_BACKUP_PATTERN.search(filename)
+            if filename.startswith(prefix) and match:
+                legacy.append((match.group(1), os.path.join(directory, filename)))
+        if not legacy:
+            return 0
+
+        for hour_mark, path in sorted(legacy):
+            try:
+                with open(path, "rb") as f:
+                    content = f.read()
+                self.take_snapshot(content, now=datetime.strptime(hour_mark, "%Y%m%d%H"), force=True)
+                os.remove(path)
+            except Exception as e:
+                logging.error(f"Erro ao importar backup antigo {path}: {e}")
+
+        logging.info(f"Importados {len(legacy)} backups horários antigos para {self.snapshot_dir}")
+        return len(legacy)
+
+
+def main(argv=None):
+    """Linha de comando para listar e restaurar snapshots (com o bot parado)"""
+    parser = argparse.ArgumentParser(description="Snapshots das mensagens interativas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("listar", help="Lista os snapshots disponíveis")
+    restaurar = subparsers.add_parser("restaurar", help="Restaura um snapshot")
+    restaurar.add_argument("snapshot_id", help="ID do snapshot (ex: 20240221130000)")
+    args = parser.parse_args(argv)
+
+    manager = SnapshotManager()
+    if args.comando == "listar":
+        for entry in manager.list_snapshots():
+            print(f"{entry['id']}  {entry['timestamp']}  {entry['size']:>10} bytes  {entry['hash'][:12]}")
+        return 0
+
+    # Importa aqui para evitar import circular
+    from cogs.persistence import create_persistence
+    persistence = create_persistence()
+    if persistence.restore_snapshot(args.snapshot_id):
+        print(f"Snapshot {args.snapshot_id} restaurado ({len(persistence.data)} mensagens)")
+        return 0
+    print(f"Não foi possível restaurar o snapshot {args.snapshot_id}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from cogs.persistence import Persistence, decode_document, migrate_schema
+from cogs import persistence_codec as codec
+
+
+class SQLitePersistence(Persistence):
+    """Persistência de mensagens interativas armazenada em SQLite.
+
+    Mantém a mesma API da persistência em JSON (register_message, remove_message,
+    get_message_data), mas cada escrita altera apenas uma linha e as consultas por
+    canal, tipo, autor ou data usam índices em vez de percorrer todas as mensagens.
+    """
+
+    def __init__(self, bot=None, **options):
+        self.db_file = "data/mensagens_data.db"
+        # No SQLite o arquivo morto é a tabela mensagens_arquivo
+        self.conn = None
+        # A conexão é compartilhada entre o event loop (leituras) e o flusher (escritas)
+        self._db_lock = threading.RLock()
+        super().__init__(bot, **options)
+
+    def _connect(self):
+        """Abre a conexão e cria o esquema, se necessário"""
+        if self.conn is not None:
+            return self.conn
+
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS mensagens (
+                message_id TEXT PRIMARY KEY,
+                view_type TEXT,
+                author_id TEXT,
+                channel_id TEXT,
+                timestamp TEXT,
+                dados TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_mensagens_channel ON mensagens (channel_id);
+            CREATE INDEX IF NOT EXISTS idx_mensagens_view_type ON mensagens (view_type);
+            CREATE INDEX IF NOT EXISTS idx_mensagens_author ON mensagens (author_id);
+            CREATE INDEX IF NOT EXISTS idx_mensagens_timestamp ON mensagens (timestamp);
+            CREATE TABLE IF NOT EXISTS mensagens_arquivo (
+                message_id TEXT PRIMARY KEY,
+                view_type TEXT,
+                author_id TEXT,
+                channel_id TEXT,
+                timestamp TEXT,
+                dados TEXT NOT NULL,
+                arquivado_em TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_arquivo_channel ON mensagens_arquivo (channel_id);
+            CREATE INDEX IF NOT EXISTS idx_arquivo_timestamp ON mensagens_arquivo (timestamp);
+            CREATE TABLE IF NOT EXISTS meta (
+                chave TEXT PRIMARY KEY,
+                valor TEXT
+            );
+        """)
+        self.conn.commit()
+        return self.conn
+
+    def _row_params(self, message_id_str, entry):
+        """Converte uma entrada nos parâmetros da tabela mensagens"""
+        return (
+            message_id_str,
+            entry.get("view_type"),
+            entry.get("author_id"),
+            entry.get("channel_id"),
+            entry.get("timestamp"),
+            codec.dumps(entry).decode("utf-8")
+        )
+
+    def _read_json_files(self):
+        """Lê o snapshot e o journal JSON para self.data, sem criar nem regravar arquivos"""
+        self.data = {}
+        if os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'rb') as f:
+                    content = f.read().strip()
+                if content:
+                    self.data = migrate_schema(*decode_document(content))
+            except Exception as e:
+                logging.error(f"Snapshot JSON ilegível na migração para o SQLite, usando apenas o journal: {e}")
+                self.data = {}
+        self._replay_journal()
+
+    def _migrate_from_json(self, conn):
+        """Importa uma única vez os dados do arquivo JSON (snapshot + journal)"""
+        migrated = conn.execute("SELECT valor FROM meta WHERE chave = 'json_migrado'").fetchone()
+        if migrated:
+            return
+
+        if os.path.exists(self.data_file) or os.path.exists(self.journal_file):
+            logging.info(f"Migrando mensagens interativas de {self.data_file} para {self.db_file}")
+            self._read_json_files()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO mensagens (message_id, view_type, author_id, channel_id, timestamp, dados) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [self._row_params(key, value) for key, value in self.data.items()]
+                )
+            logging.info(f"Migradas {len(self.data)} mensagens interativas para o SQLite")
+
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('json_migrado', '1')")
+
+    def _load_data(self):
+        """Carrega as mensagens do banco SQLite"""
+        try:
+            with self._db_lock:
+                conn = self._connect()
+                self._migrate_from_json(conn)
+                rows = conn.execute("SELECT message_id, dados FROM mensagens").fetchall()
+
+            self.data = {row["message_id"]: codec.loads(row["dados"]) for row in rows}
+            self._refresh_storage_signature()
+            logging.info(f"Carregadas {len(self.data)} mensagens interativas do banco {self.db_file}")
+        except Exception as e:
+            logging.error(f"Erro ao carregar dados de persistência do SQLite: {e}")
+            self.data = {}
+
+    def _get_storage_signature(self):
+        """Usa o data_version do SQLite, que só muda com commits de outras conexões"""
+        try:
+            with self._db_lock:
+                return (self._connect().execute("PRAGMA data_version").fetchone()[0],)
+        except Exception:
+            return None
+
+    def _write_batch(self, ops):
+        """Grava um lote de inclusões/remoções em uma única transação"""
+        upserts = [self._row_params(key, value) for key, value in ops.items() if value is not None]
+        deletes = [(key,) for key, value in ops.items() if value is None]
+        try:
+            with self._db_lock, self._connect() as conn:
+                if upserts:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO mensagens (message_id, view_type, author_id, channel_id, timestamp, dados) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        upserts
+                    )
+                if deletes:
+                    conn.executemany("DELETE FROM mensagens WHERE message_id = ?", deletes)
+            # Alterações desde o último snapshot: disparam a compactação como no journal JSON
+            self._journal_records += len(ops)
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao gravar lote de {len(ops)} mensagens no SQLite: {e}")
+            return False
+
+    def _lookup_missing(self, message_id_str):
+        """Busca pela chave primária, sem recarregar o restante dos dados"""
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT dados FROM mensagens WHERE message_id = ?", (message_id_str,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        self.data[message_id_str] = codec.loads(row["dados"])
+        return self.data[message_id_str]
+
+    def _build_filters(self, channel_id=None, view_type=None, author_id=None, since=None):
+        """Monta a cláusula WHERE das consultas por canal, tipo, autor e data"""
+        conditions = []
+        params = []
+        if channel_id is not None:
+            conditions.append("channel_id = ?")
+            params.append(str(channel_id))
+        if view_type is not None:
+            conditions.append("view_type = ?")
+            params.append(view_type)
+        if author_id is not None:
+            conditions.append("author_id = ?")
+            params.append(str(author_id))
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        return conditions, params
+    
+    def query_messages(self, channel_id=None, view_type=None, author_id=None, since=None):
+        """Lista as mensagens que atendem aos filtros usando os índices do banco"""
+        conditions, params = self._build_filters(channel_id, view_type, author_id, since)
+        sql = "SELECT message_id, dados FROM mensagens"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        with self._db_lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return {row["message_id"]: codec.loads(row["dados"]) for row in rows}
+
+    def _append_archive(self, entries):
+        """Copia as entradas para a tabela mensagens_arquivo em uma única transação"""
+        archived_at = datetime.utcnow().isoformat()
+        try:
+            with self._db_lock, self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO mensagens_arquivo "
+                    "(message_id, view_type, author_id, channel_id, timestamp, dados, arquivado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [self._row_params(key, value) + (archived_at,) for key, value in entries.items()]
+                )
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao arquivar {len(entries)} mensagens no SQLite: {e}")
+            return False
+
+    def _load_archived_ids(self):
+        """Lê apenas a coluna de IDs da tabela mensagens_arquivo"""
+        with self._db_lock:
+            rows = self._connect().execute("SELECT message_id FROM mensagens_arquivo").fetchall()
+        return {row["message_id"] for row in rows}
+
+    def query_archive(self, message_id=None, channel_id=None, view_type=None, author_id=None, since=None):
+        """Consulta a tabela mensagens_arquivo com os mesmos filtros de query_messages"""
+        conditions, params = self._build_filters(channel_id, view_type, author_id, since)
+        if message_id is not None:
+            conditions.append("message_id = ?")
+            params.append(str(message_id))
+        sql = "SELECT message_id, dados FROM mensagens_arquivo"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        with self._db_lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return {row["message_id"]: codec.loads(row["dados"]) for row in rows}
+
+    def compact(self, data=None):
+        """No SQLite não há journal a consolidar; otimiza o banco e registra um snapshot"""
+        try:
+            with self._db_lock:
+                self._connect().execute("PRAGMA optimize")
+        except Exception as e:
+            logging.error(f"Erro ao otimizar o banco de persistência: {e}")
+            return False
+        self._take_snapshot(self._serialize_snapshot(self.data if data is None else data))
+        logging.info(f"Snapshot do banco de persistência registrado ({self._journal_records} alterações)")
+        self._journal_records = 0
+        return True
+    
+    def _replace_all(self, data):
+        """Substitui todas as linhas da tabela mensagens em uma única transação"""
+        try:
+            with self._db_lock, self._connect() as conn:
+                conn.execute("DELETE FROM mensagens")
+                conn.executemany(
+                    "INSERT INTO mensagens (message_id, view_type, author_id, channel_id, timestamp, dados) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [self._row_params(key, value) for key, value in data.items()]
+                )
+            self._refresh_storage_signature()
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao restaurar mensagens no SQLite: {e}")
+            return False
@@ -35,6 +35,27 @@ EMOJI_DATA_99 = "<:discotoolsxyzicon3:1327343409148592188>"
 EMOJI_CHAMADOS_99 = "<:discotoolsxyzicon:1327343129753554944>"
 EMOJI_USER_99 = "<:discotoolsxyzicon1:1327343125928087622>"
 
+# custom_id dos botões da CustomView: {prefixo}_{view_id}_{tipo}
+VIEW_ID_PATTERN = re.compile(r"^[a-z]+_(\d{14})_")
+
+
+def view_id_from_custom_id(custom_id):
+    """Extrai o view_id do custom_id de um botão da CustomView"""
+    match = VIEW_ID_PATTERN.match(custom_id or "")
+    return match.group(1) if match else None
+
+
+def view_id_from_message(message):
+    """Obtém o view_id dos botões já exibidos em uma mensagem, se houver"""
+    if message is None:
+        return None
+    for action_row in getattr(message, "components", None) or []:
+        for component in getattr(action_row, "children", []):
+            view_id = view_id_from_custom_id(getattr(component, "custom_id", None))
+            if view_id:
+                return view_id
+    return None
+
 class StatusButton(discord.ui.Button):
     def __init__(self, status="Pendente", label=None, style=None):
         # Define o estilo com base no status
@@ -54,6 +75,9 @@ class StatusButton(discord.ui.Button):
         self.status = status
 
     async def callback(self, interaction: discord.Interaction):
+        # O status atual vem do conteúdo da mensagem, pois a view pode ter sido
+        # recriada na inicialização sem conhecer o estado exibido
+        self.status = "Recebido" if "Recebido por" in interaction.message.content else "Pendente"
         if self.status == "Pendente":
             self.status = "Recebido"
             self.style = discord.ButtonStyle.success
@@ -149,7 +173,7 @@ class StatusButton(discord.ui.Button):
                 author_id = message_data.get('author_id', str(interaction.user.id))
                 
                 # Usamos a própria função para criar uma nova view com os outros botões preservados
-                view = CustomView(view_type, original_data, int(author_id))
+                view = CustomView(view_type, original_data, int(author_id), view_id=view_id_from_custom_id(self.custom_id))
                 
                 # Colocamos o status atual nesta view
                 for child in view.children:
@@ -180,7 +204,7 @@ class StatusButton(discord.ui.Button):
                     else:
                         author_id = str(interaction.user.id)
                     
-                    view = CustomView(view_type, {}, int(author_id))
+                    view = CustomView(view_type, {}, int(author_id), view_id=view_id_from_custom_id(self.custom_id))
                     await interaction.message.edit(content='\n'.join(new_lines), view=view)
                 else:
                     # Se não tem components, edita apenas o conteúdo
@@ -417,14 +441,16 @@ class ConfirmarAgendamentoModal(discord.ui.Modal, title='Confirmar Agendamento')
             )
 
 class CustomView(discord.ui.View):
-    def __init__(self, modal_type: str, original_data: dict, author_id: int):
+    def __init__(self, modal_type: str, original_data: dict, author_id: int, view_id: str = None):
         super().__init__(timeout=None)
         self.author_id = author_id
         self.modal_type = modal_type
         self.original_data = original_data
         
-        # Adiciona prefixo identificador ao custom_id de cada botão
-        view_id = datetime.now().strftime('%Y%m%d%H%M%S')
+        # Adiciona prefixo identificador ao custom_id de cada botão; ao recriar a view de
+        # uma mensagem existente, reutiliza o view_id para manter os custom_ids estáveis
+        view_id = view_id or datetime.now().strftime('%Y%m%d%H%M%S')
+        self.view_id = view_id
         
         # Botões que todos podem ver
         if modal_type == "agendamento":
@@ -689,7 +715,8 @@ class ConfirmarAgendamentoButton(discord.ui.Button):
             "observacao": self.modal.observacao.value,
         }
         
-        view = CustomView("agendamento", original_data, author_id)
+        view = CustomView("agendamento", original_data, author_id,
+                          view_id=view_id_from_message(self.modal.message_to_edit))
         
         if self.modal.message_to_edit:
             await self.modal.message_to_edit.edit(content=mensagem_final, view=view)
@@ -712,7 +739,8 @@ class ConfirmarAgendamentoButton(discord.ui.Button):
                         channel.id, 
                         "agendamento", 
                         author_id, 
-                        original_data
+                        original_data,
+                        view_id=view.view_id
                     )
                 
                 await interaction.response.send_message(
@@ -865,7 +893,8 @@ class AtualizacaoModal(discord.ui.Modal, title='Atualização'):
                 "responsaveis": [user.id for user in self.selected_users],
             }
 
-            view = CustomView("atualizacao", original_data, interaction.user.id)
+            view = CustomView("atualizacao", original_data, interaction.user.id,
+                              view_id=view_id_from_message(self.message_to_edit))
 
             if self.message_to_edit:
                 await self.message_to_edit.edit(content=mensagem_final, view=view)
@@ -888,7 +917,8 @@ class AtualizacaoModal(discord.ui.Modal, title='Atualização'):
                             channel.id, 
                             "atualizacao", 
                             interaction.user.id, 
-                            original_data
+                            original_data,
+                            view_id=view.view_id
                         )
                     
                     await interaction.response.send_message(
@@ -4,6 +4,7 @@ from discord import app_commands
 import logging
 import json
 import datetime
+from .glassfish_registry import get_service_registry
 
 class TestarLembreteSelect(discord.ui.Select):
     def __init__(self, servicos_config, simular_tempo: int):
@@ -67,8 +68,7 @@ class TestarLembreteSelect(discord.ui.Select):
                 }
             
             # Salva as alterações
-            with open("services.json", "w", encoding="utf-8") as file:
-                json.dump(self.servicos_config, file, indent=4)
+            await get_service_registry().commit(self.servicos_config, changed=servico_id)
             
             await interaction.response.send_message(
                 f"✅ Tempo simulado para o serviço **{config['nome']}**.\n" +
@@ -11,6 +11,8 @@ from cogs.schedule_update import ScheduleUpdateCog
 from datetime import datetime
 from logging.handlers import TimedRotatingFileHandler
 from cogs.utils import setup_interaction_handler, setup_persistence
+from cogs.glassfish_registry import get_service_registry
+from cogs.glassfish_history import get_usage_history
 
 # Criar pasta logs se não existir
 if not os.path.exists('logs'):
@@ -20,9 +22,6 @@ if not os.path.exists('logs'):
 if not os.path.exists('data'):
     os.makedirs('data')
 
-# Arquivo de persistência para mensagens interativas
-MESSAGES_DB_FILE = os.path.join('data', 'mensagens_data.json')
-
 # Configuração do sistema de log
 log_file = os.path.join('logs', 'bot.log')
 handler = TimedRotatingFileHandler(
@@ -54,14 +53,9 @@ class Bot(commands.Bot):
         self.interactive_messages = {}
         
     async def setup_hook(self):
-        # Carrega as configurações
-        try:
-            with open("services.json", "r", encoding="utf-8") as file:
-                self.servicos_config = json.load(file)
-            logging.info("Arquivo services.json carregado com sucesso")
-        except Exception as e:
-            logging.error(f"Erro ao carregar services.json: {str(e)}")
-            self.servicos_config = {}
+        # Carrega os serviços no registro em memória (lido uma única vez do services.json)
+        self.servicos_config = get_service_registry().get_all()
+        logging.info(f"Registro de serviços carregado com {len(self.servicos_config)} serviços")
         
         # Carrega os cogs
         try:
@@ -131,9 +125,27 @@ class Bot(commands.Bot):
             logging.error(f"Erro ao carregar cogs: {str(e)}")
         
         # Adicionar perto do final do arquivo bot.py, após as outras inicializações
-        setup_persistence(self)  # Se ainda não estiver chamando isso
+        persistence = setup_persistence(self)  # Única carga da persistência no processo
+        persistence.start_background_tasks()  # Gravação em segundo plano e compactação do journal
         setup_interaction_handler(self)  # Configura o handler global de interações
         
+    async def close(self):
+        # Grava as alterações pendentes da persistência, dos serviços e do histórico antes de desconectar
+        try:
+            from cogs.persistence import get_instance_persistence
+            await get_instance_persistence(self).shutdown()
+        except Exception as e:
+            logging.error(f"Erro ao gravar a persistência no encerramento: {str(e)}")
+        try:
+            await get_service_registry().flush()
+        except Exception as e:
+            logging.error(f"Erro ao gravar os serviços no encerramento: {str(e)}")
+        try:
+            await get_usage_history().flush()
+        except Exception as e:
+            logging.error(f"Erro ao gravar o histórico de uso no encerramento: {str(e)}")
+        await super().close()
+        
     async def on_ready(self):
         print(f'{self.user} está pronto!')
         logging.info(f'Bot iniciado como {self.user}')
@@ -157,42 +169,35 @@ class Bot(commands.Bot):
             logging.error(f"Erro ao carregar mensagens interativas: {str(e)}")
     
     async def load_interactive_messages(self):
-        """Carrega as mensagens interativas anteriores e reconecta os botões"""
+        """Reconecta os botões das mensagens interativas já carregadas pela persistência"""
         try:
-            # Inicializa o módulo de persistência
-            from cogs.persistence import setup_persistence
-            persistence = setup_persistence(self)
+            # Usa a instância criada no setup_hook; os dados já estão em memória
+            from cogs.persistence import get_instance_persistence
+            persistence = get_instance_persistence(self)
             
-            # Verifica se o arquivo de mensagens existe
-            if not os.path.exists(MESSAGES_DB_FILE):
-                logging.info(f"Arquivo de mensagens interativas não encontrado: {MESSAGES_DB_FILE}")
+            stats = persistence.startup_stats
+            logging.info(
+                f"Persistência com {len(persistence.data)} mensagens interativas "
+                f"(carga inicial: {stats['mensagens']} mensagens em {stats['tempo_carga_ms']}ms)"
+            )
+            if not persistence.data:
                 return
-                
-            # Carrega as mensagens do arquivo
-            try:
-                with open(MESSAGES_DB_FILE, 'r') as f:
-                    messages_data = json.load(f)
-                    
-                logging.info(f"Carregadas {len(messages_data)} mensagens interativas do arquivo")
-                
-                # Restaura todas as views usando o módulo de persistência
-                from cogs.persistence import restore_views
-                success = await restore_views(self)
-                
-                if success:
-                    logging.info(f"Views restauradas com sucesso usando o novo sistema modular")
-                else:
-                    logging.error(f"Erro ao restaurar views usando o novo sistema modular")
-                
-            except json.JSONDecodeError:
-                logging.error(f"Arquivo de mensagens interativas corrompido: {MESSAGES_DB_FILE}")
+            
+            # Restaura todas as views usando o módulo de persistência
+            from cogs.persistence import restore_views
+            success = await restore_views(self)
+            
+            if success:
+                logging.info(f"Views restauradas com sucesso usando o novo sistema modular")
+            else:
+                logging.error(f"Erro ao restaurar views usando o novo sistema modular")
                 
         except Exception as e:
             import traceback
             logging.error(f"Erro ao carregar mensagens interativas: {str(e)}")
             logging.error(traceback.format_exc())
     
-    def save_interactive_message(self, message_id, channel_id, message_type, author_id, original_data=None):
+    def save_interactive_message(self, message_id, channel_id, message_type, author_id, original_data=None, view_id=None):
         """Salva uma mensagem interativa para persistência"""
         try:
             # Usa o sistema de persistência para registrar a mensagem
@@ -204,7 +209,8 @@ class Bot(commands.Bot):
                 view_type=message_type,
                 original_data=original_data or {},
                 author_id=author_id,
-                channel_id=channel_id
+                channel_id=channel_id,
+                view_id=view_id
             )
             
             if success:
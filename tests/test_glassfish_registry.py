@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import random
+
+import pytest
+
+from cogs import persistence_codec as codec
+from cogs.glassfish_registry import ServiceRegistry
+
+CLIQUES = 500
+SERVICOS = 20
+
+
+def _criar_registro(tmp_path, quantidade=SERVICOS):
+    """Cria um registro sobre um services.json temporário com serviços disponíveis"""
+    arquivo = tmp_path / "services.json"
+    arquivo.write_bytes(codec.dumps({
+        f"stress-{i}": {"nome": f"stress-{i}", "status": "disponível", "usuario": None, "grupos_permitidos": []}
+        for i in range(quantidade)
+    }))
+    registry = ServiceRegistry(str(arquivo))
+    registry.get_all()
+    return registry, arquivo
+
+
+@pytest.fixture
+def gravacoes(monkeypatch):
+    """Conta as gravações reais do services.json"""
+    chamadas = []
+    original = ServiceRegistry._write_file
+
+    def contar(self, content):
+        chamadas.append(len(content))
+        return original(self, content)
+
+    monkeypatch.setattr(ServiceRegistry, "_write_file", contar)
+    return chamadas
+
+
+async def _clicar_usar(registry, servico_id, i, atraso):
+    # Como na interface: a versão é lida ao exibir os botões e o clique chega depois,
+    # intercalado com os outros cliques e com o escritor da fila de commits
+    versao = registry.version(servico_id)
+    await asyncio.sleep(atraso)
+    return servico_id, i, registry.claim(servico_id, f"usuario{i}", 1000 + i, expected_version=versao)
+
+
+async def _clicar_liberar(registry, servico_id, i, atraso):
+    await asyncio.sleep(atraso)
+    return servico_id, i, registry.release(servico_id, 1000 + i, f"usuario{i}")
+
+
+async def _disputar(registry, rng):
+    """Dispara CLIQUES cliques em "Usar" intercalados; retorna (alvos, vencedores por serviço)"""
+    ids = list(registry.get_all().keys())
+    alvos = [rng.choice(ids) for _ in range(CLIQUES)]
+    resultados = await asyncio.gather(*(
+        _clicar_usar(registry, alvos[i], i, rng.uniform(0, 0.01)) for i in range(CLIQUES)
+    ))
+    vencedores = {}
+    for servico_id, i, (sucesso, motivo) in resultados:
+        if sucesso:
+            vencedores.setdefault(servico_id, []).append(i)
+        else:
+            assert motivo in ("em_uso", "versao"), f"motivo inesperado no claim: {motivo}"
+    return alvos, vencedores
+
+
+def test_cliques_simultaneos_tem_um_vencedor_por_servico(tmp_path):
+    registry, arquivo = _criar_registro(tmp_path)
+
+    async def cenario():
+        alvos, vencedores = await _disputar(registry, random.Random(42))
+        await registry.flush()
+        return alvos, vencedores
+
+    alvos, vencedores = asyncio.run(cenario())
+
+    for servico_id in set(alvos):
+        assert len(vencedores.get(servico_id, [])) == 1, f"{servico_id}: {vencedores.get(servico_id)}"
+
+    gravado = codec.loads(arquivo.read_bytes())
+    for servico_id, (vencedor,) in vencedores.items():
+        assert gravado[servico_id]["status"] == "em uso"
+        assert gravado[servico_id]["usuario"] == f"usuario{vencedor}"
+
+
+def test_apenas_quem_usa_consegue_liberar(tmp_path):
+    registry, arquivo = _criar_registro(tmp_path)
+    rng = random.Random(7)
+
+    async def cenario():
+        alvos, vencedores = await _disputar(registry, rng)
+        resultados = await asyncio.gather(*(
+            _clicar_liberar(registry, alvos[i], i, rng.uniform(0, 0.01)) for i in range(CLIQUES)
+        ))
+        await registry.flush()
+        return vencedores, resultados
+
+    vencedores, resultados = asyncio.run(cenario())
+
+    for servico_id, i, (sucesso, motivo) in resultados:
+        eh_dono = vencedores[servico_id] == [i]
+        assert sucesso == eh_dono, f"{servico_id}: usuario{i} liberou={sucesso} ({motivo}), dono={eh_dono}"
+        if not sucesso:
+            assert motivo in ("outro_usuario", "disponivel")
+
+    gravado = codec.loads(arquivo.read_bytes())
+    assert all(config["status"] == "disponível" for config in gravado.values())
+
+
+def test_rajada_de_commits_vira_uma_gravacao(tmp_path, gravacoes):
+    registry, arquivo = _criar_registro(tmp_path)
+    ids = list(registry.get_all().keys())
+
+    async def cenario():
+        # Todos os serviços são usados no mesmo instante: um commit por serviço
+        resultados = [registry.claim(servico_id, f"usuario{i}", 1000 + i) for i, servico_id in enumerate(ids)]
+        await registry.flush()
+        usos = len(gravacoes)
+        liberacoes = [registry.release(servico_id, force=True) for servico_id in ids]
+        await registry.flush()
+        return resultados, usos, liberacoes
+
+    resultados, usos, liberacoes = asyncio.run(cenario())
+
+    assert all(sucesso for sucesso, _ in resultados)
+    assert all(sucesso for sucesso, _ in liberacoes)
+    assert usos == 1, f"{len(ids)} commits gravados em {usos} escritas"
+    assert len(gravacoes) == 2, f"liberações gravadas em {len(gravacoes) - usos} escritas"
+
+
+def test_reserva_interrompe_uso_e_devolve_ao_fim(tmp_path):
+    registry, _ = _criar_registro(tmp_path, quantidade=1)
+    agora = datetime.datetime.now()
+
+    async def cenario():
+        registry.claim("stress-0", "usuario1", 1001)
+        _, _, reserva = registry.add_reservation("stress-0", 1002, "usuario2", agora, agora + datetime.timedelta(hours=1))
+        inicio = registry.start_reservation("stress-0", reserva["id"])
+        durante = dict(registry.get("stress-0"), fila=registry.waitlist("stress-0"))
+        fim = registry.end_reservation("stress-0", reserva["id"])
+        await registry.flush()
+        return inicio, durante, fim
+
+    inicio, durante, fim = asyncio.run(cenario())
+
+    assert inicio == (True, "preempcao")
+    assert durante["usuario"] == "usuario2"
+    assert durante["reserva_ativa"] and "repasse_ate" not in durante
+    assert [entry["user_id"] for entry in durante["fila"]] == [1001]
+    assert fim == (True, "liberado")
+    # Quem foi interrompido recebe o serviço de volta pelo repasse normal da fila
+    config = registry.get("stress-0")
+    assert config["usuario"] == "usuario1" and "repasse_ate" in config